@@ -0,0 +1,203 @@
+# MusGU+ build benchmark
+# Times every stage of the build on synthetic catalogues and compares the results with a stored baseline.
+# Timings are compared as multiples of a fixed calibration workload timed in the same run, so a baseline
+# stored on one machine still flags regressions on another.
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCHMARKS_DIR, "..")
+sys.path.insert(0, os.path.join(REPO_DIR, "scripts"))
+
+import consolidate_csv  # noqa: E402
+from synthetic_catalogue import generate_catalogue  # noqa: E402
+
+
+# 50k is left out of the default run and the baseline: it takes minutes. Pass --sizes 50000 to measure it.
+DEFAULT_SIZES = [10, 1000, 10000]
+DEFAULT_OUTPUT = os.path.join(BENCHMARKS_DIR, "results", "latest.json")
+# The baseline is tracked, so a regression check compares against the numbers the last change was merged with.
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+
+# Stages faster than this are too noisy to flag.
+MIN_REGRESSION_SECONDS = 0.05
+# The calibration workload is timed this many times and the fastest run is kept.
+CALIBRATION_RUNS = 10
+
+
+def measure(function, memory=True):
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = function()
+    measurement = {
+        "wall_seconds": time.perf_counter() - wall_start,
+        "cpu_seconds": time.process_time() - cpu_start,
+    }
+
+    # tracemalloc slows allocation down a lot, so memory is measured on a separate run.
+    if memory:
+        tracemalloc.start()
+        function()
+        measurement["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result, measurement
+
+
+def calibration_workload():
+    # The build's own kind of work: formatting rows, a JSON round trip and a sort.
+    rows = [
+        {"name": f"model-{index}", "values": [index % 7, index % 11, index % 13], "notes": "n" * (index % 50)}
+        for index in range(20000)
+    ]
+    rows = json.loads(json.dumps(rows, sort_keys=True))
+    rows.sort(key=lambda row: (row["values"], row["name"]))
+    return "".join(f"<tr><td>{row['name']}</td><td>{row['notes']}</td></tr>" for row in rows)
+
+
+def calibrate():
+    return min(measure(calibration_workload, memory=False)[1]["wall_seconds"] for _ in range(CALIBRATION_RUNS))
+
+
+def prepare_workspace(directory):
+    docs_dir = os.path.join(directory, "docs")
+    os.makedirs(docs_dir)
+    for template_path in (consolidate_csv.INDEX_TEMPLATE_PATH, consolidate_csv.MODEL_TEMPLATE_PATH):
+        shutil.copy(os.path.join(REPO_DIR, template_path), docs_dir)
+
+
+def benchmark_size(size, jobs=1, seed=0, memory=True):
+    stages = {}
+    previous_dir = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as directory:
+        prepare_workspace(directory)
+        files = sorted(generate_catalogue(os.path.join(directory, "projects"), size, seed))
+        files = ["./" + os.path.relpath(file_name, directory) for file_name in files]
+        os.chdir(directory)
+
+        try:
+            table, stages["create_table"] = measure(lambda: consolidate_csv.create_table(files, jobs=jobs), memory)
+            table, stages["calculate_scores"] = measure(lambda: consolidate_csv.calculate_scores(table), memory)
+            table = table.sorted_by("overall_score", descending=True)
+            (table_html, applications_html), stages["write_html"] = measure(
+                lambda: consolidate_csv.write_html(table), memory
+            )
+            facet_index, stages["build_facet_index"] = measure(
+                lambda: consolidate_csv.build_facet_index(table), memory
+            )
+            _, stages["create_index"] = measure(
+                lambda: consolidate_csv.create_index(table_html, applications_html, facet_index), memory
+            )
+            _, stages["create_model_pages"] = measure(
+                lambda: consolidate_csv.create_model_pages(table, workers=jobs), memory
+            )
+            _, stages["to_csv"] = measure(lambda: consolidate_csv.write_if_changed("./docs/df.csv", table.to_csv()), memory)
+        finally:
+            os.chdir(previous_dir)
+
+    return stages
+
+
+def find_regressions(results, calibration, baseline, baseline_calibration, tolerance):
+    # Compares wall times in calibration units; the baseline's seconds are scaled to this machine for the noise floor.
+    regressions = []
+    scale = calibration / baseline_calibration
+    for size, stages in results.items():
+        for stage, measurement in stages.items():
+            reference = baseline.get(size, {}).get(stage)
+            if not reference:
+                continue
+            current = measurement["wall_seconds"] / calibration
+            expected = reference["wall_seconds"] / baseline_calibration
+            if current > expected * (1 + tolerance) and (current - expected) * calibration > MIN_REGRESSION_SECONDS:
+                regressions.append((size, stage, expected, current, reference["wall_seconds"] * scale))
+    return regressions
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MusGU+ build stages on synthetic catalogues.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="catalogue sizes to build")
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes for the parallel stages")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic catalogues")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the results JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a stage is flagged")
+    args = parser.parse_args()
+
+    calibration = calibrate()
+    print(f"Calibration workload: {calibration:.4f}s")
+    results = {}
+    print(f"{'size':>8} {'stage':<20} {'wall s':>10} {'cpu s':>10} {'peak MB':>10} {'relative':>10}")
+    for size in args.sizes:
+        results[str(size)] = benchmark_size(size, args.jobs, args.seed, not args.no_memory)
+        for stage, measurement in results[str(size)].items():
+            peak = measurement.get("peak_bytes")
+            peak_text = f"{peak / 1e6:>10.1f}" if peak is not None else f"{'-':>10}"
+            print(
+                f"{size:>8} {stage:<20} {measurement['wall_seconds']:>10.3f} "
+                f"{measurement['cpu_seconds']:>10.3f} {peak_text} {measurement['wall_seconds'] / calibration:>10.2f}"
+            )
+
+    report = {
+        "created": datetime.datetime.now(consolidate_csv.UTC).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "jobs": args.jobs,
+        "calibration_seconds": calibration,
+        "results": results,
+    }
+    write_json(args.output, report)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        write_json(args.baseline, report)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; store one with --save-baseline")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline_report = json.load(file)
+    if "calibration_seconds" not in baseline_report:
+        print(f"{args.baseline} has no calibration run; store a new one with --save-baseline")
+        sys.exit(1)
+    baseline = baseline_report.get("results", {})
+    for size in results:
+        if size not in baseline:
+            print(f"No baseline for {size} projects; not compared")
+
+    regressions = find_regressions(
+        results, calibration, baseline, baseline_report["calibration_seconds"], args.tolerance
+    )
+    for size, stage, expected, current, scaled in regressions:
+        print(
+            f"REGRESSION {stage} at {size} projects: {expected:.2f} -> {current:.2f} calibration units "
+            f"(about {scaled:.3f}s -> {results[size][stage]['wall_seconds']:.3f}s on this machine)"
+        )
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# MusGU+ loader benchmark
+# Times create_table on synthetic catalogues to check that loading scales linearly.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from consolidate_csv import create_table  # noqa: E402
+from synthetic_catalogue import generate_catalogue  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark create_table on synthetic catalogues.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"{'projects':>10} {'seconds':>10} {'us/project':>12}")
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            files = generate_catalogue(directory, size)
+            start = time.perf_counter()
+            table = create_table(files, jobs=args.jobs)
+            elapsed = time.perf_counter() - start
+
+        assert len(table) == size
+        print(f"{size:>10} {elapsed:>10.2f} {elapsed / size * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
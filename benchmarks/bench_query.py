@@ -0,0 +1,75 @@
+# MusGU+ query benchmark
+# Times catalogue queries on a synthetic catalogue and checks them against a plain scan of the facet index.
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import consolidate_csv  # noqa: E402
+from catalogue_query import CatalogueIndex  # noqa: E402
+from synthetic_catalogue import generate_catalogue  # noqa: E402
+
+
+def sample_queries(index):
+    tags = sorted(index.bitmaps["tags"], key=lambda key: -index.bitmaps["tags"][key].bit_count())
+    applications = sorted(index.bitmaps["applications"], key=lambda key: -index.bitmaps["applications"][key].bit_count())
+    return [
+        {},
+        {"tags": ["realtime:real-time"]},
+        {"tags": ["realtime:real-time", tags[0]], "min_scores": {"usability": 60}},
+        {"tags": tags[:2], "applications": applications[:1], "dimensions": ["controllability"]},
+        {"values": ["hardware:high", "dataset:partial"], "sort": "adaptability_score"},
+        {"applications": applications[-1:], "min_scores": {"adaptability": 40}, "sort": "usability_score"},
+    ]
+
+
+def scan(index, facet_index, limit=10, sort="overall_score", **filters):
+    selected = set(range(len(index)))
+    for group in ("tags", "applications", "values", "dimensions"):
+        for key in filters.get(group, ()):
+            selected &= set(facet_index[group].get(key, []))
+    for dimension_key, threshold in filters.get("min_scores", {}).items():
+        selected = {row_id for row_id in selected if index.rows[row_id][f"{dimension_key}_score"] >= threshold}
+    ranked = sorted(selected, key=lambda row_id: (-index.rows[row_id][sort], row_id))
+    return [index.names[row_id] for row_id in ranked[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark catalogue queries on a synthetic catalogue.")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = generate_catalogue(directory, args.size)
+        table = consolidate_csv.create_table(files, jobs=args.jobs)
+    table = consolidate_csv.calculate_scores(table).sorted_by("overall_score", descending=True)
+
+    start = time.perf_counter()
+    index = CatalogueIndex(table)
+    print(f"Indexed {len(index)} projects in {time.perf_counter() - start:.2f}s")
+
+    facet_index = consolidate_csv.build_facet_index(table)
+    print(f"{'matches':>10} {'median us':>10}  query")
+    for query in sample_queries(index):
+        filters = {key: value for key, value in query.items() if key != "sort"}
+        sort = query.get("sort", "overall_score")
+        results = [name for name, _ in index.top(10, sort, **filters)]
+        assert results == scan(index, facet_index, 10, sort, **filters), query
+
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            index.top(10, sort, **filters)
+            timings.append(time.perf_counter() - start)
+        print(f"{index.count(**filters):>10} {statistics.median(timings) * 1e6:>10.1f}  {query}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# MusGU+ similarity benchmark
+# Times the blockwise similar-models stage on a synthetic catalogue, cold and after a few edits,
+# and checks a sample of rows against a plain pairwise loop.
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import consolidate_csv  # noqa: E402
+import model_similarity  # noqa: E402
+from synthetic_catalogue import generate_catalogue  # noqa: E402
+
+
+def pairwise(row, slugs, values, tag_sets, k):
+    scores = []
+    for other in range(len(slugs)):
+        if other == row:
+            continue
+        distance = np.sqrt(np.mean((np.asarray(values[row]) - np.asarray(values[other])) ** 2))
+        tags, other_tags = set(tag_sets[row]), set(tag_sets[other])
+        union = len(tags | other_tags)
+        overlap = len(tags & other_tags) / union if union else 0
+        score = round(
+            model_similarity.VALUE_WEIGHT * (1 - distance) + model_similarity.TAG_WEIGHT * overlap,
+            model_similarity.SCORE_DECIMALS,
+        )
+        scores.append((slugs[other], score))
+    scores.sort(key=lambda item: (-item[1], item[0]))
+    return scores[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the similar-models stage on a synthetic catalogue.")
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--edits", type=int, default=10)
+    parser.add_argument("--check", type=int, default=20, help="rows checked against the pairwise loop")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = generate_catalogue(directory, args.size)
+        table = consolidate_csv.calculate_scores(consolidate_csv.create_table(files, jobs=args.jobs))
+
+    slugs = [str(project_row["project.slug"]) for project_row in table.rows.values()]
+    features = [model_similarity.row_features(project_row) for project_row in table.rows.values()]
+    values = [row_values for row_values, _ in features]
+    tag_sets = [tags for _, tags in features]
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = model_similarity.SimilarityCache(os.path.join(directory, "similarity.pickle"))
+        start = time.perf_counter()
+        neighbours, stats = model_similarity.find_similar_models(slugs, values, tag_sets, cache=cache)
+        print(f"Cold: {len(slugs)} models in {time.perf_counter() - start:.2f}s ({stats})")
+
+        rows = random.Random(0).sample(range(len(slugs)), min(args.check, len(slugs)))
+        for row in rows:
+            assert neighbours[slugs[row]] == pairwise(row, slugs, values, tag_sets, model_similarity.SIMILAR_MODELS), slugs[row]
+        print(f"Checked {len(rows)} rows against the pairwise loop")
+
+        for row in random.Random(1).sample(range(len(slugs)), min(args.edits, len(slugs))):
+            values[row] = tuple(1.0 - value for value in values[row])
+        cache = model_similarity.SimilarityCache(os.path.join(directory, "similarity.pickle"))
+        start = time.perf_counter()
+        _, stats = model_similarity.find_similar_models(slugs, values, tag_sets, cache=cache)
+        print(f"After {args.edits} edits: {time.perf_counter() - start:.2f}s ({stats})")
+
+
+if __name__ == "__main__":
+    main()
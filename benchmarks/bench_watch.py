@@ -0,0 +1,68 @@
+# MusGU+ watch mode benchmark
+# Times how long the live site takes to take in one edited evaluation on a synthetic catalogue,
+# and how long the index page then takes to render.
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from synthetic_catalogue import generate_catalogue  # noqa: E402
+from watch_server import LiveSite  # noqa: E402
+
+
+LEVELS = ("High", "Partial", "Low")
+
+
+def edit_file(file_name, rng):
+    with open(file_name, encoding="utf-8") as file:
+        text = file.read()
+    text = re.sub(r"value: (High|Partial|Low)", lambda match: f"value: {rng.choice(LEVELS)}", text, count=4)
+    with open(file_name, "w", encoding="utf-8") as file:
+        file.write(text)
+
+
+def summary(seconds):
+    return f"median {statistics.median(seconds) * 1000:.1f} ms, max {max(seconds) * 1000:.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark watch-mode edits on a synthetic catalogue.")
+    parser.add_argument("--size", type=int, default=10000, help="Number of models in the synthetic catalogue.")
+    parser.add_argument("--edits", type=int, default=20, help="Number of evaluations to edit one after another.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = generate_catalogue(directory, args.size)
+        site = LiveSite(projects_dir=directory)
+        start = time.perf_counter()
+        site.load()
+        # Build everything an open browser would have asked for, so edits take the incremental path.
+        site.get("/index.html")
+        site.get(f"/models/{os.path.splitext(os.path.basename(files[0]))[0]}/similar.json")
+        print(f"Loaded and rendered {args.size} models in {time.perf_counter() - start:.2f}s")
+
+        rng = random.Random(0)
+        updates = []
+        renders = []
+        for file_name in rng.sample(files, min(args.edits, len(files))):
+            edit_file(file_name, rng)
+            start = time.perf_counter()
+            site.update_file(file_name)
+            updates.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            site.get("/index.html")
+            renders.append(time.perf_counter() - start)
+        print(f"Edit taken in: {summary(updates)}")
+        print(f"Index page re-rendered in: {summary(renders)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# MusGU+ synthetic catalogue
+# Generates realistic evaluation files from projects/_template.yaml for benchmarking the build.
+
+import argparse
+import glob
+import os
+import random
+
+import yaml
+
+
+PROJECTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "projects")
+TEMPLATE_PATH = os.path.join(PROJECTS_DIR, "_template.yaml")
+
+VALUE_LEVELS = ["high", "partial", "low", ""]
+VALUE_WEIGHTS = [0.4, 0.35, 0.2, 0.05]
+
+HEADER = """---
+####################################################################################################################################
+# MusGU+ evaluation (synthetic)
+# A Musician-Centered Evaluation Framework for Generative Music AI
+####################################################################################################################################
+
+"""
+
+
+def load_template():
+    with open(TEMPLATE_PATH, "r", encoding="utf-8") as file:
+        return yaml.safe_load(file)
+
+
+def load_vocabulary(template):
+    # Real evaluations provide the notes, tags and applications the generator samples from.
+    vocabulary = {"applications": set(), "affiliations": set(), "architectures": set(), "criteria": {}}
+    for section, criteria in template.items():
+        if section == "project":
+            continue
+        for criterion in criteria:
+            vocabulary["criteria"][f"{section}.{criterion}"] = {"notes": [], "tags": set()}
+
+    for file_name in sorted(glob.glob(os.path.join(PROJECTS_DIR, "*.yaml"))):
+        if "_template" in file_name:
+            continue
+        with open(file_name, "r", encoding="utf-8") as file:
+            data = yaml.safe_load(file) or {}
+
+        project = data.get("project") or {}
+        vocabulary["applications"].update(tag.strip() for tag in str(project.get("applications") or "").split(",") if tag.strip())
+        if project.get("affiliation"):
+            vocabulary["affiliations"].add(project["affiliation"])
+        if project.get("architecture"):
+            vocabulary["architectures"].add(project["architecture"])
+
+        for key, entry in vocabulary["criteria"].items():
+            section, criterion = key.split(".")
+            evaluation = (data.get(section) or {}).get(criterion) or {}
+            if evaluation.get("notes"):
+                entry["notes"].append(evaluation["notes"])
+            entry["tags"].update(tag.strip() for tag in str(evaluation.get("tags") or "").split(",") if tag.strip())
+
+    return {
+        "applications": sorted(vocabulary["applications"]),
+        "affiliations": sorted(vocabulary["affiliations"]) or ["Synthetic Lab"],
+        "architectures": sorted(vocabulary["architectures"]) or ["transformer"],
+        "criteria": {
+            key: {"notes": entry["notes"] or ["No notes provided."], "tags": sorted(entry["tags"])}
+            for key, entry in vocabulary["criteria"].items()
+        },
+    }
+
+
+def sample_tags(rng, tags, maximum=3):
+    if not tags:
+        return ""
+    return ", ".join(rng.sample(tags, rng.randint(0, min(maximum, len(tags)))))
+
+
+def generate_evaluation(index, template, vocabulary, rng):
+    evaluation = {
+        "project": {
+            "name": f"Synthetic Model {index:06d}",
+            "affiliation": rng.choice(vocabulary["affiliations"]),
+            "architecture": rng.choice(vocabulary["architectures"]),
+            "applications": sample_tags(rng, vocabulary["applications"]),
+            "link": f"https://example.org/models/{index}",
+            "repository": f"https://github.com/example/model-{index}" if rng.random() < 0.7 else "",
+            "article": f"https://arxiv.org/abs/2400.{index:05d}" if rng.random() < 0.5 else "",
+            "notes": "",
+        }
+    }
+
+    for section, criteria in template.items():
+        if section == "project":
+            continue
+        evaluation[section] = {}
+        for criterion, fields in criteria.items():
+            entry = vocabulary["criteria"][f"{section}.{criterion}"]
+            evaluation[section][criterion] = {
+                "value": rng.choices(VALUE_LEVELS, VALUE_WEIGHTS)[0],
+                "notes": rng.choice(entry["notes"]),
+            }
+            if "tags" in (fields or {}):
+                evaluation[section][criterion]["tags"] = sample_tags(rng, entry["tags"])
+
+    return evaluation
+
+
+def generate_catalogue(directory, size, seed=0):
+    template = load_template()
+    vocabulary = load_vocabulary(template)
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    files = []
+    for index in range(size):
+        file_name = os.path.join(directory, f"synthetic-{index:06d}.yaml")
+        with open(file_name, "w", encoding="utf-8") as file:
+            file.write(HEADER)
+            yaml.safe_dump(
+                generate_evaluation(index, template, vocabulary, rng),
+                file,
+                default_flow_style=False,
+                allow_unicode=True,
+                sort_keys=False,
+            )
+        files.append(file_name)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic MusGU+ catalogue.")
+    parser.add_argument("size", type=int, help="number of evaluation files to generate")
+    parser.add_argument("directory", help="directory to write the YAML files to")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    files = generate_catalogue(args.directory, args.size, args.seed)
+    print(f"Wrote {len(files)} evaluations to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# MusGU+ build manifest
+# Records content hashes of the inputs and outputs of a build so unchanged pages can be skipped.
+
+import filecmp
+import hashlib
+import json
+import os
+
+
+MANIFEST_PATH = "./docs/.build-manifest.json"
+MANIFEST_VERSION = 1
+
+HASH_BLOCK_SIZE = 1 << 20
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Every input that shapes the rendered output: the page templates, the stylesheet the detail pages
+# link, and each module the render path imports.
+TEMPLATE_FILES = [
+    "./docs/template.html",
+    "./docs/model_template.html",
+    "./docs/model_page.css",
+    *(
+        os.path.join(SCRIPTS_DIR, module)
+        for module in (
+            "consolidate_csv.py",
+            "html_templates.py",
+            "project_table.py",
+            "streaming_build.py",
+            "validate_projects.py",
+            "search_index.py",
+            "model_similarity.py",
+        )
+    ),
+]
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    if not os.path.exists(path):
+        return ""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_templates(extra_files=()):
+    return {os.path.basename(path): hash_file(path) for path in [*TEMPLATE_FILES, *extra_files] if path}
+
+
+def empty_manifest():
+    return {
+        "version": MANIFEST_VERSION,
+        "options": {},
+        "templates": {},
+        "sources": {},
+        "pages": {},
+        "data": {},
+        "index": {},
+    }
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return empty_manifest()
+
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return empty_manifest()
+
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return empty_manifest()
+
+    for key, value in empty_manifest().items():
+        if not isinstance(manifest.get(key), type(value)):
+            manifest[key] = value
+    return manifest
+
+
+def write_if_changed(path, content, stats=None):
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    if os.path.exists(path):
+        with open(path, "rb") as file:
+            if file.read() == data:
+                if stats is not None:
+                    stats["unchanged"] += 1
+                return False
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(data)
+    if stats is not None:
+        stats["written"] += 1
+        stats["bytes"] = stats.get("bytes", 0) + len(data)
+    return True
+
+
+def write_chunks_if_changed(path, chunks, stats=None):
+    # Streams the output to a temporary file next to path and only replaces path when the bytes differ.
+    digest = hashlib.sha256()
+    size = 0
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        for chunk in chunks:
+            data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            digest.update(data)
+            size += len(data)
+            file.write(data)
+
+    if os.path.exists(path) and os.path.getsize(path) == size and filecmp.cmp(path, temporary_path, shallow=False):
+        os.remove(temporary_path)
+        if stats is not None:
+            stats["unchanged"] += 1
+        return digest.hexdigest()
+
+    os.replace(temporary_path, path)
+    if stats is not None:
+        stats["written"] += 1
+        stats["bytes"] = stats.get("bytes", 0) + size
+    return digest.hexdigest()
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    write_if_changed(path, json.dumps(manifest, indent=1, sort_keys=True) + "\n")
+
+
+def is_output_current(previous, current, section, key, output_path, sources=None):
+    if previous["templates"] != current["templates"]:
+        return False
+    if previous["options"].get(section) != current["options"].get(section):
+        return False
+
+    # Pages depend on their own source file, the index depends on all of them.
+    if sources is None:
+        sources = [key]
+    if any(previous["sources"].get(source) != current["sources"].get(source) for source in sources):
+        return False
+
+    recorded = previous[section].get(key)
+    return bool(recorded) and recorded == hash_file(output_path)
@@ -0,0 +1,112 @@
+# MusGU+ build profiling
+# Collects per-stage timings, memory peaks and counters for `consolidate_csv.py --profile`.
+
+import contextlib
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+
+
+PROFILE_JSON_PATH = "./.build-cache/build-profile.json"
+
+
+class BuildProfiler:
+    def __init__(self, enabled=False, slowest=10, profile_stage=None, profile_output=None):
+        self.enabled = enabled
+        self.slowest = slowest
+        self.profile_stage = profile_stage
+        self.profile_output = profile_output
+        self.stages = []
+        self.counters = {}
+        self.page_timings = {}
+        self.started = None
+
+    def start(self):
+        if not self.enabled:
+            return
+        self.started = time.perf_counter()
+        tracemalloc.start()
+
+    def stop(self):
+        if self.enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def stage(self, name):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self.measure_stage(name)
+
+    @contextlib.contextmanager
+    def measure_stage(self, name):
+        profile = cProfile.Profile() if name == self.profile_stage else None
+        tracemalloc.reset_peak()
+        memory_start = tracemalloc.get_traced_memory()[0]
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        if profile:
+            profile.enable()
+
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            self.stages.append(
+                {
+                    "name": name,
+                    "wall_seconds": time.perf_counter() - wall_start,
+                    "cpu_seconds": time.process_time() - cpu_start,
+                    "peak_bytes": max(0, tracemalloc.get_traced_memory()[1] - memory_start),
+                }
+            )
+            if profile:
+                os.makedirs(os.path.dirname(os.path.abspath(self.profile_output)), exist_ok=True)
+                profile.dump_stats(self.profile_output)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def slowest_pages(self):
+        ranked = sorted(self.page_timings.items(), key=lambda item: item[1], reverse=True)
+        return [{"slug": slug, "seconds": seconds} for slug, seconds in ranked[: self.slowest]]
+
+    def report(self):
+        return {
+            "total_seconds": time.perf_counter() - self.started if self.started else 0.0,
+            "stages": self.stages,
+            "counters": dict(sorted(self.counters.items())),
+            "slowest_pages": self.slowest_pages(),
+        }
+
+    def format_report(self):
+        report = self.report()
+        lines = [f"{'stage':<22} {'wall s':>9} {'cpu s':>9} {'peak MB':>9}"]
+        for stage in report["stages"]:
+            lines.append(
+                f"{stage['name']:<22} {stage['wall_seconds']:>9.3f} {stage['cpu_seconds']:>9.3f} "
+                f"{stage['peak_bytes'] / 1e6:>9.1f}"
+            )
+        lines.append(f"{'total':<22} {report['total_seconds']:>9.3f}")
+
+        if report["counters"]:
+            lines.append("")
+            lines.extend(f"{name}: {value}" for name, value in report["counters"].items())
+
+        if report["slowest_pages"]:
+            lines.append("")
+            lines.append(f"Slowest {len(report['slowest_pages'])} model pages:")
+            lines.extend(f"  {page['seconds'] * 1000:>8.2f} ms  {page['slug']}" for page in report["slowest_pages"])
+
+        if self.profile_stage:
+            lines.append("")
+            lines.append(f"cProfile stats for '{self.profile_stage}' written to {self.profile_output}")
+        return "\n".join(lines)
+
+    def write_json(self, path=PROFILE_JSON_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=2)
+            file.write("\n")
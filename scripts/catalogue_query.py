@@ -0,0 +1,219 @@
+# MusGU+ catalogue queries
+# Answers filter and top-k questions from bitmap indexes over the same facets the discovery table filters on.
+
+import argparse
+import bisect
+import glob
+import json
+import os
+
+import numpy as np
+
+import consolidate_csv as build
+from record_cache import RecordCache
+
+
+FACET_GROUPS = ("tags", "applications", "values", "dimensions")
+
+SCORE_COLUMNS = tuple(f"{dimension_key}_score" for dimension_key, _ in build.DIMENSIONS) + ("overall_score",)
+
+
+def bitmap_from_mask(mask):
+    # Bit i of the integer is row i of the table, so & and | work on whole columns at once.
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def bitmap_from_rows(row_ids, size):
+    mask = np.zeros(size, dtype=bool)
+    mask[row_ids] = True
+    return bitmap_from_mask(mask)
+
+
+def iter_rows(bitmap):
+    # Lowest row ids first, which is the table order.
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+class ScoreLevels:
+    # Scores are rounded to whole percentages, so one bitmap per distinct score covers every threshold.
+    __slots__ = ("levels", "equal", "at_least")
+
+    def __init__(self, scores):
+        values = np.asarray(scores, dtype=float)
+        self.levels = sorted(set(values.tolist()))
+        self.equal = [bitmap_from_mask(values == level) for level in self.levels]
+        self.at_least = [0] * len(self.levels)
+        accumulated = 0
+        for position in range(len(self.levels) - 1, -1, -1):
+            accumulated |= self.equal[position]
+            self.at_least[position] = accumulated
+
+    def minimum(self, threshold):
+        position = bisect.bisect_left(self.levels, threshold)
+        return self.at_least[position] if position < len(self.levels) else 0
+
+
+class CatalogueIndex:
+    def __init__(self, table):
+        # Row ids follow the table order, so they line up with the facet index the page uses.
+        self.names = list(table.rows)
+        self.rows = list(table.rows.values())
+        self.everything = (1 << len(self.rows)) - 1
+
+        facet_index = build.build_facet_index(table)
+        self.bitmaps = {
+            group: {key: bitmap_from_rows(row_ids, len(self.rows)) for key, row_ids in facet_index[group].items()}
+            for group in FACET_GROUPS
+        }
+        self.scores = {column: ScoreLevels(table.column(column, 0)) for column in SCORE_COLUMNS}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def facet(self, group, key):
+        # Unknown keys match nothing, as they do on the page.
+        return self.bitmaps[group].get(key, 0)
+
+    def select(self, tags=(), applications=(), values=(), dimensions=(), min_scores=None):
+        selected = self.everything
+        for group, keys in (("tags", tags), ("applications", applications), ("values", values), ("dimensions", dimensions)):
+            for key in keys:
+                selected &= self.facet(group, key)
+        for dimension_key, threshold in (min_scores or {}).items():
+            selected &= self.scores[f"{dimension_key}_score"].minimum(threshold)
+        return selected
+
+    def count(self, **filters):
+        return self.select(**filters).bit_count()
+
+    def top(self, limit=10, sort="overall_score", **filters):
+        selected = self.select(**filters)
+        if sort not in self.scores:
+            raise ValueError(f"cannot sort by {sort}; expected one of {', '.join(self.scores)}")
+
+        row_ids = []
+        if sort == "overall_score":
+            # The table is already ranked by overall score.
+            for row_id in iter_rows(selected):
+                if len(row_ids) == limit:
+                    break
+                row_ids.append(row_id)
+        else:
+            # Walk the score buckets from the top; ties keep the table order.
+            levels = self.scores[sort]
+            for position in range(len(levels.levels) - 1, -1, -1):
+                bucket = selected & levels.equal[position]
+                for row_id in iter_rows(bucket):
+                    if len(row_ids) == limit:
+                        break
+                    row_ids.append(row_id)
+                if len(row_ids) == limit:
+                    break
+
+        return [(self.names[row_id], self.rows[row_id]) for row_id in row_ids]
+
+
+def load_index(projects_dir="./projects", weights_path=build.SCORING_WEIGHTS_PATH, jobs=1, cache=None):
+    files = sorted(file_name for file_name in glob.glob(projects_dir + "/*.yaml") if "_template" not in file_name)
+    table = build.calculate_scores(build.create_table(files, jobs, cache), build.load_scoring_weights(weights_path))
+    return CatalogueIndex(table.sorted_by("overall_score", descending=True))
+
+
+def parse_min_score(text):
+    dimension_key, separator, threshold = text.partition("=")
+    dimensions = [dimension_key for dimension_key, _ in build.DIMENSIONS]
+    if not separator or dimension_key not in dimensions:
+        raise argparse.ArgumentTypeError(f"expected DIMENSION=SCORE with DIMENSION one of {', '.join(dimensions)}")
+    try:
+        return dimension_key, float(threshold)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{threshold!r} is not a score") from None
+
+
+def parse_args(argv=None):
+    criterion_ids = ", ".join(build.CRITERION_INFO[criterion]["id"] for _, criteria in build.DIMENSIONS for criterion in criteria)
+    parser = argparse.ArgumentParser(
+        description="Query the MusGU+ catalogue with the discovery table's filters.",
+        epilog=f"Criterion ids: {criterion_ids}.",
+    )
+    parser.add_argument("--tag", action="append", default=[], help="criterion tag as CRITERION:TAG, e.g. realtime:real-time")
+    parser.add_argument("--application", action="append", default=[], help="musical application, e.g. 'audio synthesis'")
+    parser.add_argument(
+        "--value", action="append", default=[], help="criterion value as CRITERION:LEVEL (high, partial, low or empty)"
+    )
+    parser.add_argument(
+        "--dimension",
+        action="append",
+        default=[],
+        choices=[dimension_key for dimension_key, _ in build.DIMENSIONS],
+        help=f"dimension scoring at least {build.DIMENSION_FILTER_THRESHOLD}%%, like the table's dimension filters",
+    )
+    parser.add_argument(
+        "--min-score",
+        action="append",
+        default=[],
+        type=parse_min_score,
+        metavar="DIMENSION=SCORE",
+        help="dimension scoring at least SCORE",
+    )
+    parser.add_argument("--sort", default="overall_score", choices=SCORE_COLUMNS, help="score the results are ranked by")
+    parser.add_argument("--limit", type=int, default=10, help="number of results to list")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--weights", default=build.SCORING_WEIGHTS_PATH, help="YAML file with the scoring weights")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes used to load projects (0 uses every core)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse every YAML file instead of reusing the records cached in .build-cache/",
+    )
+    args = parser.parse_args(argv)
+    if args.limit < 0:
+        parser.error("--limit must be zero or a positive number")
+    if args.jobs < 0:
+        parser.error("--jobs must be zero or a positive number")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    index = load_index(weights_path=args.weights, jobs=args.jobs, cache=None if args.no_cache else RecordCache())
+
+    filters = {
+        "tags": args.tag,
+        "applications": args.application,
+        "values": args.value,
+        "dimensions": args.dimension,
+        "min_scores": dict(args.min_score),
+    }
+    results = index.top(args.limit, args.sort, **filters)
+
+    if args.json:
+        print(json.dumps(
+            [
+                {"name": name, "slug": row["project.slug"], **{column: row[column] for column in SCORE_COLUMNS}}
+                for name, row in results
+            ],
+            ensure_ascii=False,
+            indent=2,
+        ))
+        return
+
+    print(f"{index.count(**filters)} of {len(index)} models match")
+    dimension_keys = [dimension_key for dimension_key, _ in build.DIMENSIONS]
+    for name, row in results:
+        scores = "  ".join(f"{dimension_key[:4]} {row[f'{dimension_key}_score']:>3.0f}" for dimension_key in dimension_keys)
+        print(f"{row['overall_score']:>5.0f}  {scores}  {name}")
+
+
+if __name__ == "__main__":
+    main()
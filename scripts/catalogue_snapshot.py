@@ -0,0 +1,231 @@
+# MusGU+ catalogue snapshot
+# Keeps an indexed SQLite copy of the scored catalogue up to date, rewriting only the projects that changed.
+
+import hashlib
+import json
+import os
+import sqlite3
+
+import consolidate_csv as build
+
+
+# Bumped whenever the tables below change; an older snapshot is rebuilt from scratch.
+SCHEMA_VERSION = 1
+
+PROJECT_FIELDS = ("affiliation", "architecture", "link", "repository", "article")
+
+SCORE_COLUMNS = tuple(f"{dimension_key}_score" for dimension_key, _ in build.DIMENSIONS) + ("overall_score",)
+
+# Project-level notes live next to the criterion notes under this key.
+PROJECT_NOTES_KEY = "project"
+
+
+def schema_statements():
+    project_columns = "".join(f"    {field} TEXT NOT NULL DEFAULT '',\n" for field in PROJECT_FIELDS)
+    score_columns = "".join(f"    {column} REAL NOT NULL,\n" for column in SCORE_COLUMNS)
+    statements = [
+        "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+        "CREATE TABLE criteria (\n"
+        "    key TEXT PRIMARY KEY,\n"
+        "    dimension TEXT NOT NULL,\n"
+        "    criterion TEXT NOT NULL,\n"
+        "    label TEXT NOT NULL,\n"
+        "    position INTEGER NOT NULL\n"
+        ")",
+        "CREATE TABLE projects (\n"
+        "    id INTEGER PRIMARY KEY,\n"
+        "    slug TEXT NOT NULL UNIQUE,\n"
+        "    name TEXT NOT NULL,\n"
+        f"{project_columns}"
+        "    source_file TEXT NOT NULL,\n"
+        "    rank INTEGER NOT NULL,\n"
+        f"{score_columns}"
+        "    content_hash TEXT NOT NULL\n"
+        ")",
+        "CREATE TABLE criterion_values (\n"
+        "    project_id INTEGER NOT NULL REFERENCES projects(id),\n"
+        "    criterion TEXT NOT NULL REFERENCES criteria(key),\n"
+        "    value TEXT NOT NULL,\n"
+        "    PRIMARY KEY (project_id, criterion)\n"
+        ") WITHOUT ROWID",
+        "CREATE TABLE notes (\n"
+        "    project_id INTEGER NOT NULL REFERENCES projects(id),\n"
+        "    criterion TEXT NOT NULL,\n"
+        "    notes TEXT NOT NULL,\n"
+        "    PRIMARY KEY (project_id, criterion)\n"
+        ") WITHOUT ROWID",
+        "CREATE TABLE tags (\n"
+        "    project_id INTEGER NOT NULL REFERENCES projects(id),\n"
+        "    criterion TEXT NOT NULL REFERENCES criteria(key),\n"
+        "    tag TEXT NOT NULL,\n"
+        "    derived INTEGER NOT NULL,\n"
+        "    PRIMARY KEY (project_id, criterion, tag)\n"
+        ") WITHOUT ROWID",
+        "CREATE TABLE applications (\n"
+        "    project_id INTEGER NOT NULL REFERENCES projects(id),\n"
+        "    application TEXT NOT NULL,\n"
+        "    PRIMARY KEY (project_id, application)\n"
+        ") WITHOUT ROWID",
+        "CREATE INDEX criterion_values_by_value ON criterion_values (criterion, value)",
+        "CREATE INDEX tags_by_tag ON tags (tag, criterion)",
+        "CREATE INDEX applications_by_application ON applications (application)",
+    ]
+    statements += [f"CREATE INDEX projects_by_{column} ON projects ({column} DESC)" for column in SCORE_COLUMNS]
+    return statements
+
+
+CHILD_TABLES = ("criterion_values", "notes", "tags", "applications")
+
+
+def content_hash(row):
+    # Scores and rank are compared separately, so a new weighting does not rewrite every child row.
+    content = {key: value for key, value in row.items() if key not in SCORE_COLUMNS}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def criterion_rows():
+    rows = []
+    for dimension_key, criteria in build.DIMENSIONS:
+        for criterion in criteria:
+            label = build.CRITERION_INFO[criterion]["page_label"]
+            rows.append((f"{dimension_key}.{criterion}", dimension_key, criterion, label, len(rows)))
+    return rows
+
+
+def project_children(project_id, row):
+    values = []
+    notes = []
+    tags = []
+    if row.get("project.notes"):
+        notes.append((project_id, PROJECT_NOTES_KEY, str(row["project.notes"])))
+
+    for dimension_key, criteria in build.DIMENSIONS:
+        for criterion in criteria:
+            criterion_key = f"{dimension_key}.{criterion}"
+            value = row.get(f"{criterion_key}.value", "")
+            values.append((project_id, criterion_key, value))
+            if row.get(f"{criterion_key}.notes"):
+                notes.append((project_id, criterion_key, str(row[f"{criterion_key}.notes"])))
+
+    # The same tags the table filters on, with the ones implied by a value flagged as derived.
+    written = set()
+    for criterion_key, tag in build.get_row_criterion_tags(row):
+        if (criterion_key, tag) in written:
+            continue
+        written.add((criterion_key, tag))
+        derived = tag not in build.split_tags(row.get(f"{criterion_key}.tags", ""))
+        tags.append((project_id, criterion_key, tag, int(derived)))
+
+    applications = [
+        (project_id, application)
+        for application in dict.fromkeys(build.split_tags(row.get("project.applications", "")))
+    ]
+    return {"criterion_values": values, "notes": notes, "tags": tags, "applications": applications}
+
+
+def create_schema(connection):
+    for table in ("applications", "tags", "notes", "criterion_values", "projects", "criteria", "meta"):
+        connection.execute(f"DROP TABLE IF EXISTS {table}")
+    for statement in schema_statements():
+        connection.execute(statement)
+    connection.executemany("INSERT INTO criteria VALUES (?, ?, ?, ?, ?)", criterion_rows())
+    connection.execute("INSERT INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+
+
+def schema_version(connection):
+    try:
+        row = connection.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    except sqlite3.DatabaseError:
+        return None
+    return int(row[0]) if row else None
+
+
+def write_snapshot(table, path):
+    stats = {"added": 0, "updated": 0, "rescored": 0, "removed": 0, "unchanged": 0}
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            if schema_version(connection) != SCHEMA_VERSION:
+                create_schema(connection)
+
+            existing = {
+                slug: (project_id, stored_hash, rank, tuple(scores))
+                for slug, project_id, stored_hash, rank, *scores in connection.execute(
+                    f"SELECT slug, id, content_hash, rank, {', '.join(SCORE_COLUMNS)} FROM projects"
+                )
+            }
+
+            project_columns = ("slug", "name") + PROJECT_FIELDS + ("source_file", "rank") + SCORE_COLUMNS + ("content_hash",)
+            insert_project = (
+                f"INSERT INTO projects ({', '.join(project_columns)}) VALUES ({', '.join('?' * len(project_columns))})"
+            )
+            update_project = (
+                f"UPDATE projects SET {', '.join(f'{column} = ?' for column in project_columns[1:])} WHERE id = ?"
+            )
+            update_scores = f"UPDATE projects SET rank = ?, {', '.join(f'{column} = ?' for column in SCORE_COLUMNS)} WHERE id = ?"
+
+            seen = set()
+            children = {name: [] for name in CHILD_TABLES}
+            stale_ids = []
+            for rank, (name, row) in enumerate(table.rows.items(), start=1):
+                slug = str(row["project.slug"])
+                seen.add(slug)
+                scores = tuple(float(row[column]) for column in SCORE_COLUMNS)
+                row_hash = content_hash({**row, "project.name": name})
+                values = (
+                    (slug, name)
+                    + tuple(str(row.get(f"project.{field}", "")) for field in PROJECT_FIELDS)
+                    + (str(row.get("source.file", "")), rank)
+                    + scores
+                    + (row_hash,)
+                )
+
+                if slug not in existing:
+                    project_id = connection.execute(insert_project, values).lastrowid
+                    stats["added"] += 1
+                else:
+                    project_id, stored_hash, stored_rank, stored_scores = existing[slug]
+                    if stored_hash == row_hash:
+                        if (stored_rank, stored_scores) != (rank, scores):
+                            connection.execute(update_scores, (rank,) + scores + (project_id,))
+                            stats["rescored"] += 1
+                        else:
+                            stats["unchanged"] += 1
+                        continue
+                    connection.execute(update_project, values[1:] + (project_id,))
+                    stale_ids.append(project_id)
+                    stats["updated"] += 1
+
+                for child_table, child_rows in project_children(project_id, row).items():
+                    children[child_table].extend(child_rows)
+
+            removed_ids = [existing[slug][0] for slug in existing if slug not in seen]
+            stats["removed"] = len(removed_ids)
+            for child_table in CHILD_TABLES:
+                connection.executemany(
+                    f"DELETE FROM {child_table} WHERE project_id = ?", [(project_id,) for project_id in stale_ids + removed_ids]
+                )
+            connection.executemany("DELETE FROM projects WHERE id = ?", [(project_id,) for project_id in removed_ids])
+
+            for child_table, child_rows in children.items():
+                if child_rows:
+                    placeholders = ", ".join("?" * len(child_rows[0]))
+                    connection.executemany(f"INSERT INTO {child_table} VALUES ({placeholders})", child_rows)
+    finally:
+        connection.close()
+    return stats
+
+
+def remove_snapshot(path):
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def update_snapshot(table, path=build.SNAPSHOT_PATH):
+    try:
+        return write_snapshot(table, path)
+    except sqlite3.DatabaseError:
+        # A damaged file, or one that is not SQLite at all: the snapshot only holds derived data, so it starts over.
+        remove_snapshot(path)
+        return write_snapshot(table, path)
@@ -1,18 +1,50 @@
 # MusGU+ table generator
 # Generates the discovery table and model detail pages from YAML evaluations.
 
+import argparse
+import concurrent.futures
 import datetime
 import glob
+import hashlib
 import html
+import itertools
+import json
 import os
+import shutil
+import time
 
-import pandas as pd
+import numpy as np
 import yaml
-from bs4 import BeautifulSoup
+
+from build_manifest import (
+    empty_manifest,
+    hash_bytes,
+    hash_file,
+    hash_templates,
+    is_output_current,
+    load_manifest,
+    save_manifest,
+    write_if_changed,
+)
+from build_profile import PROFILE_JSON_PATH, BuildProfiler
+from html_templates import load_template, text
+from project_table import ProjectTable
+from record_cache import RecordCache
+from source_dates import source_date_epoch, source_timestamps
+from static_output import build_static_output
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 
 
 UTC = getattr(datetime, "UTC", datetime.timezone.utc)
 
+YAML_STR_TAG = "tag:yaml.org,2002:str"
+YAML_NULL_TAG = "tag:yaml.org,2002:null"
+YAML_MAP_TAG = "tag:yaml.org,2002:map"
+
 
 DIMENSIONS = [
     (
@@ -55,6 +87,64 @@ DIMENSION_LABELS = {
 
 VALUE_MAP = {"high": 1, "partial": 0.5, "low": 0, "": 0}
 
+DIMENSION_FILTER_THRESHOLD = 60
+
+ROW_SHARD_DIR = "rows"
+ROW_SHARD_SIZE = 200
+
+INDEX_TEMPLATE_PATH = "./docs/template.html"
+INDEX_TEMPLATE_SLOTS = (
+    "applications-wrapper",
+    "included-table",
+    "build-time",
+    "facet-index",
+    "sort-orders",
+    "search-build",
+)
+
+MODEL_TEMPLATE_PATH = "./docs/model_template.html"
+MODEL_DATA_NAME = "model.json"
+SIMILAR_DATA_NAME = "similar.json"
+MODEL_TEMPLATE_SLOTS = (
+    "page-title",
+    "model-page-heading",
+    "resource-links",
+    "model-affiliation",
+    "model-architecture",
+    "project-note",
+    "applications-content",
+    "dimension-sections",
+    "build-time",
+)
+
+SCORING_WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoring.yaml")
+
+SNAPSHOT_PATH = "./docs/musgu.sqlite"
+
+LINK_FIELDS = ("link", "repository", "article")
+LINK_STATUS_LABEL = "unreachable"
+
+PROFILE_STAGES = (
+    "links",
+    "stream",
+    "load",
+    "table",
+    "score",
+    "table_html",
+    "facet_index",
+    "sort_orders",
+    "row_shards",
+    "search",
+    "index",
+    "model_pages",
+    "csv",
+    "similar",
+    "snapshot",
+    "history",
+    "manifest",
+    "static_output",
+)
+
 STATUS_META = {
     "high": {"label": "Fully supported", "symbol": "✔︎", "class_name": "high"},
     "partial": {"label": "Partially supported", "symbol": "~", "class_name": "partial"},
@@ -157,65 +247,253 @@ def escape_attr(value):
     return html.escape(str(value), quote=True)
 
 
-def create_dataframe(files):
-    df = pd.DataFrame()
-    source_file = []
-    project_slugs = []
+def project_slug(file_name):
+    return os.path.splitext(os.path.basename(file_name))[0]
 
-    for file_name in files:
-        with open(file_name, "r", encoding="utf-8") as file:
-            file_df = pd.json_normalize(yaml.safe_load(file))
-        source_file.append(file_name[1:])
-        project_slugs.append(os.path.splitext(os.path.basename(file_name))[0])
-        df = pd.concat([df, file_df], axis=0)
 
-    df["source.file"] = source_file
-    df["project.slug"] = project_slugs
-    df = df.replace({None: ""})
-    df = df[df["project.name"] != ""]
-    df.set_index("project.name", inplace=True)
-    return df
+def flatten_record(data, prefix="", record=None):
+    if record is None:
+        record = {}
+    for key, value in data.items():
+        column = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            flatten_record(value, f"{column}.", record)
+        else:
+            record[column] = value
+    return record
+
+
+def flatten_node(node, prefix, record):
+    # Returns False on anything but text, empty values and non-empty sections with distinct text keys.
+    keys = set()
+    for key_node, value_node in node.value:
+        if key_node.tag != YAML_STR_TAG or key_node.value in keys:
+            return False
+        keys.add(key_node.value)
+        column = prefix + key_node.value
+        if value_node.tag == YAML_STR_TAG:
+            record[column] = value_node.value
+        elif value_node.tag == YAML_NULL_TAG:
+            record[column] = None
+        elif value_node.tag == YAML_MAP_TAG and value_node.value:
+            if not flatten_node(value_node, f"{column}.", record):
+                return False
+        else:
+            return False
+    return True
+
+
+def parse_project_record(content):
+    # Most of yaml.load's time goes to constructing Python objects node by node, so evaluations are flattened
+    # straight from the composed nodes. Documents using anything else (numbers, dates, merge keys) go
+    # through yaml.load, so the record is the same either way.
+    loader = YamlLoader(content)
+    try:
+        root = loader.get_single_node()
+    finally:
+        loader.dispose()
+    record = {}
+    if root is None:
+        return record
+    if root.tag != YAML_MAP_TAG or not flatten_node(root, "", record):
+        return flatten_record(yaml.load(content, Loader=YamlLoader) or {})
+    return record
+
+
+def load_project_entry(file_name):
+    with open(file_name, "rb") as file:
+        content = file.read()
+        stat = os.fstat(file.fileno())
+
+    record = parse_project_record(content)
+    record["source.file"] = file_name[1:]
+    record["project.slug"] = project_slug(file_name)
+    return stat.st_size, stat.st_mtime_ns, hashlib.sha256(content).hexdigest(), record
+
+
+def load_project_record(file_name):
+    return load_project_entry(file_name)[3]
+
+
+def load_project_records(files, jobs=1, cache=None):
+    records = {}
+    if cache is not None:
+        for file_name in files:
+            record = cache.get(file_name)
+            if record is not None:
+                records[file_name] = record
+
+    missing = [file_name for file_name in files if file_name not in records]
+    if jobs > 1 and len(missing) > 1:
+        chunksize = max(1, len(missing) // (jobs * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            entries = list(executor.map(load_project_entry, missing, chunksize=chunksize))
+    else:
+        entries = [load_project_entry(file_name) for file_name in missing]
+
+    for file_name, (size, mtime_ns, digest, record) in zip(missing, entries):
+        records[file_name] = record
+        if cache is not None:
+            cache.put(file_name, size, mtime_ns, digest, record)
+
+    if cache is not None:
+        cache.prune(files)
+        cache.save()
+
+    return [records[file_name] for file_name in files]
+
+
+def create_table(files, jobs=1, cache=None):
+    return ProjectTable.from_records(load_project_records(files, jobs, cache))
+
+
+def default_scoring_weights():
+    return {
+        "dimensions": {dimension_key: 1.0 for dimension_key, _ in DIMENSIONS},
+        "criteria": {
+            f"{dimension_key}.{criterion}": 1.0 for dimension_key, criteria in DIMENSIONS for criterion in criteria
+        },
+    }
+
+
+def load_scoring_weights(path=None):
+    weights = default_scoring_weights()
+    if not path:
+        return weights
+
+    with open(path, "r", encoding="utf-8") as file:
+        config = yaml.safe_load(file) or {}
+
+    for dimension_key, weight in (config.get("dimensions") or {}).items():
+        if dimension_key not in weights["dimensions"]:
+            raise ValueError(f"{path}: unknown dimension '{dimension_key}'")
+        weights["dimensions"][dimension_key] = float(weight)
+
+    for dimension_key, criteria in (config.get("criteria") or {}).items():
+        for criterion, weight in (criteria or {}).items():
+            criterion_key = f"{dimension_key}.{criterion}"
+            if criterion_key not in weights["criteria"]:
+                raise ValueError(f"{path}: unknown criterion '{criterion_key}'")
+            weights["criteria"][criterion_key] = float(weight)
+
+    if any(weight < 0 for weight in weights["dimensions"].values()) or any(
+        weight < 0 for weight in weights["criteria"].values()
+    ):
+        raise ValueError(f"{path}: weights must not be negative")
+    if not sum(weights["dimensions"].values()):
+        raise ValueError(f"{path}: at least one dimension needs a positive weight")
+    for dimension_key, criteria in DIMENSIONS:
+        if not sum(weights["criteria"][f"{dimension_key}.{criterion}"] for criterion in criteria):
+            raise ValueError(f"{path}: dimension '{dimension_key}' needs a criterion with a positive weight")
 
+    return weights
 
-def calculate_scores(df):
-    for project in df.index:
-        for dimension_key, criteria in DIMENSIONS:
-            columns = [f"{dimension_key}.{criterion}.value" for criterion in criteria]
-            score = sum(VALUE_MAP.get(df.loc[project, column], 0) for column in columns if column in df.columns)
-            df.loc[project, f"{dimension_key}_score"] = round((score / len(criteria)) * 100, 0)
 
-        overall = (
-            df.loc[project, "adaptability_score"]
-            + df.loc[project, "controllability_score"]
-            + df.loc[project, "usability_score"]
-        ) / 3
-        df.loc[project, "overall_score"] = round(overall, 0)
+def value_matrix(table):
+    columns = [f"{dimension_key}.{criterion}.value" for dimension_key, criteria in DIMENSIONS for criterion in criteria]
+    matrix = np.zeros((len(table), len(columns)))
+    for position, column in enumerate(columns):
+        matrix[:, position] = [VALUE_MAP.get(value, 0) for value in table.column(column)]
+    return matrix
+
+
+def score_matrix(matrix, weights):
+    scores = {}
+    overall = np.zeros(len(matrix))
+    offset = 0
+
+    for dimension_key, criteria in DIMENSIONS:
+        criterion_weights = np.array(
+            [weights["criteria"][f"{dimension_key}.{criterion}"] for criterion in criteria], dtype=float
+        )
+        block = matrix[:, offset:offset + len(criteria)]
+        offset += len(criteria)
+
+        scores[f"{dimension_key}_score"] = np.round((block @ criterion_weights) / criterion_weights.sum() * 100, 0)
+        overall += weights["dimensions"][dimension_key] * scores[f"{dimension_key}_score"]
+
+    scores["overall_score"] = np.round(overall / sum(weights["dimensions"].values()), 0)
+    return scores
+
 
-    return df
+def load_ranking_profiles(path=None):
+    # Named dimension weightings from the "profiles" section of the scoring weights, in file order.
+    if not path:
+        return []
+
+    with open(path, "r", encoding="utf-8") as file:
+        config = yaml.safe_load(file) or {}
+
+    profiles = []
+    for profile_id, profile in (config.get("profiles") or {}).items():
+        profile = profile or {}
+        weights = {dimension_key: 1.0 for dimension_key, _ in DIMENSIONS}
+        for dimension_key, weight in (profile.get("dimensions") or {}).items():
+            if dimension_key not in weights:
+                raise ValueError(f"{path}: profile '{profile_id}' has an unknown dimension '{dimension_key}'")
+            weights[dimension_key] = float(weight)
+        if any(weight < 0 for weight in weights.values()):
+            raise ValueError(f"{path}: profile '{profile_id}' weights must not be negative")
+        if not sum(weights.values()):
+            raise ValueError(f"{path}: profile '{profile_id}' needs a dimension with a positive weight")
+        profiles.append({"id": str(profile_id), "label": str(profile.get("label") or profile_id), "dimensions": weights})
+    return profiles
+
+
+def calculate_scores(table, weights=None):
+    if weights is None:
+        weights = default_scoring_weights()
+
+    for column, scores in score_matrix(value_matrix(table), weights).items():
+        table.set_column(column, scores.tolist())
+    return table
+
+
+def score_record(record, weights=None):
+    # Scores a single flattened record exactly like calculate_scores, without building a frame.
+    if weights is None:
+        weights = default_scoring_weights()
+
+    matrix = np.array(
+        [[
+            VALUE_MAP.get(record.get(f"{dimension_key}.{criterion}.value"), 0)
+            for dimension_key, criteria in DIMENSIONS
+            for criterion in criteria
+        ]],
+        dtype=float,
+    )
+    return {column: float(scores[0]) for column, scores in score_matrix(matrix, weights).items()}
 
 
-def collect_all_applications(df):
+def collect_all_applications(rows):
     applications = set()
-    for project in df.index:
-        applications.update(split_tags(df.loc[project, "project.applications"]))
+    for project_row in rows.values():
+        applications.update(split_tags(project_row.get("project.applications", "")))
     return sorted(applications)
 
 
-def collect_tags_by_criterion(df):
-    tags_by_criterion = {}
+def get_row_criterion_tags(project_row):
+    criterion_tags = []
 
-    for project in df.index:
-        for dimension_key, criteria in DIMENSIONS:
-            for criterion in criteria:
-                criterion_key = f"{dimension_key}.{criterion}"
-                tags_col = f"{dimension_key}.{criterion}.tags"
-                for tag in split_tags(df.loc[project, tags_col]) if tags_col in df.columns else []:
-                    tags_by_criterion.setdefault(criterion_key, set()).add(tag)
+    for dimension_key, criteria in DIMENSIONS:
+        for criterion in criteria:
+            criterion_key = f"{dimension_key}.{criterion}"
+            for tag in split_tags(project_row.get(f"{dimension_key}.{criterion}.tags", "")):
+                criterion_tags.append((criterion_key, tag))
+
+            value = project_row.get(f"{dimension_key}.{criterion}.value", "")
+            for tag in SYNTHETIC_TAGS.get(criterion, {}).get(value, []):
+                criterion_tags.append((criterion_key, tag))
+
+    return criterion_tags
 
-                value_col = f"{dimension_key}.{criterion}.value"
-                value = df.loc[project, value_col] if value_col in df.columns else ""
-                for tag in SYNTHETIC_TAGS.get(criterion, {}).get(value, []):
-                    tags_by_criterion.setdefault(criterion_key, set()).add(tag)
+
+def collect_tags_by_criterion(rows):
+    tags_by_criterion = {}
+
+    for project_row in rows.values():
+        for criterion_key, tag in get_row_criterion_tags(project_row):
+            tags_by_criterion.setdefault(criterion_key, set()).add(tag)
 
     for dimension_key, criteria in DIMENSIONS:
         for criterion in criteria:
@@ -229,22 +507,13 @@ def collect_tags_by_criterion(df):
     return tags_by_criterion
 
 
-def get_row_tags(df, project):
-    row_tags = []
-
-    for dimension_key, criteria in DIMENSIONS:
-        for criterion in criteria:
-            criterion_id = CRITERION_INFO[criterion]["id"]
-            tags_col = f"{dimension_key}.{criterion}.tags"
-            for tag in split_tags(df.loc[project, tags_col]) if tags_col in df.columns else []:
-                row_tags.append(f"{criterion_id}:{tag}")
-
-            value_col = f"{dimension_key}.{criterion}.value"
-            value = df.loc[project, value_col] if value_col in df.columns else ""
-            for tag in SYNTHETIC_TAGS.get(criterion, {}).get(value, []):
-                row_tags.append(f"{criterion_id}:{tag}")
-
-    return row_tags
+def get_row_tags(project_row):
+    criterion_ids = {
+        f"{dimension_key}.{criterion}": CRITERION_INFO[criterion]["id"]
+        for dimension_key, criteria in DIMENSIONS
+        for criterion in criteria
+    }
+    return [f"{criterion_ids[criterion_key]}:{tag}" for criterion_key, tag in get_row_criterion_tags(project_row)]
 
 
 def get_status_meta(value):
@@ -255,12 +524,12 @@ def build_detail_page_link(slug):
     return f"models/{slug}/"
 
 
-def write_html(df):
-    projects = df.index.tolist()
-    sorted_applications = collect_all_applications(df)
-    tags_by_criterion = collect_tags_by_criterion(df)
-
-    html_table = ['<table id="musgu-table">', "<thead>", '<tr class="main-header">']
+def render_table_head(tags_by_criterion, sharded=False):
+    if sharded:
+        html_table = [f'<table id="musgu-table" data-rows-url="{ROW_SHARD_DIR}/index.json">']
+    else:
+        html_table = ['<table id="musgu-table">']
+    html_table += ["<thead>", '<tr class="main-header">']
     html_table.append('<th class="sortable" data-sort="name" data-type="text">Model <span class="sort-arrow">▴▾</span></th>')
 
     for dimension_key, criteria in DIMENSIONS:
@@ -268,7 +537,8 @@ def write_html(df):
             f'<th colspan="{len(criteria)}" class="sortable" data-sort="{dimension_key}" data-type="number">'
             '<div class="dimension-header-cell">'
             f'<span class="dimension-name">{DIMENSION_LABELS[dimension_key]} <span class="sort-arrow">▴▾</span></span>'
-            f'<div class="dimension-filter-tag" data-filter="{dimension_key}" data-threshold="60">≥60%</div>'
+            f'<div class="dimension-filter-tag" data-filter="{dimension_key}" '
+            f'data-threshold="{DIMENSION_FILTER_THRESHOLD}">≥{DIMENSION_FILTER_THRESHOLD}%</div>'
             "</div></th>"
         )
 
@@ -280,7 +550,7 @@ def write_html(df):
         for criterion in criteria:
             info = CRITERION_INFO[criterion]
             criterion_key = f"{dimension_key}.{criterion}"
-            tags = sorted(tags_by_criterion.get(criterion_key, set()), key=len)
+            tags = sorted(tags_by_criterion.get(criterion_key, set()), key=lambda tag: (len(tag), tag))
 
             header_bits = ['<th><div class="criterion-header-wrapper">', f'<span>{info["table_label"]}</span>']
             if tags:
@@ -298,122 +568,375 @@ def write_html(df):
 
     html_table.append("</tr>")
     html_table.append("</thead>")
-    html_table.append("<tbody>")
-
-    for project in projects:
-        affiliation = df.loc[project, "project.affiliation"] if "project.affiliation" in df.columns else ""
-        slug = str(df.loc[project, "project.slug"])
-        row_tags = get_row_tags(df, project)
-        row_applications = split_tags(df.loc[project, "project.applications"]) if "project.applications" in df.columns else []
-
-        row_html = [
-            f'<tr class="row-a" data-name="{escape_attr(project)}" '
-            f'data-affiliation="{escape_attr(affiliation)}" '
-            f'data-adaptability="{int(df.loc[project, "adaptability_score"])}" '
-            f'data-usability="{int(df.loc[project, "usability_score"])}" '
-            f'data-controllability="{int(df.loc[project, "controllability_score"])}" '
-            f'data-overall="{int(df.loc[project, "overall_score"])}" '
-            f'data-tags="{escape_attr(",".join(row_tags))}" '
-            f'data-applications="{escape_attr(",".join(row_applications))}">'
-        ]
-
-        row_html.append('<td class="name-cell">')
-        row_html.append(
-            f'<div class="model-name"><a href="{escape_attr(build_detail_page_link(slug))}" '
-            f'aria-label="Open details page for {escape_attr(project)}">{html.escape(project)}</a></div>'
-        )
-        if affiliation:
-            row_html.append(f'<div class="affiliation">{html.escape(affiliation)}</div>')
-        row_html.append("</td>")
+    return html_table
 
-        for dimension_key, criteria in DIMENSIONS:
-            for criterion in criteria:
-                value = df.loc[project, f"{dimension_key}.{criterion}.value"]
-                notes = escape_attr(df.loc[project, f"{dimension_key}.{criterion}.notes"])
-                status = get_status_meta(value)
-                row_html.append(
-                    f'<td class="{status["class_name"]} data-cell" title="{notes}">{status["symbol"]}</td>'
-                )
 
-        row_html.append("</tr>")
-        html_table.append("".join(row_html))
+def render_table_row(row_id, project, project_row):
+    return f'<tr class="row-a" data-row="{row_id}" ' + render_table_row_body(project, project_row)
+
+
+def render_table_row_body(project, project_row):
+    # Everything after the row id, so a row can be moved without re-rendering it.
+    affiliation = project_row.get("project.affiliation", "")
+    slug = str(project_row["project.slug"])
+
+    row_html = [
+        f'data-name="{escape_attr(project)}" '
+        f'data-affiliation="{escape_attr(affiliation)}" '
+        f'data-adaptability="{int(project_row["adaptability_score"])}" '
+        f'data-usability="{int(project_row["usability_score"])}" '
+        f'data-controllability="{int(project_row["controllability_score"])}" '
+        f'data-overall="{int(project_row["overall_score"])}">'
+    ]
+
+    row_html.append('<td class="name-cell">')
+    row_html.append(
+        f'<div class="model-name"><input type="checkbox" class="compare-toggle" value="{escape_attr(slug)}" '
+        f'aria-label="Select {escape_attr(project)} for comparison">'
+        f'<a href="{escape_attr(build_detail_page_link(slug))}" '
+        f'aria-label="Open details page for {escape_attr(project)}">{html.escape(project)}</a></div>'
+    )
+    if affiliation:
+        row_html.append(f'<div class="affiliation">{html.escape(affiliation)}</div>')
+    row_html.append("</td>")
+
+    for dimension_key, criteria in DIMENSIONS:
+        for criterion in criteria:
+            value = project_row.get(f"{dimension_key}.{criterion}.value", "")
+            notes = escape_attr(project_row.get(f"{dimension_key}.{criterion}.notes", ""))
+            status = get_status_meta(value)
+            row_html.append(
+                f'<td class="{status["class_name"]} data-cell" title="{notes}">{status["symbol"]}</td>'
+            )
+
+    row_html.append("</tr>")
+    return "".join(row_html)
 
-    html_table.append("</tbody>")
-    html_table.append("</table>")
 
+def render_applications_section(applications):
     applications_html = ['<div class="applications-section">', '<h3 class="applications-title">Musical Applications</h3>']
     applications_html.append('<div class="applications-tags-container">')
-    for app in sorted_applications:
+    for app in applications:
         escaped_app = html.escape(app)
         applications_html.append(
             f'<span class="application-tag" data-application="{escaped_app}">{escaped_app}</span>'
         )
     applications_html.append("</div>")
     applications_html.append("</div>")
+    return "\n".join(applications_html)
+
 
-    return "\n".join(html_table), "\n".join(applications_html)
+def assemble_table(head_html, row_html):
+    return "\n".join([*head_html, "<tbody>", *row_html, "</tbody>", "</table>"])
 
 
-def create_index(table_html, applications_html):
-    with open("./docs/template.html", "r", encoding="utf-8") as file:
-        soup = BeautifulSoup(file.read(), "html.parser")
+def write_html(table, sharded=False):
+    rows = table.rows
+    html_table = render_table_head(collect_tags_by_criterion(rows), sharded)
 
-    applications_wrapper = soup.find(id="applications-wrapper")
-    if applications_wrapper and applications_html:
-        applications_wrapper.append(BeautifulSoup(applications_html, "html.parser"))
+    # Sharded tables are filled in by the page from the row shards.
+    row_html = [] if sharded else [
+        render_table_row(row_id, project, project_row) for row_id, (project, project_row) in enumerate(rows.items())
+    ]
 
-    included_table = soup.find(id="included-table")
-    if included_table:
-        included_table.append(BeautifulSoup(table_html, "html.parser"))
+    return assemble_table(html_table, row_html), render_applications_section(collect_all_applications(rows))
 
-    guide_paragraphs = soup.find(id="table-guide")
-    if guide_paragraphs:
-        paragraphs = guide_paragraphs.find_all("p")
-        if paragraphs:
-            paragraphs[-1].clear()
-            paragraphs[-1].append("Click a model name to open its detail page, or explore the corresponding YAML file in the ")
-            link = soup.new_tag(
-                "a",
-                href="https://github.com/lauraibnz/MusGU-plus/tree/main/projects",
-                style="color: #0066cc;",
-            )
-            link.string = "projects folder"
-            paragraphs[-1].append(link)
-            paragraphs[-1].append(".")
 
-    build_message = datetime.datetime.now(UTC).strftime("Discovery tool last updated on %Y-%m-%d at %H:%M UTC.")
-    target_footer = soup.find(id="build-time")
-    if target_footer:
-        target_footer.string = build_message
+def get_row_facets(project_row):
+    facets = {
+        "tags": list(dict.fromkeys(get_row_tags(project_row))),
+        "applications": list(dict.fromkeys(split_tags(project_row.get("project.applications", "")))),
+        "values": [],
+        "dimensions": [],
+    }
+
+    for dimension_key, criteria in DIMENSIONS:
+        for criterion in criteria:
+            value = project_row.get(f"{dimension_key}.{criterion}.value", "")
+            facets["values"].append(f'{CRITERION_INFO[criterion]["id"]}:{get_status_meta(value)["class_name"]}')
+
+        if project_row[f"{dimension_key}_score"] >= DIMENSION_FILTER_THRESHOLD:
+            facets["dimensions"].append(dimension_key)
+
+    return facets
+
+
+def assemble_facet_index(row_facets):
+    # Row ids are positions in the table as written by write_html.
+    facets = {"rows": len(row_facets), "tags": {}, "applications": {}, "values": {}, "dimensions": {}}
+
+    for row_id, facet_keys in enumerate(row_facets):
+        for group, keys in facet_keys.items():
+            for key in keys:
+                facets[group].setdefault(key, []).append(row_id)
+
+    facets["counts"] = {
+        group: {key: len(row_ids) for key, row_ids in facets[group].items()}
+        for group in ("tags", "applications", "values", "dimensions")
+    }
+    return facets
+
+
+def build_facet_index(table):
+    return assemble_facet_index([get_row_facets(project_row) for project_row in table.rows.values()])
+
+
+def json_script(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True).replace("</", "<\\/")
+
+
+def assemble_sort_orders(names, scores, profiles=()):
+    # Row ids in ascending order for each sortable column, ties in table order; the page reads
+    # descending orders backwards, one run of equal keys at a time, so it never sorts rows itself.
+    lowered = [str(name).lower() for name in names]
+    orders = {"name": sorted(range(len(lowered)), key=lowered.__getitem__)}
+    for column, values in scores.items():
+        orders[column] = np.argsort(np.asarray(values, dtype=float), kind="stable").tolist()
+
+    rankings = []
+    for profile in profiles:
+        weights = profile["dimensions"]
+        total = np.zeros(len(lowered))
+        for dimension_key, weight in weights.items():
+            total += weight * np.asarray(scores[dimension_key], dtype=float)
+        profile_scores = np.round(total / sum(weights.values()), 0)
+        # Best first, like the overall ranking the table is written in.
+        order = np.argsort(-profile_scores, kind="stable").tolist()
+        rankings.append({"id": profile["id"], "label": profile["label"], "order": order})
+    return {"columns": orders, "profiles": rankings}
+
+
+def build_sort_orders(table, profiles=()):
+    scores = {dimension_key: table.column(f"{dimension_key}_score", 0) for dimension_key, _ in DIMENSIONS}
+    scores["overall"] = table.column("overall_score", 0)
+    return assemble_sort_orders(list(table.rows), scores, profiles)
+
+
+def descending_order(order, keys):
+    # The ascending order read backwards one run of equal keys at a time, as the inline page does, so ties keep the table order.
+    descending = []
+    end = len(order)
+    while end > 0:
+        start = end - 1
+        while start > 0 and keys[order[start - 1]] == keys[order[start]]:
+            start -= 1
+        descending.extend(order[start:end])
+        end = start
+    return descending
+
+
+def build_row_shards(table, facet_index, shard_size=ROW_SHARD_SIZE, sort_orders=None):
+    # rows/index.json only holds the facet counts and the paths of the other files, so it stays small however
+    # many rows there are. The rows, each facet group, each sort order and the search text are separate files
+    # the page fetches when it first needs them.
+    meta = {
+        "rows": len(table),
+        "shardSize": shard_size,
+        "shards": [],
+        "counts": facet_index["counts"],
+        "facets": {},
+        "orders": {"columns": {}, "profiles": []},
+        "text": f"{ROW_SHARD_DIR}/text.json",
+    }
+    shards = {}
+    rows = []
+    text = []
+    sort_keys = {"name": []}
+    sort_keys.update({dimension_key: [] for dimension_key, _ in DIMENSIONS})
+    sort_keys["overall"] = []
+
+    for project, project_row in table.rows.items():
+        name = str(project)
+        affiliation = str(project_row.get("project.affiliation", ""))
+        values = []
+        notes = []
+        for dimension_key, criteria in DIMENSIONS:
+            for criterion in criteria:
+                values.append(get_status_meta(project_row[f"{dimension_key}.{criterion}.value"])["class_name"][0])
+                notes.append(str(project_row[f"{dimension_key}.{criterion}.notes"]))
+            sort_keys[dimension_key].append(int(project_row[f"{dimension_key}_score"]))
+        sort_keys["overall"].append(int(project_row["overall_score"]))
+        sort_keys["name"].append(name.lower())
+        rows.append([str(project_row["project.slug"]), name, affiliation, "".join(values), notes])
+        # Name and affiliation are separate words, so a query cannot match across them.
+        text.append(f"{name} {affiliation}")
+
+    for start in range(0, len(rows), shard_size):
+        shard_path = f"{ROW_SHARD_DIR}/{start // shard_size:05d}.json"
+        meta["shards"].append(shard_path)
+        shards[shard_path] = json_script({"start": start, "rows": rows[start:start + shard_size]})
+    for group, postings in facet_index.items():
+        if group in ("counts", "rows"):
+            continue
+        facet_path = f"{ROW_SHARD_DIR}/facet-{group}.json"
+        meta["facets"][group] = facet_path
+        shards[facet_path] = json_script(postings)
+    if sort_orders is not None:
+        for column, order in sort_orders["columns"].items():
+            order_path = f"{ROW_SHARD_DIR}/order-{column}.json"
+            meta["orders"]["columns"][column] = order_path
+            shards[order_path] = json_script({"ascending": order, "descending": descending_order(order, sort_keys[column])})
+        for position, profile in enumerate(sort_orders["profiles"]):
+            # Profile ids come from the weights file, so the file is named by position.
+            profile_path = f"{ROW_SHARD_DIR}/profile-{position}.json"
+            meta["orders"]["profiles"].append({"id": profile["id"], "label": profile["label"], "path": profile_path})
+            shards[profile_path] = json_script(profile["order"])
+    shards[meta["text"]] = json_script(text)
+    shards[f"{ROW_SHARD_DIR}/index.json"] = json_script(meta)
+    return shards
+
+
+def iter_index_page(
+    table_parts,
+    applications_html,
+    facet_parts=None,
+    build_time=None,
+    order_parts=None,
+    search_build=None,
+):
+    # The table and facet index are iterables of strings so a streaming build never holds them whole.
+    if build_time is None:
+        build_time = datetime.datetime.now(UTC)
+
+    template = load_html_template(INDEX_TEMPLATE_PATH, INDEX_TEMPLATE_SLOTS)
+    slots = {
+        "included-table": itertools.chain([template.defaults["included-table"]], table_parts),
+        "build-time": text(build_time.strftime("Discovery tool last updated on %Y-%m-%d at %H:%M UTC.")),
+    }
+    if applications_html:
+        slots["applications-wrapper"] = template.defaults["applications-wrapper"] + applications_html
+    if facet_parts is not None:
+        slots["facet-index"] = facet_parts
+    if order_parts is not None:
+        slots["sort-orders"] = order_parts
+    if search_build is not None:
+        slots["search-build"] = json_script(search_build)
+    return template.iter_render(slots)
+
+
+def render_index_page(
+    table_html,
+    applications_html,
+    facet_index=None,
+    build_time=None,
+    sort_orders=None,
+    search_build=None,
+):
+    facet_parts = None if facet_index is None else [json_script(facet_index)]
+    order_parts = None if sort_orders is None else [json_script(sort_orders)]
+    return "".join(
+        iter_index_page([table_html], applications_html, facet_parts, build_time, order_parts, search_build)
+    )
+
 
-    with open("./docs/index.html", "w", encoding="utf-8") as file:
-        file.write(str(soup))
+def create_index(
+    table_html,
+    applications_html,
+    facet_index=None,
+    previous=None,
+    manifest=None,
+    row_shards=None,
+    build_time=None,
+    write_stats=None,
+    sort_orders=None,
+    search_build=None,
+):
+    row_shards = row_shards or {}
+    outputs = {"index.html": "./docs/index.html"}
+    outputs.update({shard_path: os.path.join("./docs", shard_path) for shard_path in row_shards})
+
+    if previous is not None and manifest is not None:
+        sources = set(previous["sources"]) | set(manifest["sources"])
+        if set(previous["index"]) == set(outputs) and all(
+            is_output_current(previous, manifest, "index", key, path, sources=sources) for key, path in outputs.items()
+        ):
+            manifest["index"].update(previous["index"])
+            if write_stats is not None:
+                write_stats["unchanged"] += len(outputs)
+            return False
+
+    contents = dict(row_shards)
+    contents["index.html"] = render_index_page(
+        table_html,
+        applications_html,
+        None if row_shards else facet_index,
+        build_time,
+        None if row_shards else sort_orders,
+        search_build,
+    )
+    for key, content in contents.items():
+        data = content.encode("utf-8")
+        write_if_changed(outputs[key], data, write_stats)
+        if manifest is not None:
+            manifest["index"][key] = hash_bytes(data)
+
+    if previous is not None:
+        for key in sorted(set(previous["index"]) - set(outputs)):
+            stale_path = os.path.join("./docs", key)
+            if key.startswith(f"{ROW_SHARD_DIR}/") and os.path.exists(stale_path):
+                os.remove(stale_path)
+        shard_dir = os.path.join("./docs", ROW_SHARD_DIR)
+        if os.path.isdir(shard_dir) and not os.listdir(shard_dir):
+            os.rmdir(shard_dir)
+    return True
+
+
+def load_html_template(template_path, slot_ids):
+    return load_template(template_path, slot_ids)
+
+
+def clean_link(url):
+    clean_url = str(url).strip()
+    if not clean_url or clean_url.lower().startswith("not available"):
+        return ""
+    return clean_url
+
+
+def get_project_links(project_row):
+    # The links an evaluation provides itself, as (field, url); the YAML source link is added on the page.
+    links = []
+    for field in LINK_FIELDS:
+        url = clean_link(project_row.get(f"project.{field}", ""))
+        if url:
+            links.append((field, url))
+    return links
+
+
+def render_link_status(status):
+    return (
+        f'<span class="resource-link-status" title="{escape_attr(status)}">'
+        f"{html.escape(LINK_STATUS_LABEL)}</span>"
+    )
 
 
-def load_html_template(template_path):
-    with open(template_path, "r", encoding="utf-8") as file:
-        return BeautifulSoup(file.read(), "html.parser")
+def get_page_link_status(project_row, link_status):
+    # Only the failures of this page's own links travel with its render job.
+    if not link_status:
+        return None
+    return {url: link_status[url] for _, url in get_project_links(project_row) if url in link_status} or None
 
 
-def render_link_list(project_row, slug):
+def render_link_list(project_row, slug, link_status=None):
     links = []
+    link_status = link_status or {}
+    urls = dict(get_project_links(project_row))
     link_specs = [
-        ("🔗", "Website", project_row.get("project.link", "")),
-        ("💻", "Repository", project_row.get("project.repository", "")),
-        ("📄", "Article", project_row.get("project.article", "")),
+        ("🔗", "Website", urls.get("link", "")),
+        ("💻", "Repository", urls.get("repository", "")),
+        ("📄", "Article", urls.get("article", "")),
         ("🗂", "YAML source", f"https://github.com/lauraibnz/MusGU-plus/blob/main/projects/{slug}.yaml"),
     ]
 
     for icon, label, url in link_specs:
-        clean_url = str(url).strip()
-        if not clean_url or clean_url.lower().startswith("not available"):
+        if not url:
             continue
+        status_html = render_link_status(link_status[url]) if url in link_status else ""
         links.append(
-            f'<a class="resource-link" href="{escape_attr(clean_url)}" '
+            f'<a class="resource-link" href="{escape_attr(url)}" '
             f'target="_blank" rel="noreferrer noopener">'
             f'<span class="resource-link-icon" aria-hidden="true">{html.escape(icon)}</span>'
             f'<span class="resource-link-label">{html.escape(label)}</span>'
-            f"</a>"
+            f"{status_html}</a>"
         )
 
     return "".join(links)
@@ -461,97 +984,520 @@ def render_dimension_section(project_row, dimension_key, criteria):
     """
 
 
-def render_model_page(project_name, project_row):
+def render_model_page(project_name, project_row, build_time=None, link_status=None):
     slug = project_row["project.slug"]
     applications = split_tags(project_row.get("project.applications", ""))
     architecture = project_row.get("project.architecture", "")
     affiliation = project_row.get("project.affiliation", "")
     summary_note = project_row.get("project.notes", "")
 
-    soup = load_html_template("./docs/model_template.html")
+    template = load_html_template(MODEL_TEMPLATE_PATH, MODEL_TEMPLATE_SLOTS)
+    links_html = render_link_list(project_row, slug, link_status)
+    sections_html = "".join(
+        render_dimension_section(project_row, dimension_key, criteria)
+        for dimension_key, criteria in DIMENSIONS
+    )
+    if build_time is None:
+        build_time = datetime.datetime.now(UTC)
+
+    slots = {
+        "page-title": text(f"MusGU+ Evaluation: {project_name}"),
+        "model-page-heading": text(f"MusGU+ Evaluation: {project_name}"),
+        "model-affiliation": text(affiliation or "Not provided"),
+        "model-architecture": text(architecture or "Not provided"),
+        "project-note": None,
+        "resource-links": None,
+        "applications-content": template.defaults["applications-content"] + render_applications(applications),
+        "dimension-sections": template.defaults["dimension-sections"] + sections_html,
+        "build-time": text(
+            "Model page last updated on " + build_time.strftime("%Y-%m-%d at %H:%M UTC") + "."
+        ),
+    }
+    if summary_note:
+        slots["project-note"] = template.defaults["project-note"] + f"<p>{html.escape(summary_note)}</p>"
+    if links_html:
+        slots["resource-links"] = template.defaults["resource-links"] + links_html
+
+    return template.render(slots)
+
+
+def build_model_data(project_name, project_row):
+    # What render_model_page shows, as data for the comparison view (docs/compare.html).
+    tags_by_criterion = {}
+    for criterion_key, tag in get_row_criterion_tags(project_row):
+        tags_by_criterion.setdefault(criterion_key, []).append(tag)
 
-    page_title = soup.find(id="page-title")
-    if page_title:
-        page_title.string = f"MusGU+ Evaluation: {project_name}"
+    dimensions = []
+    for dimension_key, criteria in DIMENSIONS:
+        criterion_data = []
+        for criterion in criteria:
+            criterion_key = f"{dimension_key}.{criterion}"
+            info = CRITERION_INFO[criterion]
+            criterion_data.append({
+                "id": info["id"],
+                "label": info["page_label"],
+                "value": get_status_meta(project_row.get(f"{criterion_key}.value", ""))["class_name"],
+                "notes": str(project_row.get(f"{criterion_key}.notes", "") or ""),
+                "tags": list(dict.fromkeys(tags_by_criterion.get(criterion_key, []))),
+            })
+        dimensions.append({
+            "key": dimension_key,
+            "label": DIMENSION_LABELS[dimension_key],
+            "score": int(project_row.get(f"{dimension_key}_score", 0)),
+            "criteria": criterion_data,
+        })
+
+    return {
+        "name": str(project_name),
+        "slug": str(project_row["project.slug"]),
+        "affiliation": str(project_row.get("project.affiliation", "") or ""),
+        "architecture": str(project_row.get("project.architecture", "") or ""),
+        "notes": str(project_row.get("project.notes", "") or ""),
+        "applications": split_tags(project_row.get("project.applications", "")),
+        "links": dict(get_project_links(project_row)),
+        "overall": int(project_row.get("overall_score", 0)),
+        "dimensions": dimensions,
+    }
+
+
+def render_model_data(project_name, project_row):
+    return json.dumps(build_model_data(project_name, project_row), ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def remove_model_page(slug):
+    page_dir = os.path.join("./docs/models", slug)
+    for file_name in ("index.html", MODEL_DATA_NAME, SIMILAR_DATA_NAME):
+        output_path = os.path.join(page_dir, file_name)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    if os.path.isdir(page_dir) and not os.listdir(page_dir):
+        shutil.rmtree(page_dir)
+
+
+class ModelPageError(RuntimeError):
+    def __init__(self, slug, message):
+        super().__init__(slug, message)
+        self.slug = slug
+        self.message = message
+
+    def __str__(self):
+        return f"failed to render model page '{self.slug}': {self.message}"
+
+
+def render_model_page_job(job):
+    project_name, project_row, build_time, link_status = job
+    started = time.perf_counter()
+    try:
+        return render_model_page(project_name, project_row, build_time, link_status), time.perf_counter() - started
+    except Exception as error:
+        raise ModelPageError(project_row.get("project.slug", project_name), f"{type(error).__name__}: {error}") from error
+
+
+def render_model_pages(jobs, workers=1):
+    if workers > 1 and len(jobs) > 1:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from executor.map(render_model_page_job, jobs, chunksize=chunksize)
+    else:
+        yield from map(render_model_page_job, jobs)
+
+
+def create_model_pages(
+    table,
+    previous=None,
+    manifest=None,
+    workers=1,
+    build_time=None,
+    page_times=None,
+    write_stats=None,
+    render_times=None,
+    link_status=None,
+):
+    os.makedirs("./docs/models", exist_ok=True)
+    stats = {"rendered": 0, "skipped": 0, "removed": 0}
+    if build_time is None:
+        build_time = datetime.datetime.now(UTC)
+    page_times = page_times or {}
+    pending = []
+
+    for project, project_row in table.rows.items():
+        slug = str(project_row["project.slug"])
+        page_path = os.path.join("./docs/models", slug, "index.html")
+
+        # The comparison data is small enough to write here; only pages go to the workers.
+        data_path = os.path.join("./docs/models", slug, MODEL_DATA_NAME)
+        if previous is not None and manifest is not None and is_output_current(
+            previous, manifest, "data", slug, data_path
+        ):
+            manifest["data"][slug] = previous["data"][slug]
+            if write_stats is not None:
+                write_stats["unchanged"] += 1
+        else:
+            data = render_model_data(project, project_row).encode("utf-8")
+            write_if_changed(data_path, data, write_stats)
+            if manifest is not None:
+                manifest["data"][slug] = hash_bytes(data)
+
+        if previous is not None and manifest is not None:
+            if is_output_current(previous, manifest, "pages", slug, page_path):
+                manifest["pages"][slug] = previous["pages"][slug]
+                stats["skipped"] += 1
+                if write_stats is not None:
+                    write_stats["unchanged"] += 1
+                continue
 
-    page_heading = soup.find(id="model-page-heading")
-    if page_heading:
-        page_heading.string = f"MusGU+ Evaluation: {project_name}"
+        pending.append(
+            (project, dict(project_row), page_times.get(slug, build_time), get_page_link_status(project_row, link_status))
+        )
 
-    model_affiliation = soup.find(id="model-affiliation")
-    if model_affiliation:
-        model_affiliation.string = affiliation or "Not provided"
+    for (_, project_row, _, _), (page_html, seconds) in zip(pending, render_model_pages(pending, workers)):
+        slug = str(project_row["project.slug"])
+        if render_times is not None:
+            render_times[slug] = seconds
+        data = page_html.encode("utf-8")
+        write_if_changed(os.path.join("./docs/models", slug, "index.html"), data, write_stats)
+        stats["rendered"] += 1
 
-    model_architecture = soup.find(id="model-architecture")
-    if model_architecture:
-        model_architecture.string = architecture or "Not provided"
+        if manifest is not None:
+            manifest["pages"][slug] = hash_bytes(data)
 
-    project_note = soup.find(id="project-note")
-    if project_note:
-        if summary_note:
-            project_note.append(BeautifulSoup(f"<p>{html.escape(summary_note)}</p>", "html.parser"))
-        else:
-            project_note.decompose()
+    if previous is not None and manifest is not None:
+        for slug in sorted(set(previous["pages"]) - set(manifest["pages"])):
+            remove_model_page(slug)
+            stats["removed"] += 1
 
-    resource_links = soup.find(id="resource-links")
-    links_html = render_link_list(project_row, slug)
-    if resource_links:
-        if links_html:
-            resource_links.append(BeautifulSoup(links_html, "html.parser"))
-        else:
-            resource_links.decompose()
+    return stats
 
-    applications_content = soup.find(id="applications-content")
-    if applications_content:
-        applications_content.append(BeautifulSoup(render_applications(applications), "html.parser"))
 
-    sections_html = "".join(
-        render_dimension_section(project_row, dimension_key, criteria)
-        for dimension_key, criteria in DIMENSIONS
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the MusGU+ discovery table and model pages.")
+    parser.add_argument(
+        "--weights",
+        default=SCORING_WEIGHTS_PATH,
+        help="YAML file with per-dimension and per-criterion scoring weights",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes used to load projects and render model pages (0 uses every core)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse every YAML file instead of reusing the records cached in .build-cache/",
     )
-    dimension_sections = soup.find(id="dimension-sections")
-    if dimension_sections:
-        dimension_sections.append(BeautifulSoup(sections_html, "html.parser"))
-
-    build_time = soup.find(id="build-time")
-    if build_time:
-        build_time.string = (
-            "Model page last updated on "
-            + datetime.datetime.now(UTC).strftime("%Y-%m-%d at %H:%M UTC")
-            + "."
+    parser.add_argument(
+        "--sharded",
+        action="store_true",
+        help="write a shell index page and load table rows lazily from JSON shards in docs/rows/",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=ROW_SHARD_SIZE,
+        help="number of table rows per JSON shard in --sharded mode",
+    )
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="date pages by the last commit (or mtime) of their YAML source instead of the build time",
+    )
+    parser.add_argument(
+        "--dist",
+        metavar="DIR",
+        help="also write a minified, fingerprinted and pre-compressed copy of docs/ to DIR",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="ignore the build manifest and regenerate every page",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="read each evaluation once and spool rows to disk so memory stays flat on very large catalogues "
+        "(no record cache, row shards or SQLite snapshot)",
+    )
+    parser.add_argument(
+        "--check-links",
+        action="store_true",
+        help="check every website, repository and article link first (see scripts/link_checker.py)",
+    )
+    parser.add_argument(
+        "--link-badges",
+        action="store_true",
+        help="flag links that failed the last link check on the model pages",
+    )
+    parser.add_argument(
+        "--no-similar",
+        action="store_true",
+        help="skip the similar models listed on each model page",
+    )
+    parser.add_argument(
+        "--no-search",
+        action="store_true",
+        help="skip the full-text search index the search box loads from docs/search/",
+    )
+    parser.add_argument(
+        "--snapshot",
+        default=SNAPSHOT_PATH,
+        help="indexed SQLite copy of the catalogue, updated in place for the projects that changed",
+    )
+    parser.add_argument(
+        "--no-snapshot",
+        action="store_true",
+        help="skip the SQLite snapshot",
+    )
+    parser.add_argument(
+        "--history",
+        action="store_true",
+        help="write each model's score history from the git history of projects/ (see scripts/score_history.py)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep the catalogue in memory, re-render pages as YAML files change and serve them locally",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help="port for the --watch server",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="report wall time, CPU time and peak memory per build stage, plus the slowest model pages",
+    )
+    parser.add_argument(
+        "--profile-json",
+        default=PROFILE_JSON_PATH,
+        help="where --profile writes its machine-readable report",
+    )
+    parser.add_argument(
+        "--profile-slowest",
+        type=int,
+        default=10,
+        help="number of slowest model pages listed by --profile",
+    )
+    parser.add_argument(
+        "--profile-stage",
+        choices=PROFILE_STAGES,
+        help="also run cProfile over this stage and dump its stats for pstats or snakeviz",
+    )
+    parser.add_argument(
+        "--profile-output",
+        default="./.build-cache/build-stage.pstats",
+        help="where --profile-stage writes its cProfile stats",
+    )
+    args = parser.parse_args(argv)
+    if args.profile_stage:
+        args.profile = True
+    if args.watch and args.sharded:
+        parser.error("--watch serves the inline table and cannot be combined with --sharded")
+    if args.stream and (args.sharded or args.watch):
+        parser.error("--stream writes the inline table and cannot be combined with --sharded or --watch")
+    if args.jobs < 0:
+        parser.error("--jobs must be zero or a positive number")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.shard_size < 1:
+        parser.error("--shard-size must be a positive number")
+    return args
+
+
+def build_in_memory(args, all_files, previous, manifest, build_time, page_times, write_stats, profiler, link_status=None):
+    from validate_projects import load_and_validate
+
+    manifest["sources"] = {project_slug(file_name): hash_file(file_name) for file_name in all_files}
+
+    # Every file is checked against the template before anything is rendered.
+    cache = None if args.no_cache else RecordCache()
+    with profiler.stage("load"):
+        records, errors = load_and_validate(all_files, jobs=args.jobs, cache=cache)
+    if errors:
+        for error in errors:
+            print(error)
+        raise SystemExit(f"✗ {len(errors)} problem(s) in the evaluations; run scripts/validate_projects.py to re-check")
+    with profiler.stage("table"):
+        table = ProjectTable.from_records([records[file_name] for file_name in all_files])
+    profiler.count("files_parsed", cache.misses if cache is not None else len(all_files))
+    profiler.count("projects", len(table))
+    with profiler.stage("score"):
+        table = calculate_scores(table, load_scoring_weights(args.weights))
+        table = table.sorted_by("overall_score", descending=True)
+
+    with profiler.stage("table_html"):
+        table_html, applications_html = write_html(table, sharded=args.sharded)
+    with profiler.stage("facet_index"):
+        facet_index = build_facet_index(table)
+    with profiler.stage("sort_orders"):
+        sort_orders = build_sort_orders(table, load_ranking_profiles(args.weights))
+    row_shards = None
+    if args.sharded:
+        with profiler.stage("row_shards"):
+            row_shards = build_row_shards(table, facet_index, args.shard_size, sort_orders)
+    # The search index goes first: the index page names the fingerprint of the shards it may use.
+    search_build = None
+    if not args.no_search:
+        from search_index import build_search_postings, write_search_index
+
+        with profiler.stage("search"):
+            shard_count, search_build = write_search_index(build_search_postings(table), len(table), write_stats)
+        print(f"Search index: {shard_count} shards.")
+    manifest["options"]["index"]["search"] = search_build
+    with profiler.stage("index"):
+        create_index(
+            table_html,
+            applications_html,
+            facet_index,
+            previous,
+            manifest,
+            row_shards,
+            build_time,
+            write_stats,
+            sort_orders,
+            search_build,
         )
+    with profiler.stage("model_pages"):
+        stats = create_model_pages(
+            table,
+            previous,
+            manifest,
+            args.jobs,
+            build_time,
+            page_times,
+            write_stats,
+            profiler.page_timings,
+            link_status,
+        )
+    with profiler.stage("csv"):
+        write_if_changed("./docs/df.csv", table.to_csv(), write_stats)
+    if not args.no_similar:
+        from model_similarity import update_table_similar_models
+
+        with profiler.stage("similar"):
+            similar_stats = update_table_similar_models(table, write_stats)
+        print(f"Similar models: {similar_stats['recomputed']} recomputed, {similar_stats['merged']} merged.")
+    if not args.no_snapshot:
+        from catalogue_snapshot import update_snapshot
+
+        with profiler.stage("snapshot"):
+            snapshot_stats = update_snapshot(table, args.snapshot)
+        print(
+            f"Snapshot: {snapshot_stats['added']} added, {snapshot_stats['updated']} updated, "
+            f"{snapshot_stats['rescored']} rescored, {snapshot_stats['removed']} removed, "
+            f"{snapshot_stats['unchanged']} unchanged."
+        )
+    return stats
 
-    return str(soup)
-
-
-def create_model_pages(df):
-    os.makedirs("./docs/models", exist_ok=True)
-
-    for project in df.index:
-        project_row = df.loc[project].to_dict()
-        slug = project_row["project.slug"]
-        page_dir = os.path.join("./docs/models", slug)
-        os.makedirs(page_dir, exist_ok=True)
 
-        with open(os.path.join(page_dir, "index.html"), "w", encoding="utf-8") as file:
-            file.write(render_model_page(project, project_row))
+def main(argv=None):
+    args = parse_args(argv)
+    if args.watch:
+        from watch_server import LiveSite, serve
 
+        serve(LiveSite(weights_path=args.weights, cache=None if args.no_cache else RecordCache()), port=args.port)
+        return
 
-def main():
     path = "./projects"
-    all_files = [file_name for file_name in glob.glob(path + "/*.yaml") if "_template" not in file_name]
+    all_files = sorted(file_name for file_name in glob.glob(path + "/*.yaml") if "_template" not in file_name)
 
     print("Processing files:", all_files)
 
-    df = create_dataframe(all_files)
-    df = calculate_scores(df)
-    df = df.sort_values(by="overall_score", ascending=False)
+    previous = empty_manifest() if args.full else load_manifest()
+    manifest = empty_manifest()
+    manifest["options"]["index"] = {"sharded": args.sharded, "shard_size": args.shard_size if args.sharded else None}
+    manifest["templates"] = hash_templates([args.weights])
+
+    profiler = BuildProfiler(args.profile, args.profile_slowest, args.profile_stage, args.profile_output)
+    profiler.start()
+
+    # SOURCE_DATE_EPOCH pins every timestamp; --reproducible dates each page by its own source.
+    build_time = source_date_epoch() or datetime.datetime.now(UTC)
+    page_times = {}
+    if args.reproducible:
+        page_times = {project_slug(file_name): timestamp for file_name, timestamp in source_timestamps(all_files).items()}
+        if page_times:
+            build_time = max(page_times.values())
+    write_stats = {"written": 0, "unchanged": 0, "bytes": 0}
+
+    if args.check_links:
+        from link_checker import check_project_links
+
+        with profiler.stage("links"):
+            summary = check_project_links(all_files, args.jobs, None if args.no_cache else RecordCache())["summary"]
+        print(f"Links: {summary['links']} total, {summary['checked']} checked, {summary['broken']} broken.")
+    link_status = None
+    if args.link_badges:
+        from link_checker import link_status_digest, load_link_status
+
+        # Pages are rebuilt whenever the set of failing links changes.
+        link_status = load_link_status()
+        manifest["options"]["pages"] = {"link_status": link_status_digest(link_status)}
+
+    if args.stream:
+        from streaming_build import build_streaming
+
+        # Source hashes are recorded as each file is read, so no file is opened twice.
+        stats = build_streaming(
+            all_files,
+            load_scoring_weights(args.weights),
+            previous,
+            manifest,
+            build_time,
+            page_times,
+            write_stats,
+            profiler,
+            args.jobs,
+            link_status,
+            load_ranking_profiles(args.weights),
+            not args.no_similar,
+            not args.no_search,
+        )
+    else:
+        stats = build_in_memory(
+            args, all_files, previous, manifest, build_time, page_times, write_stats, profiler, link_status
+        )
+    if args.history:
+        from score_history import update_score_history
 
-    table_html, applications_html = write_html(df)
-    create_index(table_html, applications_html)
-    create_model_pages(df)
-    df.to_csv("./docs/df.csv", index=False)
+        with profiler.stage("history"):
+            history_stats = update_score_history(
+                [project_slug(file_name) for file_name in all_files], load_scoring_weights(args.weights), write_stats
+            )
+        print(
+            f"Score history: {history_stats['commits']} new commits, {history_stats['parsed']} file versions parsed, "
+            f"{history_stats['series']} series written."
+        )
+    with profiler.stage("manifest"):
+        save_manifest(manifest)
 
+    print(
+        f"Model pages: {stats['rendered']} rendered, {stats['skipped']} unchanged, {stats['removed']} removed."
+    )
+    print(f"Output files: {write_stats['written']} rewritten, {write_stats['unchanged']} unchanged.")
+    profiler.count("pages_rendered", stats["rendered"])
+    profiler.count("files_written", write_stats["written"])
+    profiler.count("bytes_written", write_stats["bytes"])
+
+    if args.dist:
+        with profiler.stage("static_output"):
+            dist_stats = build_static_output("./docs", args.dist)
+        print(
+            f"Static output: {dist_stats['updated']} updated, {dist_stats['unchanged']} unchanged, "
+            f"{dist_stats['compressed']} compressed, {dist_stats['removed']} removed."
+        )
+        if not dist_stats["brotli"]:
+            print("Warning: the brotli package is not installed, so only .gz copies were written to the static output.")
+
+    if args.profile:
+        profiler.stop()
+        print()
+        print(profiler.format_report())
+        profiler.write_json(args.profile_json)
+        print(f"Profile written to {args.profile_json}")
     print("✓ Table and model pages generated successfully!")
 
 
@@ -1,16 +1,30 @@
 # CSV to YAML converter for MusGU+ evaluations
 # Converts Notion export to structured YAML files
 
+import argparse
+import concurrent.futures
 import csv
+import hashlib
+import json
 import os
-import copy
 
 import yaml
 
-# File paths
-csv_file_path = './misc/MusGU+ 2cd73fee0f4280859c39dab5b950f451_all.csv'
-yaml_template_path = './projects/_template.yaml'
-output_yaml_path = './projects/'
+try:
+    from yaml import CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
+
+
+CSV_FILE_PATH = "./misc/MusGU+ 2cd73fee0f4280859c39dab5b950f451_all.csv"
+YAML_TEMPLATE_PATH = "./projects/_template.yaml"
+OUTPUT_YAML_PATH = "./projects/"
+
+BATCH_SIZE = 500
+
+# Row digests of the last import, so rows that did not change are not serialized again.
+IMPORT_CACHE_PATH = "./.build-cache/csv-import.json"
+IMPORT_CACHE_VERSION = 1
 
 initial_comments = """---
 ####################################################################################################################################
@@ -20,116 +34,331 @@ initial_comments = """---
 
 """
 
+
 def normalize_value(val):
     """Convert CSV symbols to standard format"""
-    if not val or val.strip() == '':
-        return ''
+    if not val or val.strip() == "":
+        return ""
     val = val.strip()
-    if val == '✓':
-        return 'high'
-    elif val == '~':
-        return 'partial'
-    elif val == '✗' or val == '✘':
-        return 'low'
+    if val == "✓":
+        return "high"
+    elif val == "~":
+        return "partial"
+    elif val == "✗" or val == "✘":
+        return "low"
     return val
 
 
 def normalize_link(val):
     if not val:
-        return ''
+        return ""
     clean_val = val.strip()
-    if clean_val.lower().startswith('not available'):
-        return ''
+    if clean_val.lower().startswith("not available"):
+        return ""
     return clean_val
 
+
+def normalize_text(val):
+    return val or ""
+
+
+def normalize_name(val):
+    return (val or "").strip()
+
+
+# Notion column title for every criterion, in template order, and whether the export has a tags column for it.
+CRITERION_COLUMNS = {
+    "adaptability.hardware_requirements": ("[A][1] Hardware Requirements", False),
+    "adaptability.dataset_size": ("[A][2] Dataset Size", False),
+    "adaptability.adaptation_pathways": ("[A][3] Adaptation Pathways", True),
+    "adaptability.technical_barriers": ("[A][4] Technical Barriers", True),
+    "adaptability.model_redistribution": ("[A][5] Model Redistribution", False),
+    "controllability.conditioning_inputs": ("[C][1] Conditioning Inputs", True),
+    "controllability.time_varying_control": ("[C][2] Time-Varying Control", False),
+    "controllability.feature_disentanglement": ("[C][3] Feature Disentanglement", True),
+    "controllability.control_parameters": ("[C][4] Control Parameters", True),
+    "usability.interface_availability": ("[U][1] Interface Availability", True),
+    "usability.access_restrictions": ("[U][2] Access Restrictions", False),
+    "usability.realtime_capabilities": ("[U][3] Real-time Capabilities", False),
+    "usability.workflow_integration": ("[U][4] Workflow Integration", True),
+    "usability.output_licensing": ("[U][5] Output Licensing", False),
+    "usability.community_support": ("[U][6] Community Support", True),
+}
+
+# Project fields map to a CSV column and a normalizer; fields without a column only get normalized.
+PROJECT_COLUMNS = {
+    "project.name": ("Name", normalize_name),
+    "project.affiliation": ("Affiliation(s)", normalize_text),
+    "project.architecture": ("Model Architecture", normalize_text),
+    "project.applications": ("Musical Applications", normalize_text),
+    "project.link": ("Website", normalize_link),
+    "project.repository": ("Repository", normalize_link),
+    "project.article": ("Article", normalize_link),
+    "project.notes": (None, normalize_text),
+}
+
+
 def load_yaml_template(template_path):
-    with open(template_path, 'r') as template_file:
+    with open(template_path, "r", encoding="utf-8") as template_file:
         return yaml.safe_load(template_file)
 
-def write_yaml_file(data, output_path, modelname):
-    output_file = os.path.join(output_path, modelname + ".yaml")
-    
-    with open(output_file, 'w', encoding='utf-8') as yaml_file:
-        yaml_file.write(initial_comments)
-        yaml.dump(data, yaml_file, default_flow_style=False, allow_unicode=True, sort_keys=False)
-
-def csv_to_yaml(csv_path, yaml_template):
-    with open(csv_path, 'r', encoding='utf-8-sig') as csv_file:  # utf-8-sig handles BOM
-        reader = csv.DictReader(csv_file)
-        for row in reader:
-            project_data = copy.deepcopy(yaml_template)
-            
-            # Project metadata
-            model_name = row.get('Name', '').strip()
-            print(f"Processing: {model_name}")
-            project_data['project']['name'] = model_name
-            project_data['project']['affiliation'] = row.get('Affiliation(s)', '')
-            project_data['project']['architecture'] = row.get('Model Architecture', '')
-            project_data['project']['applications'] = row.get('Musical Applications', '')
-            project_data['project']['link'] = normalize_link(row.get('Website', ''))
-            project_data['project']['repository'] = normalize_link(row.get('Repository', ''))
-            project_data['project']['article'] = normalize_link(row.get('Article', ''))
-            project_data['project']['notes'] = ''
-            
-            # Adaptability
-            project_data['adaptability']['hardware_requirements']['value'] = normalize_value(row.get('[A][1] Hardware Requirements', ''))
-            project_data['adaptability']['hardware_requirements']['notes'] = row.get('[A][1] Notes', '')
-            
-            project_data['adaptability']['dataset_size']['value'] = normalize_value(row.get('[A][2] Dataset Size', ''))
-            project_data['adaptability']['dataset_size']['notes'] = row.get('[A][2] Notes', '')
-            
-            project_data['adaptability']['adaptation_pathways']['value'] = normalize_value(row.get('[A][3] Adaptation Pathways', ''))
-            project_data['adaptability']['adaptation_pathways']['notes'] = row.get('[A][3] Notes', '')
-            project_data['adaptability']['adaptation_pathways']['tags'] = row.get('[A][3] Tags', '')
-            
-            project_data['adaptability']['technical_barriers']['value'] = normalize_value(row.get('[A][4] Technical Barriers', ''))
-            project_data['adaptability']['technical_barriers']['notes'] = row.get('[A][4] Notes', '')
-            project_data['adaptability']['technical_barriers']['tags'] = row.get('[A][4] Tags', '')
-            
-            project_data['adaptability']['model_redistribution']['value'] = normalize_value(row.get('[A][5] Model Redistribution', ''))
-            project_data['adaptability']['model_redistribution']['notes'] = row.get('[A][5] Notes', '')
-            
-            # Controllability
-            project_data['controllability']['conditioning_inputs']['value'] = normalize_value(row.get('[C][1] Conditioning Inputs', ''))
-            project_data['controllability']['conditioning_inputs']['notes'] = row.get('[C][1] Notes', '')
-            project_data['controllability']['conditioning_inputs']['tags'] = row.get('[C][1] Tags', '')
-            
-            project_data['controllability']['time_varying_control']['value'] = normalize_value(row.get('[C][2] Time-Varying Control', ''))
-            project_data['controllability']['time_varying_control']['notes'] = row.get('[C][2] Notes', '')
-            
-            project_data['controllability']['feature_disentanglement']['value'] = normalize_value(row.get('[C][3] Feature Disentanglement', ''))
-            project_data['controllability']['feature_disentanglement']['notes'] = row.get('[C][3] Notes', '')
-            project_data['controllability']['feature_disentanglement']['tags'] = row.get('[C][3] Tags', '')
-            
-            project_data['controllability']['control_parameters']['value'] = normalize_value(row.get('[C][4] Control Parameters', ''))
-            project_data['controllability']['control_parameters']['notes'] = row.get('[C][4] Notes', '')
-            project_data['controllability']['control_parameters']['tags'] = row.get('[C][4] Tags', '')
-            
-            # Usability
-            project_data['usability']['interface_availability']['value'] = normalize_value(row.get('[U][1] Interface Availability', ''))
-            project_data['usability']['interface_availability']['notes'] = row.get('[U][1] Notes', '')
-            project_data['usability']['interface_availability']['tags'] = row.get('[U][1] Tags', '')
-            
-            project_data['usability']['access_restrictions']['value'] = normalize_value(row.get('[U][2] Access Restrictions', ''))
-            project_data['usability']['access_restrictions']['notes'] = row.get('[U][2] Notes', '')
-            
-            project_data['usability']['realtime_capabilities']['value'] = normalize_value(row.get('[U][3] Real-time Capabilities', ''))
-            project_data['usability']['realtime_capabilities']['notes'] = row.get('[U][3] Notes', '')
-            
-            project_data['usability']['workflow_integration']['value'] = normalize_value(row.get('[U][4] Workflow Integration', ''))
-            project_data['usability']['workflow_integration']['notes'] = row.get('[U][4] Notes', '')
-            project_data['usability']['workflow_integration']['tags'] = row.get('[U][4] Tags', '')
-            
-            project_data['usability']['output_licensing']['value'] = normalize_value(row.get('[U][5] Output Licensing', ''))
-            project_data['usability']['output_licensing']['notes'] = row.get('[U][5] Notes', '')
-            
-            project_data['usability']['community_support']['value'] = normalize_value(row.get('[U][6] Community Support', ''))
-            project_data['usability']['community_support']['notes'] = row.get('[U][6] Notes', '')
-            project_data['usability']['community_support']['tags'] = row.get('[U][6] Tags', '')
-            
-            # Write YAML file
-            write_yaml_file(project_data, output_yaml_path, project_data['project']['name'].lower().replace(' ', '-'))
-            print(f"YAML file for {project_data['project']['name']} created successfully.")
-
-yaml_template = load_yaml_template(yaml_template_path)
-csv_to_yaml(csv_file_path, yaml_template)
+
+def build_column_map():
+    column_map = dict(PROJECT_COLUMNS)
+    for key, (column, has_tags) in CRITERION_COLUMNS.items():
+        prefix = column.split(" ", 1)[0]
+        column_map[f"{key}.value"] = (column, normalize_value)
+        column_map[f"{key}.notes"] = (f"{prefix} Notes", normalize_text)
+        if has_tags:
+            column_map[f"{key}.tags"] = (f"{prefix} Tags", normalize_text)
+    return column_map
+
+
+def build_layout(yaml_template, column_map):
+    # Fields keep the template's order; mapped fields the template lacks go last, as assigning them used to.
+    layout = {}
+    for section, fields in yaml_template.items():
+        layout[section] = {}
+        for field, default in (fields or {}).items():
+            layout[section][field] = list(default) if isinstance(default, dict) else None
+
+    for key in column_map:
+        section, field, *subfield = key.split(".")
+        layout.setdefault(section, {})
+        if subfield:
+            layout[section].setdefault(field, [])
+            if subfield[0] not in layout[section][field]:
+                layout[section][field].append(subfield[0])
+        else:
+            layout[section].setdefault(field, None)
+    return layout
+
+
+def convert_row(row, layout, column_map):
+    project_data = {}
+    for section, fields in layout.items():
+        project_data[section] = {}
+        for field, subfields in fields.items():
+            if subfields is None:
+                project_data[section][field] = map_column(row, column_map, f"{section}.{field}")
+            else:
+                project_data[section][field] = {
+                    subfield: map_column(row, column_map, f"{section}.{field}.{subfield}") for subfield in subfields
+                }
+    return project_data
+
+
+def map_column(row, column_map, key):
+    if key not in column_map:
+        return None
+    column, normalize = column_map[key]
+    return normalize(row.get(column, "") if column else "")
+
+
+def model_file_name(model_name):
+    return model_name.lower().replace(" ", "-") + ".yaml"
+
+
+def serialize_project(project_data):
+    return initial_comments + yaml.dump(
+        project_data, Dumper=YamlDumper, default_flow_style=False, allow_unicode=True, sort_keys=False
+    )
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_file(path):
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def row_digest(row, columns, layout_digest):
+    return hash_bytes(json.dumps([layout_digest, [row.get(column) for column in columns]]).encode("utf-8"))
+
+
+def write_yaml_file(content, output_file, existing=None):
+    data = content.encode("utf-8")
+    if existing is None:
+        existing = read_file(output_file)
+    if existing == data:
+        return "unchanged", data
+    status = "created" if existing is None else "updated"
+
+    with open(output_file, "wb") as yaml_file:
+        yaml_file.write(data)
+    return status, data
+
+
+def convert_batch(rows, layout, column_map, output_path, recorded):
+    columns = [column for column, _ in column_map.values() if column]
+    layout_digest = hash_bytes(json.dumps(layout).encode("utf-8"))
+    results = []
+    for row in rows:
+        model_name = normalize_name(row.get(PROJECT_COLUMNS["project.name"][0]))
+        file_name = model_file_name(model_name)
+        output_file = os.path.join(output_path, file_name)
+        digest = row_digest(row, columns, layout_digest)
+        existing = read_file(output_file)
+
+        # Same row and untouched file as last time: skip serializing it.
+        if existing is not None and recorded.get(file_name) == [digest, hash_bytes(existing)]:
+            results.append((model_name, "unchanged", file_name, recorded[file_name]))
+            continue
+
+        project_data = convert_row(row, layout, column_map)
+        status, data = write_yaml_file(serialize_project(project_data), output_file, existing)
+        results.append((model_name, status, file_name, [digest, hash_bytes(data)]))
+    return results
+
+
+def load_import_cache(path, output_path):
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != IMPORT_CACHE_VERSION:
+        return {}
+    return cache.get("outputs", {}).get(os.path.abspath(output_path), {})
+
+
+def save_import_cache(path, output_path, files):
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        cache = {}
+    if not isinstance(cache, dict) or cache.get("version") != IMPORT_CACHE_VERSION:
+        cache = {"version": IMPORT_CACHE_VERSION, "outputs": {}}
+
+    cache["outputs"][os.path.abspath(output_path)] = files
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(cache, file, separators=(",", ":"), sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def read_batches(csv_path, batch_size=BATCH_SIZE):
+    # Rows are streamed so memory stays bounded by the batches in flight, not the size of the export.
+    seen = set()
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as csv_file:  # utf-8-sig handles BOM
+        batch = []
+        for line_number, row in enumerate(csv.DictReader(csv_file), start=2):
+            model_name = normalize_name(row.get(PROJECT_COLUMNS["project.name"][0]))
+            if not model_name:
+                print(f"Skipping line {line_number}: no model name")
+                continue
+            if model_file_name(model_name) in seen:
+                print(f"Skipping line {line_number}: duplicate model '{model_name}'")
+                continue
+            seen.add(model_file_name(model_name))
+
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def csv_to_yaml(
+    csv_path,
+    yaml_template,
+    output_path=OUTPUT_YAML_PATH,
+    jobs=1,
+    batch_size=BATCH_SIZE,
+    verbose=False,
+    cache_path=IMPORT_CACHE_PATH,
+):
+    column_map = build_column_map()
+    layout = build_layout(yaml_template, column_map)
+    summary = {"created": 0, "updated": 0, "unchanged": 0}
+    recorded = load_import_cache(cache_path, output_path) if cache_path else {}
+    imported = {}
+    os.makedirs(output_path, exist_ok=True)
+
+    def record(results):
+        for model_name, status, file_name, digests in results:
+            summary[status] += 1
+            imported[file_name] = digests
+            if verbose or status != "unchanged":
+                print(f"{status.capitalize()}: {model_name}")
+
+    def batch_args(batch):
+        names = (model_file_name(normalize_name(row.get(PROJECT_COLUMNS["project.name"][0]))) for row in batch)
+        return batch, layout, column_map, output_path, {name: recorded[name] for name in names if name in recorded}
+
+    batches = read_batches(csv_path, batch_size)
+    if jobs <= 1:
+        for batch in batches:
+            record(convert_batch(*batch_args(batch)))
+    else:
+        # Only a few batches are in flight at a time, so memory does not grow with the export.
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            pending = set()
+            for batch in batches:
+                pending.add(executor.submit(convert_batch, *batch_args(batch)))
+                if len(pending) >= jobs * 2:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        record(future.result())
+            for future in concurrent.futures.as_completed(pending):
+                record(future.result())
+
+    if cache_path:
+        save_import_cache(cache_path, output_path, imported)
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a Notion CSV export into MusGU+ YAML evaluations.")
+    parser.add_argument("csv_path", nargs="?", default=CSV_FILE_PATH, help="Notion CSV export to convert")
+    parser.add_argument("--template", default=YAML_TEMPLATE_PATH, help="YAML template defining the field layout")
+    parser.add_argument("--output", default=OUTPUT_YAML_PATH, help="directory the YAML files are written to")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes converting batches of rows (0 uses every core)",
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows handed to a worker at a time")
+    parser.add_argument("--verbose", action="store_true", help="also list the files that did not change")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="serialize every row instead of skipping rows unchanged since the last import",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("--jobs must be zero or a positive number")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.batch_size < 1:
+        parser.error("--batch-size must be a positive number")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    yaml_template = load_yaml_template(args.template)
+    summary = csv_to_yaml(
+        args.csv_path,
+        yaml_template,
+        args.output,
+        args.jobs,
+        args.batch_size,
+        args.verbose,
+        None if args.no_cache else IMPORT_CACHE_PATH,
+    )
+    print(
+        f"YAML files: {summary['created']} created, {summary['updated']} updated, {summary['unchanged']} unchanged."
+    )
+
+
+if __name__ == "__main__":
+    main()
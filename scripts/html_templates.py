@@ -0,0 +1,114 @@
+# MusGU+ HTML templates
+# Compiles an HTML template once into static chunks and named slots, so rendering a page only joins strings.
+
+import html
+import os
+from html.parser import HTMLParser
+
+
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr",
+}
+
+
+class SlotLocator(HTMLParser):
+    def __init__(self, source, slot_ids):
+        super().__init__(convert_charrefs=True)
+        self.source = source
+        self.slot_ids = set(slot_ids)
+        self.line_offsets = [0]
+        for line in source.split("\n"):
+            self.line_offsets.append(self.line_offsets[-1] + len(line) + 1)
+        self.stack = []
+        self.slots = {}
+
+    def source_offset(self):
+        line, column = self.getpos()
+        return self.line_offsets[line - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        start = self.source_offset()
+        content_start = start + len(self.get_starttag_text())
+        if tag in VOID_ELEMENTS:
+            return
+        slot_id = dict(attrs).get("id")
+        self.stack.append((tag, slot_id if slot_id in self.slot_ids else None, start, content_start))
+
+    def handle_endtag(self, tag):
+        end = self.source_offset()
+        if not any(open_tag == tag for open_tag, _, _, _ in self.stack):
+            return
+
+        while self.stack:
+            open_tag, slot_id, start, content_start = self.stack.pop()
+            if slot_id and open_tag != tag:
+                raise ValueError(f"Template slot '{slot_id}' is not explicitly closed")
+            if slot_id:
+                self.slots[slot_id] = (start, content_start, end, self.source.index(">", end) + 1)
+            if open_tag == tag:
+                break
+
+
+class CompiledTemplate:
+    def __init__(self, source, slot_ids):
+        locator = SlotLocator(source, slot_ids)
+        locator.feed(source)
+        locator.close()
+
+        self.chunks = []
+        self.slot_order = []
+        self.wrappers = {}
+        self.defaults = {}
+
+        cursor = 0
+        for slot_id, (start, content_start, content_end, end) in sorted(locator.slots.items(), key=lambda item: item[1]):
+            if start < cursor:
+                raise ValueError(f"Template slot '{slot_id}' is nested inside another slot")
+            self.chunks.append(source[cursor:start])
+            self.slot_order.append(slot_id)
+            self.wrappers[slot_id] = (source[start:content_start], source[content_end:end])
+            self.defaults[slot_id] = source[content_start:content_end]
+            cursor = end
+        self.chunks.append(source[cursor:])
+
+    def __contains__(self, slot_id):
+        return slot_id in self.wrappers
+
+    def iter_render(self, values):
+        # Slot contents may also be iterables of strings, which are consumed lazily in page order.
+        for chunk, slot_id in zip(self.chunks, self.slot_order):
+            yield chunk
+            content = values.get(slot_id, self.defaults[slot_id])
+            if content is None:
+                continue
+            opening, closing = self.wrappers[slot_id]
+            yield opening
+            if isinstance(content, str):
+                yield content
+            else:
+                yield from content
+            yield closing
+        yield self.chunks[-1]
+
+    def render(self, values):
+        return "".join(self.iter_render(values))
+
+
+_TEMPLATE_CACHE = {}
+
+
+def load_template(template_path, slot_ids):
+    stat = os.stat(template_path)
+    key = (template_path, tuple(slot_ids))
+    cached = _TEMPLATE_CACHE.get(key)
+    if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1]
+
+    with open(template_path, "r", encoding="utf-8") as file:
+        template = CompiledTemplate(file.read(), slot_ids)
+    _TEMPLATE_CACHE[key] = ((stat.st_mtime_ns, stat.st_size), template)
+    return template
+
+
+def text(value):
+    return html.escape(str(value), quote=False)
@@ -0,0 +1,399 @@
+# MusGU+ link checker
+# Checks the website, repository and article links of every evaluation concurrently, revalidating only stale entries.
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import datetime
+import glob
+import hashlib
+import http.client
+import json
+import os
+import ssl
+import sys
+import threading
+import time
+import urllib.parse
+
+import consolidate_csv as build
+from record_cache import RecordCache
+
+
+LINK_CACHE_PATH = "./.build-cache/links.json"
+LINK_CACHE_VERSION = 1
+LINK_REPORT_PATH = "./.build-cache/link-report.json"
+
+USER_AGENT = "MusGU-plus-link-checker/1.0 (+https://github.com/lauraibnz/MusGU-plus)"
+
+# Working links are revalidated after this long; failures are checked again on every run.
+MAX_AGE_HOURS = 24 * 7
+CONCURRENCY = 16
+PER_HOST = 2
+TIMEOUT = 10.0
+RETRIES = 2
+BACKOFF = 0.5
+MAX_REDIRECTS = 5
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Some servers refuse HEAD outright; those are asked again with GET.
+HEAD_REFUSED_STATUSES = {400, 403, 405, 501}
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+# A GET body is drained up to this size so the connection can be reused; larger bodies close it instead.
+DRAIN_LIMIT = 1 << 20
+
+
+class LinkResponse:
+    __slots__ = ("status", "headers")
+
+    def __init__(self, status, headers):
+        self.status = status
+        self.headers = headers
+
+
+class ConnectionPool:
+    # Keeps idle keep-alive connections per origin; requests run on worker threads, so access is locked.
+    def __init__(self, timeout=TIMEOUT):
+        self.timeout = timeout
+        self.context = ssl.create_default_context()
+        self.idle = collections.defaultdict(list)
+        self.lock = threading.Lock()
+        self.opened = 0
+
+    def acquire(self, origin):
+        with self.lock:
+            if self.idle[origin]:
+                return self.idle[origin].pop(), True
+            self.opened += 1
+
+        scheme, netloc = origin
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout, context=self.context), False
+        return http.client.HTTPConnection(netloc, timeout=self.timeout), False
+
+    def release(self, origin, connection, reusable):
+        if not reusable:
+            connection.close()
+            return
+        with self.lock:
+            self.idle[origin].append(connection)
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+
+def request(pool, url, method, headers):
+    parts = urllib.parse.urlsplit(url)
+    origin = (parts.scheme, parts.netloc)
+    target = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+
+    while True:
+        connection, reused = pool.acquire(origin)
+        try:
+            connection.request(method, target, headers=headers)
+            response = connection.getresponse()
+            if method == "GET":
+                response.read(DRAIN_LIMIT)
+            else:
+                response.read()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            connection.close()
+            # The server dropped an idle keep-alive connection; try once more on a fresh one.
+            if reused:
+                continue
+            raise
+        except Exception:
+            connection.close()
+            raise
+
+        pool.release(origin, connection, response.isclosed() and not response.will_close)
+        return LinkResponse(response.status, {key.lower(): value for key, value in response.getheaders()})
+
+
+def retry_delay(attempt, response=None, backoff=BACKOFF):
+    retry_after = response.headers.get("retry-after", "") if response is not None else ""
+    if retry_after.isdigit():
+        return min(float(retry_after), 30.0)
+    return backoff * 2**attempt
+
+
+class LinkChecker:
+    def __init__(self, cache, concurrency=CONCURRENCY, per_host=PER_HOST, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF):
+        self.cache = cache
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.pool = ConnectionPool(timeout)
+        self.host_limits = {}
+        self.limit = None
+        self.executor = None
+
+    async def fetch(self, url, method, headers):
+        host = urllib.parse.urlsplit(url).hostname or ""
+        host_limit = self.host_limits.setdefault(host, asyncio.Semaphore(self.per_host))
+        # The host slot comes first, so requests queued behind one slow host do not hold global slots.
+        async with host_limit, self.limit:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, request, self.pool, url, method, headers)
+
+    async def check(self, url, entry=None):
+        headers = {"User-Agent": USER_AGENT, "Accept": "*/*"}
+        # A previously working link is revalidated; 304 keeps its last status.
+        if entry and entry.get("ok"):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        target = url
+        method = "HEAD"
+        redirects = 0
+        attempt = 0
+        while True:
+            try:
+                response = await self.fetch(target, method, headers)
+            except (OSError, ValueError, http.client.HTTPException) as error:
+                if attempt < self.retries:
+                    await asyncio.sleep(retry_delay(attempt, backoff=self.backoff))
+                    attempt += 1
+                    continue
+                return {"status": None, "ok": False, "error": f"{type(error).__name__}: {error}", "final_url": target}
+
+            status = response.status
+            if status == 304 and entry:
+                return dict(entry)
+            if method == "HEAD" and status in HEAD_REFUSED_STATUSES:
+                method = "GET"
+                continue
+            if status in REDIRECT_STATUSES and response.headers.get("location"):
+                redirects += 1
+                if redirects > MAX_REDIRECTS:
+                    return {"status": status, "ok": False, "error": "too many redirects", "final_url": target}
+                target = urllib.parse.urljoin(target, response.headers["location"])
+                headers.pop("If-None-Match", None)
+                headers.pop("If-Modified-Since", None)
+                continue
+            if status in RETRY_STATUSES and attempt < self.retries:
+                await asyncio.sleep(retry_delay(attempt, response, self.backoff))
+                attempt += 1
+                continue
+
+            return {
+                "status": status,
+                "ok": 200 <= status < 300,
+                "error": None if 200 <= status < 300 else f"HTTP {status}",
+                "final_url": target,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+            }
+
+    async def check_all(self, urls, max_age):
+        self.limit = asyncio.Semaphore(self.concurrency)
+        # http.client blocks, so every request in flight gets its own thread.
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+        now = time.time()
+        stale = [url for url in urls if not self.cache.is_fresh(url, now, max_age)]
+
+        async def check_one(url):
+            result = await self.check(url, self.cache.entries.get(url))
+            result["checked"] = time.time()
+            self.cache.put(url, result)
+
+        try:
+            await asyncio.gather(*(check_one(url) for url in stale))
+        finally:
+            self.executor.shutdown()
+            self.pool.close()
+        return stale
+
+    def run(self, urls, max_age=MAX_AGE_HOURS * 3600):
+        return asyncio.run(self.check_all(urls, max_age))
+
+
+class LinkCache:
+    def __init__(self, path=LINK_CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            self.dirty = True
+            return
+        if isinstance(data, dict) and data.get("version") == LINK_CACHE_VERSION and isinstance(data.get("links"), dict):
+            self.entries = data["links"]
+        else:
+            self.dirty = True
+
+    def is_fresh(self, url, now, max_age):
+        entry = self.entries.get(url)
+        return bool(entry) and entry.get("ok") and now - entry.get("checked", 0) < max_age
+
+    def put(self, url, entry):
+        self.entries[url] = entry
+        self.dirty = True
+
+    def prune(self, urls):
+        stale = set(self.entries) - set(urls)
+        for url in stale:
+            del self.entries[url]
+        if stale:
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": LINK_CACHE_VERSION, "links": self.entries}, file, indent=1, sort_keys=True)
+            file.write("\n")
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+
+def collect_links(records):
+    # Maps every http(s) URL to the (slug, field) pairs that use it, so shared links are checked once.
+    links = {}
+    for record in records:
+        for field, url in build.get_project_links(record):
+            if urllib.parse.urlsplit(url).scheme in ("http", "https"):
+                links.setdefault(url, []).append((str(record["project.slug"]), field))
+    return links
+
+
+def build_report(links, cache, checked, connections=0):
+    results = []
+    for url, uses in sorted(links.items()):
+        entry = cache.entries.get(url, {})
+        results.append({
+            "url": url,
+            "projects": [{"slug": slug, "field": field} for slug, field in uses],
+            "ok": bool(entry.get("ok")),
+            "status": entry.get("status"),
+            "error": entry.get("error"),
+            "final_url": entry.get("final_url"),
+            "checked": entry.get("checked"),
+        })
+    broken = [result for result in results if not result["ok"]]
+    return {
+        "generated": datetime.datetime.now(build.UTC).isoformat(timespec="seconds"),
+        "summary": {"links": len(results), "checked": len(checked), "broken": len(broken), "connections": connections},
+        "links": results,
+    }
+
+
+def write_report(report, path=LINK_REPORT_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=1)
+        file.write("\n")
+
+
+def load_link_status(path=LINK_REPORT_PATH):
+    # url -> reason for every link that failed its last check; an absent report means no badges.
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            report = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return {
+        result["url"]: f"Link check failed: {result.get('error') or 'unreachable'}"
+        for result in report.get("links", [])
+        if not result.get("ok")
+    }
+
+
+def link_status_digest(link_status):
+    return hashlib.sha256(json.dumps(link_status, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def check_project_links(
+    files,
+    jobs=1,
+    record_cache=None,
+    cache_path=LINK_CACHE_PATH,
+    report_path=LINK_REPORT_PATH,
+    max_age=MAX_AGE_HOURS * 3600,
+    **options,
+):
+    links = collect_links(build.load_project_records(files, jobs, record_cache))
+    cache = LinkCache(cache_path)
+    checker = LinkChecker(cache, **options)
+    checked = checker.run(list(links), max_age)
+    cache.prune(links)
+    cache.save()
+    report = build_report(links, cache, checked, checker.pool.opened)
+    write_report(report, report_path)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check the links of every MusGU+ evaluation.")
+    parser.add_argument("--report", default=LINK_REPORT_PATH, help="where to write the JSON report")
+    parser.add_argument("--cache", default=LINK_CACHE_PATH, help="cache of the last status and ETag of each link")
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=MAX_AGE_HOURS,
+        help="hours before a working link is revalidated (0 checks every link)",
+    )
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="requests in flight overall")
+    parser.add_argument("--per-host", type=int, default=PER_HOST, help="requests in flight per host")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="seconds before a request is abandoned")
+    parser.add_argument("--retries", type=int, default=RETRIES, help="retries after timeouts, 429 and 5xx responses")
+    parser.add_argument("--fail-on-broken", action="store_true", help="exit with an error when a link is broken")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse every YAML file instead of reusing the records cached in .build-cache/",
+    )
+    args = parser.parse_args(argv)
+    if args.concurrency < 1 or args.per_host < 1:
+        parser.error("--concurrency and --per-host must be positive numbers")
+    if args.retries < 0:
+        parser.error("--retries must be zero or a positive number")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    files = sorted(file_name for file_name in glob.glob("./projects/*.yaml") if "_template" not in file_name)
+    report = check_project_links(
+        files,
+        record_cache=None if args.no_cache else RecordCache(),
+        cache_path=args.cache,
+        report_path=args.report,
+        max_age=args.max_age * 3600,
+        concurrency=args.concurrency,
+        per_host=args.per_host,
+        timeout=args.timeout,
+        retries=args.retries,
+    )
+
+    for result in report["links"]:
+        if not result["ok"]:
+            slugs = ", ".join(use["slug"] for use in result["projects"])
+            print(f"✗ {result['url']} ({slugs}): {result['error']}")
+    summary = report["summary"]
+    print(f"Links: {summary['links']} total, {summary['checked']} checked, {summary['broken']} broken.")
+    print(f"Report written to {args.report}")
+    return 1 if args.fail_on_broken and summary["broken"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+# MusGU+ similar models
+# Finds the most similar evaluations of every model in blocks of rows, so memory follows the block size and not N².
+
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+import consolidate_csv as build
+from build_manifest import write_if_changed
+
+
+SIMILARITY_CACHE_PATH = "./.build-cache/similarity.pickle"
+SIMILARITY_CACHE_VERSION = 1
+
+SIMILAR_MODELS = 5
+
+# Share of the criterion values and of the tag and application overlap in the similarity.
+VALUE_WEIGHT = 0.7
+TAG_WEIGHT = 0.3
+
+# Cells of one rows × columns similarity block; several temporaries of this size exist at once.
+BLOCK_CELLS = 1 << 20
+
+# Scores are rounded so that blocks of different shapes rank ties the same way.
+SCORE_DECIMALS = 4
+
+VALUE_COLUMNS = tuple(f"{dimension_key}.{criterion}.value" for dimension_key, criteria in build.DIMENSIONS for criterion in criteria)
+
+
+def row_features(project_row):
+    values = tuple(float(build.VALUE_MAP.get(project_row.get(column, ""), 0)) for column in VALUE_COLUMNS)
+    tags = set(build.get_row_tags(project_row))
+    tags.update(f"application:{application}" for application in build.split_tags(project_row.get("project.applications", "")))
+    return values, tuple(sorted(tags))
+
+
+def feature_signature(values, tags):
+    return hashlib.sha256(json.dumps([values, tags], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class SimilarityMatrix:
+    def __init__(self, values, tag_sets):
+        self.values = np.asarray(values, dtype=float).reshape(len(tag_sets), len(VALUE_COLUMNS))
+        self.norms = (self.values * self.values).sum(axis=1)
+        self.sizes = np.array([len(tags) for tags in tag_sets], dtype=float)
+
+        # A tag only one model carries never adds to an intersection, so it is counted in sizes and left out here.
+        counts = {}
+        for tags in tag_sets:
+            for tag in tags:
+                counts[tag] = counts.get(tag, 0) + 1
+        shared = {tag: position for position, tag in enumerate(sorted(tag for tag, count in counts.items() if count > 1))}
+        self.incidence = np.zeros((len(tag_sets), len(shared)), dtype=np.float32)
+        for row, tags in enumerate(tag_sets):
+            positions = [shared[tag] for tag in tags if tag in shared]
+            self.incidence[row, positions] = 1
+
+    def __len__(self):
+        return len(self.values)
+
+    def scores(self, rows, columns):
+        # Criterion values: one minus the normalized Euclidean distance, from dot products.
+        distance = self.norms[rows][:, None] + self.norms[columns][None, :] - 2 * (self.values[rows] @ self.values[columns].T)
+        value_similarity = 1 - np.sqrt(np.clip(distance, 0, None) / len(VALUE_COLUMNS))
+
+        # Tags and applications: Jaccard overlap, from the intersection counts.
+        intersection = (self.incidence[rows] @ self.incidence[columns].T).astype(float)
+        union = self.sizes[rows][:, None] + self.sizes[columns][None, :] - intersection
+        tag_similarity = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+        return np.round(VALUE_WEIGHT * value_similarity + TAG_WEIGHT * tag_similarity, SCORE_DECIMALS)
+
+    def top_k(self, rows, columns, k, slugs):
+        # Best k columns per row as (row, score); ties go to the lower slug so every run agrees.
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        results = {}
+        if not len(rows):
+            return results
+        if not len(columns) or k < 1:
+            return {int(row): [] for row in rows}
+
+        # Rounded scores and the slug order fold into one integer key, so a single argpartition ranks each row.
+        # Only the columns' slugs are ranked, so slugs may hold None for rows that are not columns.
+        slug_rank = np.empty(len(columns), dtype=np.int64)
+        slug_rank[np.argsort(np.array([slugs[column] for column in columns], dtype=object))] = np.arange(len(columns))
+        tie_break = len(columns) - 1 - slug_rank
+        scale = 10 ** SCORE_DECIMALS
+
+        block_size = max(1, BLOCK_CELLS // len(columns))
+        for start in range(0, len(rows), block_size):
+            block_rows = rows[start:start + block_size]
+            scores = self.scores(block_rows, columns)
+            keys = np.rint(scores * scale).astype(np.int64) * len(columns) + tie_break[None, :]
+            keys[block_rows[:, None] == columns[None, :]] = -1
+
+            count = min(k, len(columns))
+            if len(columns) > count:
+                kept = np.argpartition(-keys, count - 1, axis=1)[:, :count]
+            else:
+                kept = np.broadcast_to(np.arange(len(columns)), (len(block_rows), len(columns)))
+            kept_keys = np.take_along_axis(keys, kept, axis=1)
+            kept = np.take_along_axis(kept, np.argsort(-kept_keys, axis=1, kind="stable"), axis=1)
+
+            for position, row in enumerate(block_rows):
+                results[int(row)] = [
+                    (int(columns[column]), float(scores[position, column]))
+                    for column in kept[position]
+                    if keys[position, column] >= 0
+                ]
+        return results
+
+
+class SimilarityIndex(SimilarityMatrix):
+    # Watch mode keeps the matrix and every list between edits: an edited model is ranked against the rest,
+    # its score is merged into the other lists, and only the lists that held it before are ranked again.
+    def __init__(self, slugs, features, k=SIMILAR_MODELS):
+        self.k = k
+        # Rows are slots; a removed model leaves a free slot for the next one.
+        self.slugs = []
+        self.slots = {}
+        self.free = []
+        self.tag_columns = {}
+        self.values = np.zeros((0, len(VALUE_COLUMNS)))
+        self.norms = np.zeros(0)
+        self.sizes = np.zeros(0)
+        self.incidence = np.zeros((0, 0), dtype=np.float32)
+        self.active = np.zeros(0, dtype=bool)
+        self.kth_scores = np.zeros(0)
+        # slug -> [(neighbour slug, score), ...], and slug -> the slugs whose lists hold it
+        self.neighbours = {}
+        self.listed_by = {}
+
+        for slug, (values, tags) in zip(slugs, features):
+            self.place(slug, values, tags)
+        self.rank(np.flatnonzero(self.active))
+
+    def rank(self, rows):
+        for row, ranked in self.top_k(rows, np.flatnonzero(self.active), self.k, self.slugs).items():
+            self.set_list(self.slugs[row], [(self.slugs[column], score) for column, score in ranked])
+
+    def place(self, slug, values, tags):
+        slot = self.slots.get(slug)
+        if slot is None:
+            slot = self.free.pop() if self.free else len(self.slugs)
+            if slot == len(self.slugs):
+                self.slugs.append(None)
+            self.slots[slug] = slot
+            self.slugs[slot] = slug
+        for tag in tags:
+            self.tag_columns.setdefault(tag, len(self.tag_columns))
+
+        # Capacity doubles, so placing models one at a time stays amortized constant.
+        rows = max(len(self.values), 1)
+        while rows <= slot:
+            rows *= 2
+        columns = max(self.incidence.shape[1], 1)
+        while columns < len(self.tag_columns):
+            columns *= 2
+        if rows > len(self.values) or columns > self.incidence.shape[1]:
+            incidence = np.zeros((rows, columns), dtype=np.float32)
+            incidence[:len(self.incidence), :self.incidence.shape[1]] = self.incidence
+            self.incidence = incidence
+            self.values = np.concatenate([self.values, np.zeros((rows - len(self.values), len(VALUE_COLUMNS)))])
+            for name in ("norms", "sizes", "kth_scores"):
+                setattr(self, name, np.concatenate([getattr(self, name), np.zeros(rows - len(getattr(self, name)))]))
+            self.active = np.concatenate([self.active, np.zeros(rows - len(self.active), dtype=bool)])
+
+        self.values[slot] = values
+        self.norms[slot] = self.values[slot] @ self.values[slot]
+        self.sizes[slot] = len(tags)
+        self.incidence[slot] = 0
+        self.incidence[slot, [self.tag_columns[tag] for tag in tags]] = 1
+        self.active[slot] = True
+        return slot
+
+    def set_list(self, slug, ranked):
+        for neighbour, _ in self.neighbours.get(slug, ()):
+            self.listed_by[neighbour].discard(slug)
+        for neighbour, _ in ranked:
+            self.listed_by.setdefault(neighbour, set()).add(slug)
+        self.neighbours[slug] = ranked
+        self.kth_scores[self.slots[slug]] = ranked[-1][1] if len(ranked) >= self.k else -np.inf
+
+    def update(self, slug, features=None):
+        # Places (or, without features, removes) one model; returns the slugs whose lists changed.
+        stale = set(self.listed_by.get(slug, ()))
+        before = {other: self.neighbours[other] for other in stale}
+        if features is None:
+            if slug not in self.slots:
+                return set()
+            self.set_list(slug, [])
+            del self.neighbours[slug]
+            slot = self.slots.pop(slug)
+            self.active[slot] = False
+            self.slugs[slot] = None
+            self.free.append(slot)
+        else:
+            before[slug] = self.neighbours.get(slug)
+            slot = self.place(slug, *features)
+            stale.add(slug)
+
+        recompute = [self.slots[other] for other in sorted(stale)]
+        self.rank(recompute)
+        if features is None:
+            del self.listed_by[slug]
+
+        if features is not None:
+            columns = np.flatnonzero(self.active)
+            # Every other list only has to consider the edited model; the rest of it still stands.
+            scores = self.scores(columns, np.array([slot]))[:, 0]
+            candidates = columns[(scores >= self.kth_scores[columns]) & ~np.isin(columns, recompute)]
+            for row in candidates.tolist():
+                other = self.slugs[row]
+                score = float(scores[np.searchsorted(columns, row)])
+                ranked = sorted([*self.neighbours[other], (slug, score)], key=lambda item: (-item[1], item[0]))[:self.k]
+                if ranked != self.neighbours[other]:
+                    before.setdefault(other, self.neighbours[other])
+                    self.set_list(other, ranked)
+        return {other for other, ranked in before.items() if self.neighbours.get(other) != ranked}
+
+
+class SimilarityCache:
+    def __init__(self, path=SIMILARITY_CACHE_PATH):
+        self.path = path
+        # slug -> feature signature, and slug -> [(neighbour slug, score), ...]
+        self.signatures = {}
+        self.neighbours = {}
+        self.stored_key = None
+        self.load()
+
+    def key(self, k):
+        return SIMILARITY_CACHE_VERSION, k, VALUE_WEIGHT, TAG_WEIGHT, VALUE_COLUMNS
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as file:
+                self.stored_key, self.signatures, self.neighbours = pickle.load(file)
+        except Exception:
+            self.stored_key, self.signatures, self.neighbours = None, {}, {}
+
+    def matches(self, k):
+        return self.stored_key == self.key(k)
+
+    def save(self, k):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump((self.key(k), self.signatures, self.neighbours), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+        self.stored_key = self.key(k)
+
+
+def find_similar_models(slugs, values, tag_sets, k=SIMILAR_MODELS, cache=None):
+    signatures = [feature_signature(list(row_values), list(tags)) for row_values, tags in zip(values, tag_sets)]
+    previous_signatures = cache.signatures if cache is not None and cache.matches(k) else {}
+    previous_neighbours = cache.neighbours if cache is not None and cache.matches(k) else {}
+
+    current = set(slugs)
+    changed = {
+        slug for slug, signature in zip(slugs, signatures) if previous_signatures.get(slug) != signature
+    } | (set(previous_signatures) - current)
+
+    # Rows that changed start over, and so do rows that listed a changed or removed model;
+    # every other row keeps its list and only looks at the changed rows.
+    recompute = []
+    merge = []
+    for row, slug in enumerate(slugs):
+        if slug in changed or slug not in previous_neighbours:
+            recompute.append(row)
+        elif any(neighbour in changed for neighbour, _ in previous_neighbours[slug]):
+            recompute.append(row)
+        else:
+            merge.append(row)
+
+    matrix = SimilarityMatrix(values, tag_sets)
+    neighbours = {}
+    for row, ranked in matrix.top_k(recompute, np.arange(len(slugs)), k, slugs).items():
+        neighbours[slugs[row]] = [(slugs[column], score) for column, score in ranked]
+
+    changed_rows = [row for row, slug in enumerate(slugs) if slug in changed]
+    candidates = matrix.top_k(merge, changed_rows, k, slugs) if changed_rows else {}
+    for row in merge:
+        slug = slugs[row]
+        ranked = list(previous_neighbours[slug])
+        ranked.extend((slugs[column], score) for column, score in candidates.get(row, []))
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        neighbours[slug] = ranked[:k]
+
+    stats = {"recomputed": len(recompute), "merged": len(merge) if changed_rows else 0}
+    if cache is not None and (changed or recompute or not cache.matches(k)):
+        cache.signatures = dict(zip(slugs, signatures))
+        cache.neighbours = neighbours
+        cache.save(k)
+    return neighbours, stats
+
+
+def render_similar_models(neighbours, names):
+    models = [{"slug": slug, "name": names[slug], "score": score} for slug, score in neighbours]
+    return json.dumps({"models": models}, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def update_similar_models(
+    slugs,
+    names,
+    values,
+    tag_sets,
+    write_stats=None,
+    k=SIMILAR_MODELS,
+    cache_path=SIMILARITY_CACHE_PATH,
+    output_dir="./docs/models",
+):
+    cache = SimilarityCache(cache_path) if cache_path else None
+    neighbours, stats = find_similar_models(slugs, values, tag_sets, k, cache)
+    names = dict(zip(slugs, names))
+    for slug in slugs:
+        path = os.path.join(output_dir, slug, build.SIMILAR_DATA_NAME)
+        write_if_changed(path, render_similar_models(neighbours[slug], names), write_stats)
+    return stats
+
+
+def update_table_similar_models(table, write_stats=None, **options):
+    slugs = [str(project_row["project.slug"]) for project_row in table.rows.values()]
+    features = [row_features(project_row) for project_row in table.rows.values()]
+    return update_similar_models(
+        slugs,
+        [str(name) for name in table.rows],
+        [row_values for row_values, _ in features],
+        [tags for _, tags in features],
+        write_stats,
+        **options,
+    )
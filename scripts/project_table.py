@@ -0,0 +1,66 @@
+# MusGU+ project table
+# A light, ordered store of evaluation rows keyed by project name; pandas is only imported to export a DataFrame.
+
+import csv
+import io
+
+
+class ProjectTable:
+    __slots__ = ("columns", "rows")
+
+    def __init__(self, rows=None, columns=None):
+        # rows maps a project name to its flattened record; columns keeps the export order.
+        self.rows = rows if rows is not None else {}
+        self.columns = columns if columns is not None else []
+
+    @classmethod
+    def from_records(cls, records):
+        columns = list(dict.fromkeys(column for record in records for column in record))
+        if "project.name" not in columns:
+            columns.append("project.name")
+        columns.remove("project.name")
+
+        rows = {}
+        for record in records:
+            name = record.get("project.name")
+            if name is None or name == "":
+                continue
+            # Every row carries every column so lookups never need a default.
+            rows[name] = {column: "" if record.get(column) is None else record[column] for column in columns}
+        return cls(rows, columns)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def index(self):
+        return list(self.rows)
+
+    def column(self, column, default=""):
+        return [row.get(column, default) for row in self.rows.values()]
+
+    def set_column(self, column, values):
+        if column not in self.columns:
+            self.columns.append(column)
+        for row, value in zip(self.rows.values(), values):
+            row[column] = value
+
+    def sorted_by(self, column, descending=False):
+        # sorted() stays stable with reverse=True, so ties keep their current order.
+        items = sorted(self.rows.items(), key=lambda item: item[1][column], reverse=descending)
+        return ProjectTable(dict(items), list(self.columns))
+
+    def to_csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(self.columns)
+        for row in self.rows.values():
+            writer.writerow([row[column] for column in self.columns])
+        return buffer.getvalue()
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        df = pd.DataFrame.from_records(list(self.rows.values()), columns=self.columns, index=list(self.rows))
+        df.index.name = "project.name"
+        return df
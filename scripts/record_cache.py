@@ -0,0 +1,81 @@
+# MusGU+ record cache
+# Keeps the normalized evaluation records on disk so unchanged YAML files are not parsed again.
+
+import hashlib
+import os
+import pickle
+
+
+CACHE_PATH = "./.build-cache/projects.pickle"
+CACHE_VERSION = 1
+
+
+class RecordCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "rb") as file:
+                version, entries = pickle.load(file)
+        except Exception:
+            # A truncated or foreign cache file is not worth failing the build for.
+            self.entries = {}
+            self.dirty = True
+            return
+
+        if version != CACHE_VERSION or not isinstance(entries, dict):
+            self.entries = {}
+            self.dirty = True
+            return
+        self.entries = entries
+
+    def get(self, file_name):
+        entry = self.entries.get(file_name)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        size, mtime_ns, digest, record = entry
+        stat = os.stat(file_name)
+        if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+            # Checkouts and copies touch mtimes, so fall back to the content hash before re-parsing.
+            with open(file_name, "rb") as file:
+                if hashlib.sha256(file.read()).hexdigest() != digest:
+                    self.misses += 1
+                    return None
+            self.entries[file_name] = (stat.st_size, stat.st_mtime_ns, digest, record)
+            self.dirty = True
+
+        self.hits += 1
+        return record
+
+    def put(self, file_name, size, mtime_ns, digest, record):
+        self.entries[file_name] = (size, mtime_ns, digest, record)
+        self.dirty = True
+
+    def prune(self, files):
+        stale = set(self.entries) - set(files)
+        for file_name in stale:
+            del self.entries[file_name]
+        if stale:
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump((CACHE_VERSION, self.entries), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+        self.dirty = False
@@ -0,0 +1,259 @@
+# MusGU+ score history
+# Replays the git history of projects/ into per-model score series, parsing each version of a file (blob) only once.
+
+import argparse
+import glob
+import json
+import os
+import pickle
+import subprocess
+
+import numpy as np
+import yaml
+
+import consolidate_csv as build
+from build_manifest import write_if_changed
+from source_dates import run_git
+
+
+HISTORY_CACHE_PATH = "./.build-cache/score-history.pickle"
+HISTORY_CACHE_VERSION = 1
+HISTORY_DIR = "./docs/history"
+
+SCORE_COLUMNS = tuple(f"{dimension_key}_score" for dimension_key, _ in build.DIMENSIONS) + ("overall_score",)
+VALUE_COLUMNS = tuple(f"{dimension_key}.{criterion}.value" for dimension_key, criteria in build.DIMENSIONS for criterion in criteria)
+
+NULL_BLOB = "0" * 40
+CAT_FILE_BATCH = 500
+
+
+class HistoryCache:
+    def __init__(self, path=HISTORY_CACHE_PATH):
+        self.path = path
+        # blob -> (project name, criterion levels) or None when that version does not parse.
+        self.blobs = {}
+        # (commit, commit time, slug, blob or None when the file was deleted), oldest first.
+        self.events = []
+        self.head = None
+        self.dirty = False
+        self.load()
+
+    def key(self):
+        # Parsed levels follow the criteria of DIMENSIONS, so a new criterion starts a new cache.
+        return HISTORY_CACHE_VERSION, VALUE_COLUMNS
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as file:
+                key, blobs, events, head = pickle.load(file)
+        except Exception:
+            self.dirty = True
+            return
+        if key != self.key():
+            self.dirty = True
+            return
+        self.blobs, self.events, self.head = blobs, events, head
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump((self.key(), self.blobs, self.events, self.head), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+
+def git_head():
+    output = run_git("rev-parse", "--verify", "HEAD")
+    return output.strip() if output else None
+
+
+def is_ancestor(commit, head):
+    return run_git("merge-base", "--is-ancestor", commit, head) is not None
+
+
+def git_changes(directory, since=None, head="HEAD"):
+    # One first-parent walk with raw diffs gives the blob of every YAML file each commit touched.
+    revisions = f"{since}..{head}" if since else head
+    output = run_git(
+        "log", "--first-parent", "-m", "--reverse", "--raw", "--no-abbrev", "--no-renames", "--relative",
+        "--format=@%H %ct", revisions, "--", directory,
+    )
+    if output is None:
+        return []
+
+    events = []
+    commit = None
+    commit_time = None
+    for line in output.splitlines():
+        if line.startswith("@"):
+            commit, commit_time = line[1:].split()
+            commit_time = int(commit_time)
+        elif line.startswith(":") and commit is not None:
+            meta, path = line.split("\t", 1)
+            new_blob = meta.split()[3]
+            if os.path.dirname(os.path.normpath(path)) != os.path.normpath(directory):
+                continue
+            if not path.endswith(".yaml") or "_template" in path:
+                continue
+            events.append((commit, commit_time, build.project_slug(path), None if new_blob == NULL_BLOB else new_blob))
+    return events
+
+
+def read_blobs(blobs):
+    # `git cat-file --batch` streams many blobs through one process.
+    contents = {}
+    for start in range(0, len(blobs), CAT_FILE_BATCH):
+        batch = blobs[start:start + CAT_FILE_BATCH]
+        try:
+            result = subprocess.run(
+                ["git", "cat-file", "--batch"],
+                input="".join(f"{blob}\n" for blob in batch).encode("ascii"),
+                capture_output=True,
+                check=True,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return contents
+
+        output = result.stdout
+        position = 0
+        while position < len(output):
+            header_end = output.index(b"\n", position)
+            header = output[position:header_end].split()
+            position = header_end + 1
+            if len(header) < 3 or header[1] != b"blob":
+                continue
+            size = int(header[2])
+            contents[header[0].decode("ascii")] = output[position:position + size]
+            position += size + 1
+    return contents
+
+
+def parse_blob(content):
+    try:
+        record = build.parse_project_record(content)
+    except (yaml.YAMLError, AttributeError, UnicodeDecodeError):
+        return None
+    name = record.get("project.name")
+    if not name:
+        return None
+    return str(name), tuple(build.VALUE_MAP.get(record.get(column), 0) for column in VALUE_COLUMNS)
+
+
+def update_history(cache, directory="./projects"):
+    head = git_head()
+    stats = {"commits": 0, "parsed": 0}
+    if head is None or head == cache.head:
+        return stats
+
+    if cache.head is not None and is_ancestor(cache.head, head):
+        events = git_changes(directory, cache.head, head)
+    else:
+        # First run, or history was rewritten: walk it all again; parsed blobs are still valid.
+        cache.events = []
+        events = git_changes(directory, None, head)
+
+    missing = sorted({blob for _, _, _, blob in events if blob is not None and blob not in cache.blobs})
+    contents = read_blobs(missing)
+    for blob in missing:
+        cache.blobs[blob] = parse_blob(contents[blob]) if blob in contents else None
+    stats["parsed"] = len(missing)
+    stats["commits"] = len({commit for commit, _, _, _ in events})
+
+    cache.events.extend(events)
+    cache.head = head
+    cache.dirty = True
+    return stats
+
+
+def score_blobs(cache, weights):
+    # Every distinct version is scored in one matrix, so a new weighting costs one pass over the blobs.
+    blobs = [blob for blob, parsed in cache.blobs.items() if parsed is not None]
+    if not blobs:
+        return {}
+    matrix = np.array([cache.blobs[blob][1] for blob in blobs], dtype=float)
+    scores = build.score_matrix(matrix, weights)
+    columns = np.column_stack([scores[column] for column in SCORE_COLUMNS]).astype(int).tolist()
+    return dict(zip(blobs, columns))
+
+
+def build_series(cache, weights, slugs=None):
+    blob_scores = score_blobs(cache, weights)
+    series = {}
+    for commit, commit_time, slug, blob in cache.events:
+        if slugs is not None and slug not in slugs:
+            continue
+        scores = blob_scores.get(blob)
+        if scores is None:
+            continue
+        points = series.setdefault(slug, [])
+        # Only changes are kept; a commit that leaves the scores alone adds nothing.
+        if points and points[-1][2:] == scores:
+            continue
+        points.append([commit_time, commit[:12], *scores])
+    return series
+
+
+def render_series(slug, points):
+    data = {"slug": slug, "columns": ["time", "commit", *SCORE_COLUMNS], "points": points}
+    return json.dumps(data, separators=(",", ":")) + "\n"
+
+
+def write_series(series, output_dir=HISTORY_DIR, write_stats=None):
+    os.makedirs(output_dir, exist_ok=True)
+    for slug, points in sorted(series.items()):
+        write_if_changed(os.path.join(output_dir, f"{slug}.json"), render_series(slug, points), write_stats)
+
+    for path in glob.glob(os.path.join(output_dir, "*.json")):
+        if build.project_slug(path) not in series:
+            os.remove(path)
+
+
+def update_score_history(
+    slugs,
+    weights,
+    write_stats=None,
+    directory="./projects",
+    output_dir=HISTORY_DIR,
+    cache_path=HISTORY_CACHE_PATH,
+):
+    cache = HistoryCache(cache_path)
+    stats = update_history(cache, directory)
+    cache.save()
+    series = build_series(cache, weights, set(slugs))
+    write_series(series, output_dir, write_stats)
+    stats["series"] = len(series)
+    return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write per-model score history from the git history of projects/.")
+    parser.add_argument(
+        "--weights",
+        default=build.SCORING_WEIGHTS_PATH,
+        help="YAML file with the scoring weights every past version is scored with",
+    )
+    parser.add_argument("--output", default=HISTORY_DIR, help="directory for the per-model JSON series")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    slugs = [
+        build.project_slug(file_name)
+        for file_name in glob.glob("./projects/*.yaml")
+        if "_template" not in file_name
+    ]
+    stats = update_score_history(slugs, build.load_scoring_weights(args.weights), output_dir=args.output)
+    print(
+        f"Score history: {stats['commits']} new commits, {stats['parsed']} file versions parsed, "
+        f"{stats['series']} series written to {args.output}."
+    )
+
+
+if __name__ == "__main__":
+    main()
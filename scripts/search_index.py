@@ -0,0 +1,350 @@
+# MusGU+ search index
+# Tokenizes the evaluation text into an inverted index split into shards by ranges of term prefixes,
+# so the search box only downloads the shards its query needs.
+
+import bisect
+import glob
+import json
+import os
+import pickle
+import re
+import tempfile
+import unicodedata
+import zlib
+from array import array
+
+import consolidate_csv as build
+from build_manifest import hash_bytes, write_if_changed
+
+
+SEARCH_DIR = "search"
+
+# Query terms shorter than this fall back to the in-page search.
+SEARCH_PREFIX_LENGTH = 2
+SEARCH_MIN_TERM_LENGTH = 2
+
+# Consecutive prefixes share a shard until it holds this many postings, so the shard count follows
+# the size of the catalogue rather than the number of distinct prefixes. A prefix is never split.
+SEARCH_SHARD_POSTINGS = 4096
+# Rows per separately encoded run of a term's postings in watch mode.
+LIVE_SEARCH_BLOCK = 1024
+
+# The streaming build spills postings into this many bucket files, a batch of postings at a time.
+SPOOL_BUCKETS = 64
+SPOOL_FLUSH_POSTINGS = 1 << 16
+
+# A term found in the name outranks one found in a criterion note.
+FIELD_WEIGHTS = {
+    "name": 8,
+    "project.affiliation": 4,
+    "project.architecture": 4,
+    "project.notes": 2,
+}
+NOTES_WEIGHT = 1
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by can for from has have if in into is it its no not of on or such that the their "
+    "there these this to was were which will with".split()
+)
+
+# Word characters without the underscore are exactly the letters and numbers, \p{L} and \p{N} in the page's tokenizer.
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def normalize(text):
+    # Accents are dropped so "generacion" finds "generación": after NFKD every nonspacing mark (\p{Mn}) goes,
+    # exactly as the page normalizes queries.
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    return "".join(character for character in decomposed if unicodedata.category(character) != "Mn").lower()
+
+
+def tokenize(text):
+    return [
+        term
+        for term in TOKEN_PATTERN.findall(normalize(text))
+        if len(term) >= SEARCH_MIN_TERM_LENGTH and term not in STOP_WORDS
+    ]
+
+
+def document_terms(project_name, project_row):
+    weights = {}
+    fields = [(project_name, FIELD_WEIGHTS["name"])]
+    fields += [(project_row.get(field, ""), weight) for field, weight in FIELD_WEIGHTS.items() if field != "name"]
+    fields += [
+        (project_row.get(f"{dimension_key}.{criterion}.notes", ""), NOTES_WEIGHT)
+        for dimension_key, criteria in build.DIMENSIONS
+        for criterion in criteria
+    ]
+    for text, weight in fields:
+        if not text:
+            continue
+        for term in tokenize(text):
+            weights[term] = weights.get(term, 0) + weight
+    return weights
+
+
+def flat_postings(row_ids, weights, row_map=None):
+    # row_map turns the order documents were added in into table row ids, for builds that read out of order.
+    if row_map is not None:
+        row_ids = [row_map[row_id] for row_id in row_ids]
+    flat = []
+    for row_id, weight in sorted(zip(row_ids, weights)):
+        flat += (int(row_id), weight)
+    return flat
+
+
+def group_by_prefix(postings, row_map=None):
+    grouped = {}
+    for term, (row_ids, weights) in postings.items():
+        grouped.setdefault(term[:SEARCH_PREFIX_LENGTH], {})[term] = flat_postings(row_ids, weights, row_map)
+    return grouped
+
+
+class SearchPostings:
+    def __init__(self):
+        # term -> (row ids, weights), appended in the order documents are added
+        self.postings = {}
+
+    def add(self, row_id, terms):
+        for term, weight in terms.items():
+            rows, weights = self.postings.setdefault(term, (array("I"), array("I")))
+            rows.append(row_id)
+            weights.append(weight)
+
+    def prefix_groups(self, row_map=None):
+        return sorted(group_by_prefix(self.postings, row_map).items(), key=lambda group: prefix_key(group[0]))
+
+    def close(self):
+        self.postings = {}
+
+
+class SpooledSearchPostings:
+    # The streaming build spills postings to bucket files by term prefix as documents arrive,
+    # so writing the shards only ever holds one bucket, then one shard, in memory.
+    def __init__(self, buckets=SPOOL_BUCKETS):
+        self.spools = [tempfile.TemporaryFile() for _ in range(buckets)]
+        self.pending = [[] for _ in range(buckets)]
+        self.pending_count = 0
+
+    def add(self, row_id, terms):
+        for term, weight in terms.items():
+            self.pending[spool_bucket(term, len(self.spools))].append((term, row_id, weight))
+        self.pending_count += len(terms)
+        if self.pending_count >= SPOOL_FLUSH_POSTINGS:
+            self.flush()
+
+    def flush(self):
+        for spool, entries in zip(self.spools, self.pending):
+            if entries:
+                pickle.dump(entries, spool, protocol=pickle.HIGHEST_PROTOCOL)
+                entries.clear()
+        self.pending_count = 0
+
+    def prefix_groups(self, row_map=None):
+        # Buckets hold prefixes in hash order, so each prefix group is set aside in a fragment file
+        # and read back in sorted order, one group at a time.
+        self.flush()
+        fragments = []
+        with tempfile.TemporaryFile() as fragment_file:
+            for spool in self.spools:
+                postings = {}
+                spool.seek(0)
+                while True:
+                    try:
+                        entries = pickle.load(spool)
+                    except EOFError:
+                        break
+                    for term, row_id, weight in entries:
+                        rows, weights = postings.setdefault(term, (array("I"), array("I")))
+                        rows.append(row_id)
+                        weights.append(weight)
+                for prefix, terms in group_by_prefix(postings, row_map).items():
+                    fragments.append((prefix_key(prefix), fragment_file.tell(), prefix))
+                    pickle.dump(terms, fragment_file, protocol=pickle.HIGHEST_PROTOCOL)
+            for _, offset, prefix in sorted(fragments):
+                fragment_file.seek(offset)
+                yield prefix, pickle.load(fragment_file)
+
+    def close(self):
+        for spool in self.spools:
+            spool.close()
+
+
+def spool_bucket(term, buckets):
+    # A stable hash, so every term of a prefix shard lands in the same bucket in any process.
+    return zlib.crc32(term[:SEARCH_PREFIX_LENGTH].encode("utf-8")) % buckets
+
+
+def prefix_key(prefix):
+    # The page compares prefixes as JavaScript strings, by UTF-16 code unit, so shards are ordered the same way.
+    return prefix.encode("utf-16-be")
+
+
+def merge_prefix_groups(prefix_groups):
+    # Yields (first prefix, terms) for each shard, cutting one once it reaches SEARCH_SHARD_POSTINGS postings.
+    first_prefix = None
+    terms = {}
+    postings = 0
+    for prefix, prefix_terms in prefix_groups:
+        if first_prefix is None:
+            first_prefix = prefix
+        terms.update(prefix_terms)
+        postings += sum(len(flat) for flat in prefix_terms.values()) // 2
+        if postings >= SEARCH_SHARD_POSTINGS:
+            yield first_prefix, terms
+            first_prefix = None
+            terms = {}
+            postings = 0
+    if terms:
+        yield first_prefix, terms
+
+
+def shard_name(prefix):
+    # Non-ASCII prefixes are spelled out in hex so shard files stay safe to serve anywhere.
+    if re.fullmatch(r"[a-z0-9]+", prefix):
+        return prefix
+    return "x" + prefix.encode("utf-8").hex()
+
+
+class LiveSearchIndex:
+    # Watch mode's search index. Shard boundaries are fixed when it is built, and each term's postings are
+    # encoded in blocks of row ids, so an edit only re-encodes the blocks it changed and re-joins their shards.
+    def __init__(self, documents):
+        # term -> {block: {row id: weight}}
+        self.terms = {}
+        postings = SearchPostings()
+        for row_id, terms in documents:
+            postings.add(row_id, terms)
+            for term, weight in terms.items():
+                self.terms.setdefault(term, {}).setdefault(row_id // LIVE_SEARCH_BLOCK, {})[row_id] = weight
+        self.first_prefixes = []
+        self.shard_terms = []
+        for first_prefix, terms in merge_prefix_groups(postings.prefix_groups()):
+            self.first_prefixes.append(first_prefix)
+            self.shard_terms.append(set(terms))
+        self.first_keys = [prefix_key(prefix) for prefix in self.first_prefixes]
+        self.blocks = {}
+        self.fragments = {}
+        self.contents = {}
+
+    def shard(self, term):
+        prefix = term[:SEARCH_PREFIX_LENGTH]
+        position = bisect.bisect_right(self.first_keys, prefix_key(prefix)) - 1
+        if position < 0:
+            # A prefix before every shard widens the first one, or starts it.
+            if not self.first_prefixes:
+                self.shard_terms.append(set())
+                self.first_prefixes.append(prefix)
+                self.first_keys.append(prefix_key(prefix))
+            self.first_prefixes[0] = prefix
+            self.first_keys[0] = prefix_key(prefix)
+            position = 0
+        return position
+
+    def changed(self, term, block):
+        self.blocks.pop((term, block), None)
+        self.fragments.pop(term, None)
+        self.contents.pop(self.shard(term), None)
+
+    def update(self, row_id, previous_terms, terms):
+        # Replaces one document's terms; a term whose weight did not change is left alone.
+        block = row_id // LIVE_SEARCH_BLOCK
+        for term in previous_terms:
+            if term not in terms:
+                blocks = self.terms[term]
+                del blocks[block][row_id]
+                if not blocks[block]:
+                    del blocks[block]
+                if not blocks:
+                    del self.terms[term]
+                    self.shard_terms[self.shard(term)].discard(term)
+                self.changed(term, block)
+        for term, weight in terms.items():
+            if previous_terms.get(term) != weight:
+                self.terms.setdefault(term, {}).setdefault(block, {})[row_id] = weight
+                self.shard_terms[self.shard(term)].add(term)
+                self.changed(term, block)
+
+    def fragment(self, term):
+        # The term's entry in its shard exactly as json_script writes it.
+        fragment = self.fragments.get(term)
+        if fragment is None:
+            encoded = []
+            for block, postings in sorted(self.terms[term].items()):
+                if (term, block) not in self.blocks:
+                    flat = flat_postings(list(postings), list(postings.values()))
+                    self.blocks[term, block] = ",".join(map(str, flat))
+                encoded.append(self.blocks[term, block])
+            fragment = json.dumps(term, ensure_ascii=False) + ":[" + ",".join(encoded) + "]"
+            self.fragments[term] = fragment
+        return fragment
+
+    def files(self, rows):
+        # (path, content) for every shard and the index.json that names them, as render_search_index yields them.
+        shards = []
+        shard_hashes = {}
+        files = []
+        for position, terms in enumerate(self.shard_terms):
+            if not terms:
+                continue
+            if position not in self.contents:
+                content = "{" + ",".join(self.fragment(term) for term in sorted(terms)) + "}"
+                self.contents[position] = content, hash_bytes(content.encode("utf-8"))
+            shard_path = f"{SEARCH_DIR}/{shard_name(self.first_prefixes[position])}.json"
+            content, shard_hashes[shard_path] = self.contents[position]
+            shards.append([self.first_prefixes[position], shard_path])
+            files.append((shard_path, content))
+        files.append((f"{SEARCH_DIR}/index.json", render_search_meta(rows, shards, search_fingerprint(rows, shard_hashes))))
+        return files
+
+
+def build_search_postings(table):
+    postings = SearchPostings()
+    for row_id, (project, project_row) in enumerate(table.rows.items()):
+        postings.add(row_id, document_terms(project, project_row))
+    return postings
+
+
+def search_fingerprint(rows, shard_hashes):
+    # Hashes the content of every shard, so the page only trusts a search index with exactly its rows.
+    listing = "".join(f"{shard_path} {shard_hashes[shard_path]}\n" for shard_path in sorted(shard_hashes))
+    return hash_bytes(f"{rows}\n{listing}".encode("utf-8"))[:16]
+
+
+def render_search_meta(rows, shards, fingerprint):
+    return build.json_script({
+        "build": fingerprint,
+        "rows": rows,
+        "prefixLength": SEARCH_PREFIX_LENGTH,
+        "minTermLength": SEARCH_MIN_TERM_LENGTH,
+        "stopWords": sorted(STOP_WORDS),
+        # [first prefix, path] pairs in prefix order; a query prefix is in the last shard starting at or before it.
+        "shards": shards,
+    })
+
+
+def render_search_index(postings, rows, row_map=None):
+    # Yields (path, content) for each shard and then for the index.json that names them.
+    shards = []
+    shard_hashes = {}
+    for first_prefix, terms in merge_prefix_groups(postings.prefix_groups(row_map)):
+        shard_path = f"{SEARCH_DIR}/{shard_name(first_prefix)}.json"
+        content = build.json_script(terms)
+        shards.append([first_prefix, shard_path])
+        shard_hashes[shard_path] = hash_bytes(content.encode("utf-8"))
+        yield shard_path, content
+    yield f"{SEARCH_DIR}/index.json", render_search_meta(rows, shards, search_fingerprint(rows, shard_hashes))
+
+
+def write_search_index(postings, rows, write_stats=None, row_map=None, output_dir="./docs"):
+    # Returns the shard count and the fingerprint the index page has to name.
+    written = set()
+    content = None
+    for shard_path, content in render_search_index(postings, rows, row_map):
+        written.add(os.path.normpath(os.path.join(output_dir, shard_path)))
+        write_if_changed(os.path.join(output_dir, shard_path), content, write_stats)
+
+    for path in glob.glob(os.path.join(output_dir, SEARCH_DIR, "*.json")):
+        if os.path.normpath(path) not in written:
+            os.remove(path)
+    return len(written) - 1, json.loads(content)["build"]
@@ -0,0 +1,73 @@
+# MusGU+ source dates
+# Derives reproducible timestamps for generated pages from their YAML sources.
+
+import datetime
+import os
+import subprocess
+
+
+UTC = getattr(datetime, "UTC", datetime.timezone.utc)
+
+
+def source_date_epoch():
+    value = os.environ.get("SOURCE_DATE_EPOCH", "").strip()
+    if not value:
+        return None
+    try:
+        return datetime.datetime.fromtimestamp(int(value), UTC)
+    except ValueError:
+        raise ValueError(f"SOURCE_DATE_EPOCH must be a UNIX timestamp, got '{value}'") from None
+
+
+def run_git(*args):
+    try:
+        result = subprocess.run(["git", *args], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout
+
+
+def git_commit_times(directory):
+    # One `git log` over the whole directory; the first time a path shows up is its latest commit.
+    output = run_git("log", "--format=@%ct", "--name-only", "--relative", "--", directory)
+    if output is None:
+        return {}
+
+    commit_times = {}
+    current = None
+    for line in output.splitlines():
+        if line.startswith("@"):
+            current = int(line[1:])
+        elif line and current is not None:
+            commit_times.setdefault(os.path.normpath(line), current)
+    return commit_times
+
+
+def git_dirty_files(directory):
+    output = run_git("status", "--porcelain", "--", directory)
+    if output is None:
+        return set()
+    return {os.path.normpath(line[3:].split(" -> ")[-1]) for line in output.splitlines() if len(line) > 3}
+
+
+def source_timestamps(files):
+    fixed = source_date_epoch()
+    if fixed is not None:
+        return {file_name: fixed for file_name in files}
+
+    directories = sorted({os.path.dirname(os.path.normpath(file_name)) or "." for file_name in files})
+    commit_times = {}
+    dirty_files = set()
+    for directory in directories:
+        commit_times.update(git_commit_times(directory))
+        dirty_files.update(git_dirty_files(directory))
+
+    timestamps = {}
+    for file_name in files:
+        path = os.path.normpath(file_name)
+        if path in commit_times and path not in dirty_files:
+            timestamp = commit_times[path]
+        else:
+            timestamp = int(os.stat(file_name).st_mtime)
+        timestamps[file_name] = datetime.datetime.fromtimestamp(timestamp, UTC)
+    return timestamps
@@ -0,0 +1,192 @@
+# MusGU+ static output
+# Minifies the generated site, fingerprints its stylesheets and writes pre-compressed copies for deployment.
+
+import gzip
+import json
+import os
+import re
+
+from build_manifest import hash_bytes, write_if_changed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DIST_MANIFEST_NAME = ".static-manifest.json"
+DIST_MANIFEST_VERSION = 1
+
+# Templates are build inputs, not pages, and the catalogue snapshot is for local queries only.
+SOURCE_EXCLUDES = {"template.html", "model_template.html", "musgu.sqlite"}
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".json", ".csv", ".svg", ".txt"}
+MIN_COMPRESS_SIZE = 256
+
+RAW_TEXT_PATTERN = re.compile(r"(<(pre|textarea|script|style)\b[^>]*>.*?</\2\s*>)", re.IGNORECASE | re.DOTALL)
+HTML_COMMENT_PATTERN = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+HTML_TAG_PATTERN = re.compile(r"(<[^>]*>)")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+CSS_TOKEN_PATTERN = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)", re.DOTALL)
+CSS_PUNCTUATION_PATTERN = re.compile(r"\s*([{};,>])\s*")
+ASSET_REFERENCE_PATTERN = re.compile(r"""(\b(?:href|src)=["'])([^"'#?]+\.css)(["'#?])""")
+
+
+def collapse_whitespace(match):
+    return "\n" if "\n" in match.group(0) else " "
+
+
+def minify_css(source):
+    parts = []
+    for position, chunk in enumerate(CSS_TOKEN_PATTERN.split(source)):
+        if chunk is None:
+            continue
+        # split() yields text, string, comment, text, string, comment, ...
+        kind = position % 3
+        if kind == 1:
+            parts.append(chunk)
+        elif kind == 0:
+            chunk = WHITESPACE_PATTERN.sub(" ", chunk)
+            chunk = CSS_PUNCTUATION_PATTERN.sub(r"\1", chunk)
+            chunk = chunk.replace(": ", ":").replace(";}", "}")
+            parts.append(chunk)
+    return "".join(parts).strip()
+
+
+def minify_html(source):
+    parts = []
+    for position, chunk in enumerate(RAW_TEXT_PATTERN.split(source)):
+        kind = position % 3
+        if kind == 2:
+            continue
+        if kind == 1:
+            if chunk[:6].lower() == "<style":
+                opening_end = chunk.index(">") + 1
+                closing_start = chunk.lower().rindex("</style")
+                chunk = chunk[:opening_end] + minify_css(chunk[opening_end:closing_start]) + chunk[closing_start:]
+            parts.append(chunk)
+        else:
+            # Only text between tags is collapsed; attribute values are kept verbatim.
+            for index, piece in enumerate(HTML_TAG_PATTERN.split(HTML_COMMENT_PATTERN.sub("", chunk))):
+                parts.append(piece if index % 2 else WHITESPACE_PATTERN.sub(collapse_whitespace, piece))
+    return "".join(parts).strip() + "\n"
+
+
+def fingerprint_name(path, data):
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.{hash_bytes(data)[:10]}{extension}"
+
+
+def rewrite_asset_references(source, page_path, asset_names):
+    page_dir = os.path.dirname(page_path)
+
+    def replace(match):
+        reference = match.group(2)
+        if "://" in reference or reference.startswith("/"):
+            return match.group(0)
+        target = os.path.normpath(os.path.join(page_dir, reference)).replace(os.sep, "/")
+        if target not in asset_names:
+            return match.group(0)
+        fingerprinted = os.path.join(os.path.dirname(reference), os.path.basename(asset_names[target]))
+        return match.group(1) + fingerprinted.replace(os.sep, "/") + match.group(3)
+
+    return ASSET_REFERENCE_PATTERN.sub(replace, source)
+
+
+def collect_source_files(source_dir):
+    files = []
+    for root, directories, file_names in os.walk(source_dir):
+        directories[:] = sorted(directory for directory in directories if not directory.startswith("."))
+        for file_name in sorted(file_names):
+            if file_name.startswith(".") or file_name in SOURCE_EXCLUDES:
+                continue
+            path = os.path.join(root, file_name)
+            files.append(os.path.relpath(path, source_dir).replace(os.sep, "/"))
+    return files
+
+
+def load_dist_manifest(dist_dir):
+    path = os.path.join(dist_dir, DIST_MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("version") != DIST_MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def compressed_variants(data):
+    variants = {".gz": lambda: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = lambda: brotli.compress(data, quality=11)
+    return variants
+
+
+def write_output(dist_dir, relative_path, data, previous, stats):
+    path = os.path.join(dist_dir, relative_path)
+    digest = hash_bytes(data)
+    write_if_changed(path, data)
+    entry = {"hash": digest, "variants": []}
+
+    if os.path.splitext(relative_path)[1] in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+        recorded = previous.get(relative_path, {})
+        for suffix, compress in compressed_variants(data).items():
+            entry["variants"].append(suffix)
+            if recorded.get("hash") == digest and suffix in recorded.get("variants", []) and os.path.exists(path + suffix):
+                continue
+            write_if_changed(path + suffix, compress())
+            stats["compressed"] += 1
+
+    if previous.get(relative_path, {}).get("hash") == digest:
+        stats["unchanged"] += 1
+    else:
+        stats["updated"] += 1
+    return entry
+
+
+def remove_output(dist_dir, relative_path, entry):
+    path = os.path.join(dist_dir, relative_path)
+    for suffix in ["", *entry.get("variants", [])]:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def build_static_output(source_dir="./docs", dist_dir="./dist"):
+    previous = load_dist_manifest(dist_dir)
+    current = {}
+    stats = {"updated": 0, "unchanged": 0, "compressed": 0, "removed": 0, "brotli": brotli is not None}
+    sources = collect_source_files(source_dir)
+
+    # Stylesheets go first so pages can point at their fingerprinted names.
+    asset_names = {}
+    for relative_path in sources:
+        if not relative_path.endswith(".css"):
+            continue
+        with open(os.path.join(source_dir, relative_path), "r", encoding="utf-8") as file:
+            data = minify_css(file.read()).encode("utf-8")
+        asset_names[relative_path] = fingerprint_name(relative_path, data)
+        current[asset_names[relative_path]] = write_output(dist_dir, asset_names[relative_path], data, previous, stats)
+
+    for relative_path in sources:
+        if relative_path.endswith(".css"):
+            continue
+        source_path = os.path.join(source_dir, relative_path)
+        if relative_path.endswith(".html"):
+            with open(source_path, "r", encoding="utf-8") as file:
+                page = rewrite_asset_references(minify_html(file.read()), relative_path, asset_names)
+            data = page.encode("utf-8")
+        else:
+            with open(source_path, "rb") as file:
+                data = file.read()
+        current[relative_path] = write_output(dist_dir, relative_path, data, previous, stats)
+
+    for relative_path in sorted(set(previous) - set(current)):
+        remove_output(dist_dir, relative_path, previous[relative_path])
+        stats["removed"] += 1
+
+    write_if_changed(
+        os.path.join(dist_dir, DIST_MANIFEST_NAME),
+        json.dumps({"version": DIST_MANIFEST_VERSION, "files": current}, indent=1, sort_keys=True) + "\n",
+    )
+    return stats
@@ -0,0 +1,466 @@
+# MusGU+ streaming build
+# Reads each evaluation once, stages its model page right away and spools its table and CSV rows to disk,
+# so the build only keeps small aggregates in memory however large the catalogue grows.
+
+import collections
+import concurrent.futures
+import csv
+import io
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from array import array
+
+import numpy as np
+
+import consolidate_csv as build
+import model_similarity
+import search_index
+from build_manifest import hash_bytes, hash_file, is_output_current, write_chunks_if_changed, write_if_changed
+from validate_projects import ProjectError, compile_schema, load_project_file, locate, validate_record
+
+
+STREAM_BATCH_SIZE = 64
+
+# Pages are staged here and only moved into docs/ once every file has passed; it sits on the same
+# filesystem as docs/, so publishing is a rename per file.
+STAGING_PARENT = "./.build-cache"
+
+FACET_GROUPS = ("tags", "applications", "values", "dimensions")
+
+
+def stage_if_changed(output_path, staging_dir, data, stats):
+    # Compares with the published file in docs/, but writes the new version into the staging dir.
+    if os.path.exists(output_path):
+        with open(output_path, "rb") as file:
+            if file.read() == data:
+                stats["unchanged"] += 1
+                return
+    write_if_changed(os.path.join(staging_dir, os.path.relpath(output_path, "./docs")), data, stats)
+
+
+def publish_staged(staging_dir):
+    for directory, _, file_names in os.walk(staging_dir):
+        output_dir = os.path.join("./docs", os.path.relpath(directory, staging_dir))
+        for file_name in file_names:
+            os.makedirs(output_dir, exist_ok=True)
+            os.replace(os.path.join(directory, file_name), os.path.join(output_dir, file_name))
+
+
+def stream_file(job, weights, schema, outputs_current, staging_dir, link_status=None):
+    file_name, page_time, previous_source, previous_page, previous_data = job
+    entry, failure = load_project_file(file_name)
+    if failure is not None:
+        return {"file_name": file_name, "failure": failure}
+
+    _, _, digest, record = entry
+    name = record.get("project.name")
+    result = {
+        "file_name": file_name,
+        "digest": digest,
+        "slug": record["project.slug"],
+        # Kept for invalid files too, so a duplicate name is reported alongside their other problems.
+        "name": name if isinstance(name, str) and name.strip() else None,
+    }
+    problems = validate_record(record, schema)
+    if problems:
+        result["problems"] = problems
+        return result
+
+    row = {key: "" if value is None else value for key, value in record.items()}
+    name = row.pop("project.name")
+    scores = build.score_record(row, weights)
+    row.update(scores)
+
+    slug = str(row["project.slug"])
+    page_path = os.path.join("./docs/models", slug, "index.html")
+    data_path = os.path.join("./docs/models", slug, build.MODEL_DATA_NAME)
+    write_stats = {"written": 0, "unchanged": 0, "bytes": 0}
+    seconds = None
+    # The same checks as is_output_current, made here because only the worker knows the new source hash.
+    source_current = previous_source == digest
+    if outputs_current["data"] and source_current and previous_data and previous_data == hash_file(data_path):
+        data_hash = previous_data
+        write_stats["unchanged"] += 1
+    else:
+        data = build.render_model_data(name, row).encode("utf-8")
+        stage_if_changed(data_path, staging_dir, data, write_stats)
+        data_hash = hash_bytes(data)
+
+    if outputs_current["pages"] and source_current and previous_page and previous_page == hash_file(page_path):
+        page_hash = previous_page
+        write_stats["unchanged"] += 1
+    else:
+        page_html, seconds = build.render_model_page_job(
+            (name, row, page_time, build.get_page_link_status(row, link_status))
+        )
+        data = page_html.encode("utf-8")
+        stage_if_changed(page_path, staging_dir, data, write_stats)
+        page_hash = hash_bytes(data)
+
+    result.update(
+        columns=list(record),
+        overall_score=scores["overall_score"],
+        similarity_features=model_similarity.row_features(row),
+        search_terms=search_index.document_terms(name, row),
+        dimension_scores=[scores[f"{dimension_key}_score"] for dimension_key, _ in build.DIMENSIONS],
+        criterion_tags=build.get_row_criterion_tags(row),
+        applications=build.split_tags(row.get("project.applications", "")),
+        table_row=(build.render_table_row_body(name, row), build.get_row_facets(row)),
+        csv_row=row,
+        page_hash=page_hash,
+        data_hash=data_hash,
+        seconds=seconds,
+        write_stats=write_stats,
+    )
+    return result
+
+
+def stream_batch(jobs, weights, schema, outputs_current, staging_dir, link_status=None):
+    return [stream_file(job, weights, schema, outputs_current, staging_dir, link_status) for job in jobs]
+
+
+def iter_batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_facet_json(postings, rows):
+    # Writes exactly what json_script(assemble_facet_index(...)) would, one posting list at a time.
+    def encode(value):
+        return json.dumps(value, ensure_ascii=False).replace("</", "<\\/")
+
+    groups = sorted(postings)
+    yield "{"
+    for position, section in enumerate(sorted([*groups, "counts", "rows"])):
+        yield ("," if position else "") + encode(section) + ":"
+        if section == "rows":
+            yield str(rows)
+        elif section == "counts":
+            yield "{" + ",".join(
+                encode(group) + ":{" + ",".join(f"{encode(key)}:{len(row_ids)}" for key, row_ids in sorted(postings[group].items())) + "}"
+                for group in groups
+            ) + "}"
+        else:
+            yield "{"
+            for key_position, (key, row_ids) in enumerate(sorted(postings[section].items())):
+                yield ("," if key_position else "") + encode(key) + ":[" + ",".join(map(str, row_ids)) + "]"
+            yield "}"
+    yield "}"
+
+
+class StreamingBuild:
+    def __init__(
+        self,
+        weights,
+        previous,
+        manifest,
+        build_time,
+        page_times=None,
+        write_stats=None,
+        render_times=None,
+        link_status=None,
+        profiles=(),
+    ):
+        self.weights = weights
+        self.profiles = profiles
+        self.link_status = link_status
+        self.previous = previous
+        self.manifest = manifest
+        self.build_time = build_time
+        self.page_times = page_times or {}
+        self.write_stats = write_stats if write_stats is not None else {"written": 0, "unchanged": 0, "bytes": 0}
+        self.render_times = render_times
+        self.stats = {"rendered": 0, "skipped": 0, "removed": 0}
+        self.errors = []
+
+        # Everything below is either a small aggregate or one number per project.
+        # The table and CSV rows are spooled apart so each output only unpickles what it writes.
+        self.table_spool = tempfile.TemporaryFile()
+        self.table_offsets = array("q")
+        self.csv_spool = tempfile.TemporaryFile()
+        self.csv_offsets = array("q")
+        self.overall_scores = array("d")
+        self.dimension_scores = {dimension_key: array("d") for dimension_key, _ in build.DIMENSIONS}
+        self.row_names = []
+        self.row_slugs = []
+        self.feature_values = array("d")
+        self.feature_tags = []
+        self.tag_ids = {}
+        self.search_postings = search_index.SpooledSearchPostings()
+        self.record_columns = {}
+        self.tags_by_criterion = build.collect_tags_by_criterion({})
+        self.applications = set()
+        self.names = {}
+
+    def jobs(self, files):
+        previous_pages = self.previous["pages"]
+        previous_data = self.previous["data"]
+        previous_sources = self.previous["sources"]
+        for file_name in files:
+            slug = build.project_slug(file_name)
+            page_time = self.page_times.get(slug, self.build_time)
+            yield file_name, page_time, previous_sources.get(slug), previous_pages.get(slug), previous_data.get(slug)
+
+    def read(self, files, jobs=1, schema=None):
+        schema = schema or compile_schema()
+        outputs_current = {
+            section: self.previous["templates"] == self.manifest["templates"]
+            and self.previous["options"].get(section) == self.manifest["options"].get(section)
+            for section in ("pages", "data")
+        }
+
+        os.makedirs(STAGING_PARENT, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix="stream-", dir=STAGING_PARENT)
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+        try:
+            args = (self.weights, schema, outputs_current, staging_dir, self.link_status)
+            self.run(executor, jobs, iter_batches(self.jobs(files), STREAM_BATCH_SIZE), args)
+            # Nothing reaches docs/ unless every file passed, duplicate names included,
+            # so a failed build leaves it as it was, as the in-memory build does.
+            if not self.errors:
+                publish_staged(staging_dir)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+        if not self.errors:
+            for slug in sorted(set(self.previous["pages"]) - set(self.manifest["pages"])):
+                build.remove_model_page(slug)
+                self.stats["removed"] += 1
+        return self.errors
+
+    def run(self, executor, jobs, batches, args):
+        if executor is None:
+            for batch in batches:
+                self.collect(stream_batch(batch, *args))
+            return
+
+        # A bounded window of batches keeps results in file order without queueing the whole catalogue.
+        pending = collections.deque()
+        for batch in batches:
+            pending.append(executor.submit(stream_batch, batch, *args))
+            if len(pending) >= jobs * 2:
+                self.collect(pending.popleft().result())
+        while pending:
+            self.collect(pending.popleft().result())
+
+    def add_errors(self, file_name, result, extra_errors=()):
+        if "failure" in result:
+            problem, line = result["failure"]
+            self.errors.append(ProjectError(file_name, None, f"invalid YAML: {problem}", line))
+            return
+        file_errors = [ProjectError(file_name, key, message) for key, message in result.get("problems", ())]
+        file_errors.extend(extra_errors)
+        if file_errors:
+            locate(file_errors, file_name)
+            self.errors.extend(sorted(file_errors, key=lambda error: error.line or 0))
+
+    def collect(self, results):
+        for result in results:
+            file_name = result["file_name"]
+            if "failure" in result:
+                self.add_errors(file_name, result)
+                continue
+
+            self.manifest["sources"][result["slug"]] = result["digest"]
+            duplicates = []
+            name = result["name"]
+            if name is not None:
+                if name in self.names:
+                    duplicates.append(
+                        ProjectError(file_name, "project.name", f"project.name '{name}' is also used by {self.names[name]}")
+                    )
+                else:
+                    self.names[name] = os.path.normpath(file_name)
+            if duplicates or "problems" in result:
+                self.add_errors(file_name, result, duplicates)
+                continue
+
+            slug = result["slug"]
+            self.manifest["pages"][slug] = result["page_hash"]
+            self.manifest["data"][slug] = result["data_hash"]
+            for key, value in result["write_stats"].items():
+                self.write_stats[key] += value
+            if result["seconds"] is None:
+                self.stats["skipped"] += 1
+            else:
+                self.stats["rendered"] += 1
+                if self.render_times is not None:
+                    self.render_times[slug] = result["seconds"]
+
+            self.record_columns.update(dict.fromkeys(result["columns"]))
+            for criterion_key, tag in result["criterion_tags"]:
+                self.tags_by_criterion.setdefault(criterion_key, set()).add(tag)
+            self.applications.update(result["applications"])
+
+            self.table_offsets.append(self.table_spool.tell())
+            pickle.dump(result["table_row"], self.table_spool, protocol=pickle.HIGHEST_PROTOCOL)
+            self.csv_offsets.append(self.csv_spool.tell())
+            pickle.dump(result["csv_row"], self.csv_spool, protocol=pickle.HIGHEST_PROTOCOL)
+            self.overall_scores.append(result["overall_score"])
+            for (dimension_key, _), score in zip(build.DIMENSIONS, result["dimension_scores"]):
+                self.dimension_scores[dimension_key].append(score)
+            self.search_postings.add(len(self.row_names), result["search_terms"])
+            self.row_names.append(name)
+            self.row_slugs.append(slug)
+            values, tags = result["similarity_features"]
+            self.feature_values.extend(values)
+            # Tags are kept as ids; each distinct tag string is stored once.
+            self.feature_tags.append(array("I", (self.tag_ids.setdefault(tag, len(self.tag_ids)) for tag in tags)))
+
+    def __len__(self):
+        return len(self.overall_scores)
+
+    def ranking(self):
+        # A stable sort on the negated score matches ProjectTable.sorted_by(..., descending=True).
+        return np.argsort(-np.frombuffer(self.overall_scores, dtype=float), kind="stable")
+
+    def ranked(self, spool, offsets):
+        for position in self.ranking():
+            spool.seek(offsets[position])
+            yield pickle.load(spool)
+
+    def table_parts(self, postings):
+        yield "\n".join([*build.render_table_head(self.tags_by_criterion), "<tbody>"])
+        for row_id, (row_body, facets) in enumerate(self.ranked(self.table_spool, self.table_offsets)):
+            yield f'\n<tr class="row-a" data-row="{row_id}" ' + row_body
+            for group, keys in facets.items():
+                for key in keys:
+                    postings[group].setdefault(key, array("I")).append(row_id)
+        yield "\n</tbody>\n</table>"
+
+    def sort_orders(self):
+        ranking = self.ranking()
+        scores = {
+            dimension_key: np.frombuffer(values, dtype=float)[ranking]
+            for dimension_key, values in self.dimension_scores.items()
+        }
+        scores["overall"] = np.frombuffer(self.overall_scores, dtype=float)[ranking]
+        names = [self.row_names[position] for position in ranking]
+        return build.assemble_sort_orders(names, scores, self.profiles)
+
+    def write_index(self, path="./docs/index.html", search_build=None):
+        key = "index.html"
+        sources = set(self.previous["sources"]) | set(self.manifest["sources"])
+        if set(self.previous["index"]) == {key} and is_output_current(
+            self.previous, self.manifest, "index", key, path, sources=sources
+        ):
+            self.manifest["index"].update(self.previous["index"])
+            self.write_stats["unchanged"] += 1
+            return False
+
+        postings = {group: {} for group in FACET_GROUPS}
+        # The facet index follows the table in the page, so its postings are complete by the time it is written.
+        parts = build.iter_index_page(
+            self.table_parts(postings),
+            build.render_applications_section(sorted(self.applications)),
+            iter_facet_json(postings, len(self)),
+            self.build_time,
+            [build.json_script(self.sort_orders())],
+            search_build,
+        )
+        self.manifest["index"][key] = write_chunks_if_changed(path, parts, self.write_stats)
+        for stale_key in sorted(set(self.previous["index"]) - {key}):
+            stale_path = os.path.join("./docs", stale_key)
+            if stale_key.startswith(f"{build.ROW_SHARD_DIR}/") and os.path.exists(stale_path):
+                os.remove(stale_path)
+        shard_dir = os.path.join("./docs", build.ROW_SHARD_DIR)
+        if os.path.isdir(shard_dir) and not os.listdir(shard_dir):
+            os.rmdir(shard_dir)
+        return True
+
+    def csv_parts(self):
+        columns = [column for column in self.record_columns if column != "project.name"]
+        columns += [column for column in build.score_record({}, self.weights) if column not in columns]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(columns)
+        for row in self.ranked(self.csv_spool, self.csv_offsets):
+            writer.writerow([row.get(column, "") for column in columns])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    def write_similar_models(self):
+        tags = list(self.tag_ids)
+        return model_similarity.update_similar_models(
+            self.row_slugs,
+            self.row_names,
+            np.frombuffer(self.feature_values, dtype=float).reshape(len(self.row_slugs), len(model_similarity.VALUE_COLUMNS)),
+            [tuple(tags[tag_id] for tag_id in tag_ids) for tag_ids in self.feature_tags],
+            self.write_stats,
+        )
+
+    def write_search_index(self):
+        # Postings were collected in read order; the page numbers rows in ranked order.
+        row_map = np.empty(len(self), dtype=np.int64)
+        row_map[self.ranking()] = np.arange(len(self))
+        return search_index.write_search_index(self.search_postings, len(self), self.write_stats, row_map.tolist())
+
+    def write_csv(self, path="./docs/df.csv"):
+        return write_chunks_if_changed(path, self.csv_parts(), self.write_stats)
+
+    def close(self):
+        self.table_spool.close()
+        self.csv_spool.close()
+        self.search_postings.close()
+
+
+def build_streaming(
+    files,
+    weights,
+    previous,
+    manifest,
+    build_time,
+    page_times,
+    write_stats,
+    profiler,
+    jobs=1,
+    link_status=None,
+    profiles=(),
+    similar=True,
+    search=True,
+):
+    render_times = profiler.page_timings if profiler.enabled else None
+    streaming = StreamingBuild(
+        weights, previous, manifest, build_time, page_times, write_stats, render_times, link_status, profiles
+    )
+    try:
+        with profiler.stage("stream"):
+            errors = streaming.read(files, jobs)
+        if errors:
+            for error in errors:
+                print(error)
+            raise SystemExit(f"✗ {len(errors)} problem(s) in the evaluations; run scripts/validate_projects.py to re-check")
+
+        profiler.count("files_parsed", len(files))
+        profiler.count("projects", len(streaming))
+        # The index page names the fingerprint of the search shards, so they are written first.
+        search_build = None
+        if search:
+            with profiler.stage("search"):
+                shard_count, search_build = streaming.write_search_index()
+            print(f"Search index: {shard_count} shards.")
+        manifest["options"]["index"]["search"] = search_build
+        with profiler.stage("index"):
+            streaming.write_index(search_build=search_build)
+        with profiler.stage("csv"):
+            streaming.write_csv()
+        if similar:
+            with profiler.stage("similar"):
+                similar_stats = streaming.write_similar_models()
+            print(f"Similar models: {similar_stats['recomputed']} recomputed, {similar_stats['merged']} merged.")
+    finally:
+        streaming.close()
+    return streaming.stats
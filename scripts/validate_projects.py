@@ -0,0 +1,289 @@
+# MusGU+ evaluation validator
+# Checks every YAML evaluation against the template before anything is rendered; also usable as a pre-commit hook.
+
+import argparse
+import concurrent.futures
+import difflib
+import glob
+import os
+import sys
+
+import yaml
+
+import consolidate_csv as build
+from record_cache import RecordCache
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "projects", "_template.yaml")
+
+# Keys the loader adds to every record; they never appear in the YAML itself.
+GENERATED_KEYS = {"source.file", "project.slug"}
+
+
+class ProjectError:
+    __slots__ = ("file_name", "line", "key", "message")
+
+    def __init__(self, file_name, key, message, line=None):
+        self.file_name = file_name
+        self.key = key
+        self.message = message
+        self.line = line
+
+    def __str__(self):
+        location = os.path.normpath(self.file_name)
+        if self.line:
+            location += f":{self.line}"
+        return f"{location}: {self.message}"
+
+
+class ProjectSchema:
+    def __init__(self, project_fields, criteria, criterion_fields, value_levels):
+        self.project_fields = project_fields
+        self.criteria = criteria
+        self.criterion_fields = criterion_fields
+        self.value_levels = value_levels
+        self.allowed_keys = {f"project.{field}" for field in project_fields} | {
+            f"{criterion_key}.{field}" for criterion_key in criteria for field in criterion_fields
+        }
+        # Empty sections and criteria flatten to their own key; they are reported as missing criteria instead.
+        self.allowed_keys.update(criteria)
+        self.allowed_keys.update(criterion_key.split(".")[0] for criterion_key in criteria)
+        self.allowed_keys.add("project")
+
+
+def compile_schema(template_path=TEMPLATE_PATH):
+    with open(template_path, "r", encoding="utf-8") as file:
+        template = yaml.load(file, Loader=YamlLoader) or {}
+
+    criteria = [f"{dimension_key}.{criterion}" for dimension_key, criteria in build.DIMENSIONS for criterion in criteria]
+    template_criteria = [
+        f"{section}.{criterion}" for section, fields in template.items() if section != "project" for criterion in fields or {}
+    ]
+    if sorted(criteria) != sorted(template_criteria):
+        raise ValueError(f"{template_path} does not define the same criteria as DIMENSIONS")
+
+    # A field any criterion of the template has (tags, for instance) is allowed on all of them.
+    criterion_fields = set()
+    for section, fields in template.items():
+        if section != "project":
+            for criterion_fields_template in (fields or {}).values():
+                criterion_fields.update(criterion_fields_template or {})
+
+    value_levels = [level for level in build.VALUE_MAP if level]
+    return ProjectSchema(list(template.get("project") or {}), criteria, sorted(criterion_fields), value_levels)
+
+
+def describe_levels(value_levels):
+    return ", ".join(value_levels) + " or empty"
+
+
+def validate_record(record, schema):
+    errors = []
+
+    name = record.get("project.name")
+    if not isinstance(name, str) or not name.strip():
+        errors.append(("project.name", "project.name is required"))
+    for field in schema.project_fields:
+        value = record.get(f"project.{field}")
+        if value is not None and not isinstance(value, str):
+            errors.append((f"project.{field}", f"project.{field} must be text, got {type(value).__name__}"))
+
+    for criterion_key in schema.criteria:
+        value_key = f"{criterion_key}.value"
+        if value_key not in record:
+            if criterion_key in record and record[criterion_key] not in (None, {}):
+                errors.append((criterion_key, f"{criterion_key} must be a mapping with value and notes"))
+            else:
+                errors.append((criterion_key, f"missing criterion {criterion_key}"))
+            continue
+
+        value = record[value_key]
+        if value is not None and (not isinstance(value, str) or value not in build.VALUE_MAP):
+            message = f"invalid value {value!r} for {value_key} (expected {describe_levels(schema.value_levels)})"
+            suggestion = difflib.get_close_matches(str(value).strip().lower(), schema.value_levels, n=1)
+            if suggestion:
+                message += f"; did you mean '{suggestion[0]}'?"
+            errors.append((value_key, message))
+
+        for field in schema.criterion_fields:
+            if field == "value":
+                continue
+            field_value = record.get(f"{criterion_key}.{field}")
+            if field_value is not None and not isinstance(field_value, str):
+                errors.append(
+                    (f"{criterion_key}.{field}", f"{criterion_key}.{field} must be text, got {type(field_value).__name__}")
+                )
+
+    for key in record:
+        if key in schema.allowed_keys or key in GENERATED_KEYS:
+            continue
+        message = f"unknown field {key}"
+        suggestion = difflib.get_close_matches(key, schema.allowed_keys, n=1)
+        if suggestion:
+            message += f"; did you mean {suggestion[0]}?"
+        errors.append((key, message))
+
+    return errors
+
+
+def key_lines(file_name):
+    # Only files with errors are composed a second time to find out where each key lives.
+    with open(file_name, "rb") as file:
+        root = yaml.compose(file, Loader=YamlLoader)
+
+    lines = {}
+
+    def walk(node, prefix):
+        if not isinstance(node, yaml.MappingNode):
+            return
+        for key_node, value_node in node.value:
+            path = f"{prefix}{key_node.value}"
+            lines.setdefault(path, key_node.start_mark.line + 1)
+            walk(value_node, f"{path}.")
+
+    walk(root, "")
+    return lines
+
+
+def locate(errors, file_name):
+    try:
+        lines = key_lines(file_name)
+    except (OSError, yaml.YAMLError):
+        return
+    for error in errors:
+        key = error.key
+        # Missing keys point at the closest parent that exists.
+        while key and key not in lines:
+            key = key.rpartition(".")[0]
+        error.line = lines.get(key, 1)
+
+
+def load_project_file(file_name):
+    try:
+        return build.load_project_entry(file_name), None
+    except yaml.YAMLError as error:
+        mark = getattr(error, "problem_mark", None) or getattr(error, "context_mark", None)
+        problem = getattr(error, "problem", None) or str(error)
+        return None, (problem, mark.line + 1 if mark else None)
+    except AttributeError:
+        return None, ("the file must be a mapping of sections", 1)
+    except (OSError, UnicodeDecodeError) as error:
+        return None, (str(error), None)
+
+
+def load_and_validate(files, jobs=1, cache=None, schema=None, prune=True):
+    if schema is None:
+        schema = compile_schema()
+
+    records = {}
+    errors = []
+    if cache is not None:
+        for file_name in files:
+            record = cache.get(file_name)
+            if record is not None:
+                records[file_name] = record
+
+    missing = [file_name for file_name in files if file_name not in records]
+    if jobs > 1 and len(missing) > 1:
+        chunksize = max(1, len(missing) // (jobs * 4))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(load_project_file, missing, chunksize=chunksize))
+    else:
+        results = [load_project_file(file_name) for file_name in missing]
+
+    for file_name, (entry, failure) in zip(missing, results):
+        if failure is not None:
+            errors.append(ProjectError(file_name, None, f"invalid YAML: {failure[0]}", failure[1]))
+            continue
+        size, mtime_ns, digest, record = entry
+        records[file_name] = record
+        if cache is not None:
+            cache.put(file_name, size, mtime_ns, digest, record)
+
+    if cache is not None:
+        if prune:
+            cache.prune(files)
+        cache.save()
+
+    names = {}
+    for file_name in files:
+        if file_name not in records:
+            continue
+        file_errors = [ProjectError(file_name, key, message) for key, message in validate_record(records[file_name], schema)]
+
+        name = records[file_name].get("project.name")
+        if isinstance(name, str) and name.strip():
+            if name in names:
+                file_errors.append(
+                    ProjectError(file_name, "project.name", f"project.name '{name}' is also used by {names[name]}")
+                )
+            names.setdefault(name, os.path.normpath(file_name))
+
+        if file_errors:
+            locate(file_errors, file_name)
+            errors.extend(sorted(file_errors, key=lambda error: error.line or 0))
+
+    return records, errors
+
+
+def project_files(path="./projects"):
+    return sorted(file_name for file_name in glob.glob(path + "/*.yaml") if "_template" not in file_name)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Validate MusGU+ YAML evaluations against the template.")
+    parser.add_argument("files", nargs="*", help="evaluations to check (defaults to every file in projects/)")
+    parser.add_argument("--template", default=TEMPLATE_PATH, help="template the evaluations must follow")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="number of worker processes parsing the files (0 uses every core)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse every YAML file instead of reusing the records cached in .build-cache/",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("--jobs must be zero or a positive number")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # pre-commit passes bare paths; the build and the cache use ./projects/... names.
+    files = sorted(
+        file_name if file_name.startswith(".") or os.path.isabs(file_name) else "./" + file_name
+        for file_name in args.files or project_files()
+        if "_template" not in file_name
+    )
+
+    # Checking a few files (as pre-commit does) must not drop the others from the cache.
+    _, errors = load_and_validate(
+        files,
+        args.jobs,
+        None if args.no_cache else RecordCache(),
+        compile_schema(args.template),
+        prune=not args.files,
+    )
+    for error in errors:
+        print(error)
+    if errors:
+        print(f"✗ {len(errors)} problem(s) in {len({error.file_name for error in errors})} of {len(files)} files")
+        return 1
+
+    print(f"✓ {len(files)} evaluations are valid")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
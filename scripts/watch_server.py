@@ -0,0 +1,439 @@
+# MusGU+ watch mode
+# Keeps the parsed catalogue in memory, re-renders only what an edit touches and serves the site from memory.
+
+import bisect
+import collections
+import functools
+import glob
+import http.server
+import json
+import os
+import threading
+import time
+
+import consolidate_csv as build
+import model_similarity
+import search_index
+
+
+POLL_INTERVAL = 0.2
+
+CONTENT_TYPES = {".html": "text/html; charset=utf-8", ".json": "application/json"}
+
+
+def page_path(slug):
+    return f"/models/{slug}/index.html"
+
+
+def is_generated(path):
+    # Build outputs on disk may come from another build, so they are only ever served from memory.
+    return path.startswith((f"/{build.ROW_SHARD_DIR}/", f"/{search_index.SEARCH_DIR}/", "/models/"))
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+FACET_GROUPS = ("tags", "applications", "values", "dimensions")
+
+
+def encode_json(value):
+    return json.dumps(value, ensure_ascii=False).replace("</", "<\\/")
+
+
+class LiveProject:
+    # Everything the site needs from one evaluation, rendered once per edit.
+    __slots__ = (
+        "file_name",
+        "name",
+        "slug",
+        "row",
+        "row_body",
+        "facets",
+        "criterion_tags",
+        "applications",
+        "search_terms",
+        "features",
+        "slot",
+        "order_keys",
+    )
+
+    def __init__(self, file_name, name, row):
+        self.file_name = file_name
+        self.name = name
+        self.slug = str(row["project.slug"])
+        self.row = row
+        self.row_body = build.render_table_row_body(name, row)
+        self.facets = build.get_row_facets(row)
+        self.criterion_tags = set(build.get_row_criterion_tags(row))
+        self.applications = set(build.split_tags(row.get("project.applications", "")))
+        self.search_terms = search_index.document_terms(name, row)
+        self.features = model_similarity.row_features(row)
+        # The row id on the page; it stays put while the project is edited, so an edit only touches its own postings.
+        self.slot = None
+        self.order_keys = None
+
+
+class LiveSite:
+    def __init__(self, projects_dir="./projects", weights_path=build.SCORING_WEIGHTS_PATH, cache=None):
+        self.projects_dir = projects_dir
+        self.weights_path = weights_path
+        self.cache = cache
+        self.lock = threading.RLock()
+        self.projects = {}
+        self.slots = []
+        self.signatures = {}
+        self.template_signatures = {}
+        self.pages = {}
+        self.profiles = []
+        # Sorted keys per order, each ending in the row id: the ranking, every sortable column and every profile.
+        self.orders = {}
+        self.facet_postings = {group: {} for group in FACET_GROUPS}
+        self.facet_fragments = {group: {} for group in FACET_GROUPS}
+        # Built on the first request for them, then kept up to date edit by edit.
+        self.similarity = None
+        self.search = None
+        self.search_contents = None
+        self.head_html = None
+        self.applications_html = None
+        self.criterion_tag_counts = collections.Counter()
+        self.application_counts = collections.Counter()
+
+    def source_files(self):
+        pattern = os.path.join(self.projects_dir, "*.yaml")
+        return sorted(file_name for file_name in glob.glob(pattern) if "_template" not in file_name)
+
+    def watched_templates(self):
+        return [build.INDEX_TEMPLATE_PATH, build.MODEL_TEMPLATE_PATH, self.weights_path]
+
+    def order_columns(self):
+        return ["name", *(dimension_key for dimension_key, _ in build.DIMENSIONS), "overall"]
+
+    def load(self):
+        started = time.perf_counter()
+        files = self.source_files()
+        self.weights = build.load_scoring_weights(self.weights_path)
+        profiles = build.load_ranking_profiles(self.weights_path)
+        table = build.calculate_scores(build.create_table(files, cache=self.cache), self.weights)
+
+        with self.lock:
+            self.profiles = profiles
+            self.projects = {}
+            self.slots = []
+            self.orders = {name: [] for name in ["ranking", *self.order_columns()]}
+            self.orders.update({("profile", position): [] for position in range(len(profiles))})
+            self.facet_postings = {group: {} for group in FACET_GROUPS}
+            self.facet_fragments = {group: {} for group in FACET_GROUPS}
+            self.similarity = None
+            self.search = None
+            self.search_contents = None
+            self.criterion_tag_counts.clear()
+            self.application_counts.clear()
+            file_names = {build.project_slug(file_name): file_name for file_name in files}
+            for name, row in table.rows.items():
+                self.add_project(LiveProject(file_names[str(row["project.slug"])], name, row))
+            self.signatures = {file_name: file_signature(file_name) for file_name in files}
+            self.template_signatures = {path: file_signature(path) for path in self.watched_templates()}
+            self.pages = {}
+            self.head_html = None
+            self.applications_html = None
+
+        print(f"Loaded {len(self.projects)} projects in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def order_keys(self, project):
+        # Ties in every order follow the table: overall score, best first, then file name, as the build ranks rows.
+        row = project.row
+        rank = (-row["overall_score"], project.file_name, project.slot)
+        keys = {"ranking": rank, "name": (str(project.name).lower(), *rank), "overall": (row["overall_score"], *rank)}
+        for dimension_key, _ in build.DIMENSIONS:
+            keys[dimension_key] = (row[f"{dimension_key}_score"], *rank)
+        for position, profile in enumerate(self.profiles):
+            weights = profile["dimensions"]
+            total = sum(weight * row[f"{dimension_key}_score"] for dimension_key, weight in weights.items())
+            keys[("profile", position)] = (-round(total / sum(weights.values())), *rank)
+        return keys
+
+    def index_project(self, project):
+        project.order_keys = self.order_keys(project)
+        for name, key in project.order_keys.items():
+            bisect.insort(self.orders[name], key)
+        for group, keys in project.facets.items():
+            for key in keys:
+                self.facet_postings[group].setdefault(key, set()).add(project.slot)
+                self.facet_fragments[group].pop(key, None)
+
+    def unindex_project(self, project):
+        for name, key in project.order_keys.items():
+            order = self.orders[name]
+            del order[bisect.bisect_left(order, key)]
+        for group, keys in project.facets.items():
+            for key in keys:
+                postings = self.facet_postings[group][key]
+                postings.discard(project.slot)
+                if not postings:
+                    del self.facet_postings[group][key]
+                self.facet_fragments[group].pop(key, None)
+
+    def add_project(self, project, slot=None):
+        if slot is None:
+            slot = len(self.slots)
+            self.slots.append(project)
+        self.slots[slot] = project
+        project.slot = slot
+        self.projects[project.slug] = project
+        self.criterion_tag_counts.update(project.criterion_tags)
+        self.application_counts.update(project.applications)
+        self.index_project(project)
+
+    def remove_project(self, slug):
+        # Returns the project and the row id it leaves free.
+        project = self.projects.pop(slug, None)
+        if project is None:
+            return None
+        self.unindex_project(project)
+        self.criterion_tag_counts.subtract(project.criterion_tags)
+        self.application_counts.subtract(project.applications)
+        self.criterion_tag_counts += collections.Counter()
+        self.application_counts += collections.Counter()
+        for file_name in ("index.html", build.MODEL_DATA_NAME, build.SIMILAR_DATA_NAME):
+            self.pages.pop(f"/models/{slug}/{file_name}", None)
+        return project
+
+    def release_slot(self, slot):
+        # Row ids stay dense: the last row moves into the freed one.
+        last = self.slots.pop()
+        if slot < len(self.slots):
+            self.unindex_project(last)
+            if self.search is not None:
+                self.search.update(last.slot, last.search_terms, {})
+                self.search.update(slot, {}, last.search_terms)
+            self.slots[slot] = last
+            last.slot = slot
+            self.index_project(last)
+
+    def update_file(self, file_name):
+        slug = build.project_slug(file_name)
+        # Parse before touching the site so a half-typed YAML file keeps the last good version.
+        project = None
+        if os.path.exists(file_name):
+            record = build.load_project_record(file_name)
+            if record.get("project.name"):
+                row = {key: "" if value is None else value for key, value in record.items()}
+                row.update(build.score_record(row, self.weights))
+                project = LiveProject(file_name, row.pop("project.name"), row)
+
+        with self.lock:
+            previous = self.remove_project(slug)
+            if project is not None:
+                self.add_project(project, previous.slot if previous is not None else None)
+                self.pages[page_path(slug)] = self.render_page(slug)
+            if self.search is not None and (previous or project):
+                self.search.update(
+                    (project or previous).slot,
+                    previous.search_terms if previous is not None else {},
+                    project.search_terms if project is not None else {},
+                )
+            if project is None and previous is not None:
+                self.release_slot(previous.slot)
+
+            # Only what this edit touched is dropped; the index page re-renders from the kept pieces.
+            self.pages.pop("/index.html", None)
+            self.search_contents = None
+            if self.similarity is not None:
+                changed = self.similarity.update(slug, project.features if project is not None else None)
+                # Lists that show this model carry its name, so they re-render too.
+                for other in changed | self.similarity.listed_by.get(slug, set()):
+                    self.pages.pop(f"/models/{other}/{build.SIMILAR_DATA_NAME}", None)
+            if (previous and previous.criterion_tags) != (project and project.criterion_tags):
+                self.head_html = None
+            if (previous and previous.applications) != (project and project.applications):
+                self.applications_html = None
+            return project
+
+    def facet_fragment(self, group, key):
+        fragment = self.facet_fragments[group].get(key)
+        if fragment is None:
+            fragment = encode_json(key) + ":[" + ",".join(map(str, sorted(self.facet_postings[group][key]))) + "]"
+            self.facet_fragments[group][key] = fragment
+        return fragment
+
+    def facet_json(self):
+        # The facet index the build writes, from fragments cached per key; an edit only drops the keys it touched.
+        groups = sorted(FACET_GROUPS)
+        sections = {"rows": str(len(self.slots))}
+        sections["counts"] = "{" + ",".join(
+            encode_json(group) + ":{" + ",".join(
+                f"{encode_json(key)}:{len(row_ids)}" for key, row_ids in sorted(self.facet_postings[group].items())
+            ) + "}"
+            for group in groups
+        ) + "}"
+        for group in groups:
+            sections[group] = "{" + ",".join(self.facet_fragment(group, key) for key in sorted(self.facet_postings[group])) + "}"
+        return "{" + ",".join(f"{encode_json(section)}:{sections[section]}" for section in sorted(sections)) + "}"
+
+    def sort_orders(self):
+        def row_ids(name):
+            return [key[-1] for key in self.orders[name]]
+
+        return {
+            "columns": {column: row_ids(column) for column in self.order_columns()},
+            "profiles": [
+                {"id": profile["id"], "label": profile["label"], "order": row_ids(("profile", position))}
+                for position, profile in enumerate(self.profiles)
+            ],
+            # Row ids here are not ranks, so the page is given the ranking instead of reading it off the ids.
+            "ranking": row_ids("ranking"),
+        }
+
+    def render_index(self):
+        if self.head_html is None:
+            tags_by_criterion = build.collect_tags_by_criterion({})
+            for criterion_key, tag in self.criterion_tag_counts:
+                tags_by_criterion.setdefault(criterion_key, set()).add(tag)
+            self.head_html = build.render_table_head(tags_by_criterion)
+        if self.applications_html is None:
+            self.applications_html = build.render_applications_section(sorted(self.application_counts))
+
+        rows = [
+            f'<tr class="row-a" data-row="{key[-1]}" ' + self.slots[key[-1]].row_body for key in self.orders["ranking"]
+        ]
+        search_build = json.loads(self.search_files()[f"/{search_index.SEARCH_DIR}/index.json"])["build"]
+        return "".join(build.iter_index_page(
+            [build.assemble_table(self.head_html, rows)],
+            self.applications_html,
+            [self.facet_json()],
+            None,
+            [build.json_script(self.sort_orders())],
+            search_build,
+        )).encode("utf-8")
+
+    def render_page(self, slug):
+        project = self.projects[slug]
+        return build.render_model_page(project.name, project.row).encode("utf-8")
+
+    def render_similar(self, slug):
+        if self.similarity is None:
+            self.similarity = model_similarity.SimilarityIndex(
+                [project.slug for project in self.slots], [project.features for project in self.slots]
+            )
+        neighbours = self.similarity.neighbours[slug]
+        names = {neighbour: self.projects[neighbour].name for neighbour, _ in neighbours}
+        return model_similarity.render_similar_models(neighbours, names).encode("utf-8")
+
+    def search_files(self):
+        # Shard contents are cached in the index; this only lists them, and is encoded one file at a time on request.
+        if self.search is None:
+            self.search = search_index.LiveSearchIndex((project.slot, project.search_terms) for project in self.slots)
+        if self.search_contents is None:
+            self.search_contents = {f"/{path}": content for path, content in self.search.files(len(self.slots))}
+        return self.search_contents
+
+    def get(self, path):
+        with self.lock:
+            if path in self.pages:
+                return self.pages[path]
+            if path == "/index.html":
+                content = self.render_index()
+            elif path.startswith(f"/{search_index.SEARCH_DIR}/"):
+                content = self.search_files().get(path)
+                return None if content is None else content.encode("utf-8")
+            elif path.startswith("/models/"):
+                slug, _, file_name = path[len("/models/"):].partition("/")
+                project = self.projects.get(slug)
+                if project is None:
+                    return None
+                if file_name == "index.html":
+                    content = self.render_page(slug)
+                elif file_name == build.MODEL_DATA_NAME:
+                    content = build.render_model_data(project.name, project.row).encode("utf-8")
+                elif file_name == build.SIMILAR_DATA_NAME:
+                    content = self.render_similar(slug)
+                else:
+                    return None
+            else:
+                return None
+            self.pages[path] = content
+            return content
+
+    def poll(self):
+        template_signatures = {path: file_signature(path) for path in self.watched_templates()}
+        if template_signatures != self.template_signatures:
+            if template_signatures.get(self.weights_path) != self.template_signatures.get(self.weights_path):
+                print(f"{self.weights_path} changed, rescoring the catalogue")
+                self.load()
+                return
+            with self.lock:
+                self.template_signatures = template_signatures
+                # Compiled templates reload themselves when their file changes; pages re-render on request.
+                self.pages = {}
+            print("Templates changed, pages will re-render on request")
+
+        files = self.source_files()
+        signatures = {file_name: file_signature(file_name) for file_name in files}
+        changed = sorted(
+            file_name
+            for file_name in set(signatures) | set(self.signatures)
+            if signatures.get(file_name) != self.signatures.get(file_name)
+        )
+        self.signatures = signatures
+
+        for file_name in changed:
+            started = time.perf_counter()
+            try:
+                project = self.update_file(file_name)
+            except Exception as error:
+                print(f"Failed to update {file_name}: {type(error).__name__}: {error}")
+                continue
+            action = "removed" if project is None else "updated"
+            print(f"{file_name} {action} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def watch(self, interval=POLL_INTERVAL, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        while not stop_event.wait(interval):
+            self.poll()
+
+
+class LiveRequestHandler(http.server.SimpleHTTPRequestHandler):
+    def __init__(self, *args, site=None, **kwargs):
+        self.site = site
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].split("#", 1)[0]
+        if path.endswith("/"):
+            path += "index.html"
+
+        content = self.site.get(path)
+        if content is None:
+            if is_generated(path):
+                return self.send_error(404)
+            # Stylesheets and other static files come straight from docs/.
+            return super().do_GET()
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[os.path.splitext(path)[1]])
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(site, host="127.0.0.1", port=8000, docs_dir="./docs", interval=POLL_INTERVAL):
+    site.load()
+    watcher = threading.Thread(target=site.watch, args=(interval,), daemon=True)
+    watcher.start()
+
+    handler = functools.partial(LiveRequestHandler, site=site, directory=docs_dir)
+    with http.server.ThreadingHTTPServer((host, port), handler) as server:
+        print(f"Serving MusGU+ at http://{host}:{port}/ (watching {site.projects_dir}, Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nStopped watching")
@@ -0,0 +1,193 @@
+# MusGU+ link checker tests
+# Runs the checker against a local HTTP server that answers each path with one of the cases it has to handle.
+
+import http.server
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import link_checker  # noqa: E402
+from link_checker import LinkCache, LinkChecker, LinkResponse, retry_delay  # noqa: E402
+
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+class CaseHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def respond(self, status, headers=None, body=b""):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def handle_case(self):
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+        if self.path == "/ok":
+            if self.headers.get("If-None-Match") == ETAG:
+                return self.respond(304, {"ETag": ETAG})
+            return self.respond(200, {"ETag": ETAG, "Last-Modified": LAST_MODIFIED}, b"ok")
+        if self.path == "/moved":
+            return self.respond(301, {"Location": "/ok"})
+        if self.path == "/loop":
+            return self.respond(302, {"Location": "/loop"})
+        if self.path == "/no-head":
+            return self.respond(405 if self.command == "HEAD" else 200, body=b"only GET")
+        if self.path == "/busy":
+            # Unavailable until it has been asked twice.
+            busy = sum(1 for _, path, _ in self.server.requests if path == "/busy") <= 2
+            return self.respond(503, {"Retry-After": "0"}) if busy else self.respond(200)
+        if self.path == "/down":
+            return self.respond(503, {"Retry-After": "0"})
+        if self.path.startswith("/slow"):
+            time.sleep(1)
+            return self.respond(200)
+        return self.respond(404, body=b"missing")
+
+    do_HEAD = handle_case
+    do_GET = handle_case
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), CaseHandler)
+    httpd.daemon_threads = True
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    try:
+        yield httpd
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def check(tmp_path, urls, entries=None, max_age=0, **options):
+    cache = LinkCache(str(tmp_path / "links.json"))
+    cache.entries.update(entries or {})
+    options.setdefault("backoff", 0)
+    LinkChecker(cache, **options).run(urls, max_age)
+    return cache.entries
+
+
+def test_working_link_records_validators(server, tmp_path):
+    entry = check(tmp_path, [url(server, "/ok")])[url(server, "/ok")]
+    assert entry["ok"] and entry["status"] == 200 and entry["error"] is None
+    assert entry["etag"] == ETAG and entry["last_modified"] == LAST_MODIFIED
+    assert [method for method, _, _ in server.requests] == ["HEAD"]
+
+
+def test_missing_page_is_broken(server, tmp_path):
+    entry = check(tmp_path, [url(server, "/missing")])[url(server, "/missing")]
+    assert not entry["ok"]
+    assert entry["status"] == 404 and entry["error"] == "HTTP 404"
+
+
+def test_redirect_is_followed(server, tmp_path):
+    entry = check(tmp_path, [url(server, "/moved")])[url(server, "/moved")]
+    assert entry["ok"] and entry["final_url"] == url(server, "/ok")
+
+
+def test_redirect_loop_stops(server, tmp_path):
+    entry = check(tmp_path, [url(server, "/loop")])[url(server, "/loop")]
+    assert not entry["ok"] and entry["error"] == "too many redirects"
+    assert len(server.requests) == link_checker.MAX_REDIRECTS + 1
+
+
+def test_refused_head_falls_back_to_get(server, tmp_path):
+    entry = check(tmp_path, [url(server, "/no-head")])[url(server, "/no-head")]
+    assert entry["ok"] and entry["status"] == 200
+    assert [method for method, _, _ in server.requests] == ["HEAD", "GET"]
+
+
+def test_unavailable_link_is_retried_after_retry_after(server, tmp_path):
+    # The server asks for no delay; waiting out the backoff instead would take 30 seconds.
+    started = time.perf_counter()
+    entry = check(tmp_path, [url(server, "/busy")], retries=2, backoff=10)[url(server, "/busy")]
+    assert entry["ok"]
+    assert len(server.requests) == 3
+    assert time.perf_counter() - started < 5
+
+
+def test_retries_give_up(server, tmp_path):
+    entry = check(tmp_path, [url(server, "/down")], retries=1)[url(server, "/down")]
+    assert not entry["ok"] and entry["error"] == "HTTP 503"
+    assert len(server.requests) == 2
+
+
+def test_timeout_is_an_error(server, tmp_path):
+    entry = check(tmp_path, [url(server, "/slow")], timeout=0.2, retries=0)[url(server, "/slow")]
+    assert not entry["ok"] and entry["status"] is None
+    assert "timed out" in entry["error"]
+
+
+def test_slow_host_does_not_hold_global_slots(server, tmp_path):
+    # Both slow requests go to one host; the other host must not wait for them.
+    other = f"http://localhost:{server.server_address[1]}/ok"
+    started = time.time()
+    entries = check(tmp_path, [url(server, "/slow/1"), url(server, "/slow/2"), other], concurrency=2, per_host=1)
+    assert entries[other]["ok"]
+    assert entries[other]["checked"] - started < 0.5
+
+
+def test_working_link_is_revalidated_with_its_etag(server, tmp_path):
+    previous = {"status": 200, "ok": True, "error": None, "final_url": url(server, "/ok"), "etag": ETAG, "checked": 0}
+    entry = check(tmp_path, [url(server, "/ok")], {url(server, "/ok"): dict(previous)})[url(server, "/ok")]
+    assert server.requests[0][2].get("If-None-Match") == ETAG
+    assert entry["ok"] and entry["etag"] == ETAG and entry["checked"] > 0
+
+
+def test_fresh_link_is_not_requested(server, tmp_path):
+    previous = {"status": 200, "ok": True, "error": None, "checked": time.time()}
+    check(tmp_path, [url(server, "/ok")], {url(server, "/ok"): previous}, max_age=3600)
+    assert server.requests == []
+
+
+def test_retry_delay_honours_retry_after():
+    assert retry_delay(0, LinkResponse(503, {"retry-after": "3"})) == 3.0
+    assert retry_delay(0, LinkResponse(503, {"retry-after": "600"})) == 30.0
+    # A date or a missing header falls back to exponential backoff.
+    assert retry_delay(2, LinkResponse(503, {"retry-after": LAST_MODIFIED}), backoff=0.5) == 2.0
+    assert retry_delay(1, backoff=0.5) == 1.0
+
+
+def test_cache_freshness(tmp_path):
+    cache = LinkCache(str(tmp_path / "links.json"))
+    now = 1_000_000
+    cache.put("https://ok.example", {"ok": True, "checked": now - 10})
+    cache.put("https://old.example", {"ok": True, "checked": now - 7200})
+    cache.put("https://broken.example", {"ok": False, "checked": now - 10})
+    assert cache.is_fresh("https://ok.example", now, 3600)
+    assert not cache.is_fresh("https://old.example", now, 3600)
+    # Failures are checked again on every run, however recent.
+    assert not cache.is_fresh("https://broken.example", now, 3600)
+    assert not cache.is_fresh("https://unknown.example", now, 3600)
+
+
+def test_cache_round_trip(tmp_path):
+    path = str(tmp_path / "links.json")
+    cache = LinkCache(path)
+    cache.put("https://ok.example", {"ok": True, "checked": 1})
+    cache.save()
+    assert LinkCache(path).entries == {"https://ok.example": {"ok": True, "checked": 1}}
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("not json")
+    assert LinkCache(path).entries == {}